@@ -13,7 +13,7 @@ django.setup()
 
 from django.contrib.auth import get_user_model
 from core.models import (
-    Sport, TimeSlot, Booking, Player, CheckInLog,
+    Sport, TimeSlot, Booking, Player, CheckInLog, AttendanceEvent,
     BookingConfiguration, BreakTime, BlackoutDate,
     OrganizerCheckInLog
 )
@@ -48,11 +48,11 @@ def clear_all_data():
         
         # 1. Delete check-in logs first
         organizer_logs_count = OrganizerCheckInLog.objects.count()
-        OrganizerCheckInLog.objects.all().delete()
+        AttendanceEvent.objects.filter(subject_type='organizer').delete()
         print(f"✓ Deleted {organizer_logs_count} organizer check-in logs")
         
         player_logs_count = CheckInLog.objects.count()
-        CheckInLog.objects.all().delete()
+        AttendanceEvent.objects.filter(subject_type='player').delete()
         print(f"✓ Deleted {player_logs_count} player check-in logs")
         
         # 2. Delete players
@@ -13,7 +13,7 @@ django.setup()
 
 from django.contrib.auth import get_user_model
 from core.models import (
-    Sport, TimeSlot, Booking, Player, CheckInLog,
+    Sport, TimeSlot, Booking, Player, CheckInLog, AttendanceEvent,
     BookingConfiguration, BreakTime, BlackoutDate,
     OrganizerCheckInLog
 )
@@ -44,8 +44,8 @@ def clear_bookings_and_players():
     players = Player.objects.count()
     bookings = Booking.objects.count()
     
-    OrganizerCheckInLog.objects.all().delete()
-    CheckInLog.objects.all().delete()
+    AttendanceEvent.objects.filter(subject_type='organizer').delete()
+    AttendanceEvent.objects.filter(subject_type='player').delete()
     Player.objects.all().delete()
     Booking.objects.all().delete()
     
@@ -147,8 +147,8 @@ def main():
             clear_users()
         elif choice == '5':
             # Clear everything
-            OrganizerCheckInLog.objects.all().delete()
-            CheckInLog.objects.all().delete()
+            AttendanceEvent.objects.filter(subject_type='organizer').delete()
+            AttendanceEvent.objects.filter(subject_type='player').delete()
             Player.objects.all().delete()
             Booking.objects.all().delete()
             TimeSlot.objects.all().delete()
@@ -4,7 +4,7 @@ Admin configuration for Red Ball Cricket Academy
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth import get_user_model
-from .models import Sport, TimeSlot, Booking, Player, CheckInLog, UserProfile, BookingConfiguration, BreakTime
+from .models import Sport, TimeSlot, Booking, Player, CheckInLog, AttendanceEvent, UserProfile, BookingConfiguration, BreakTime, OfflineScan, ArchivedCheckInLog, DailySportStats, EmailOutbox, PaymentWebhookEvent
 
 User = get_user_model()
 
@@ -93,6 +93,32 @@ class CheckInLogAdmin(admin.ModelAdmin):
     readonly_fields = ['timestamp']
     raw_id_fields = ['player']
 
+    # Database view over AttendanceEvent
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(AttendanceEvent)
+class AttendanceEventAdmin(admin.ModelAdmin):
+    list_display = ['subject_type', 'subject_id', 'booking', 'action', 'device', 'timestamp']
+    list_filter = ['subject_type', 'action']
+    search_fields = ['device']
+    date_hierarchy = 'timestamp'
+    raw_id_fields = ['booking']
+
+    # Append-only: events are written by the scan endpoints
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
 
 @admin.register(BookingConfiguration)
 class BookingConfigurationAdmin(admin.ModelAdmin):
@@ -110,3 +136,44 @@ class BreakTimeAdmin(admin.ModelAdmin):
     search_fields = ['sport__name', 'reason']
     readonly_fields = ['created_at', 'updated_at']
     raw_id_fields = ['sport']
+
+
+@admin.register(OfflineScan)
+class OfflineScanAdmin(admin.ModelAdmin):
+    list_display = ['device_id', 'scan_id', 'kind', 'subject_id', 'action', 'status', 'scanned_at', 'synced_at']
+    list_filter = ['status', 'kind', 'device_id']
+    search_fields = ['device_id', 'scan_id']
+    readonly_fields = ['synced_at']
+
+
+@admin.register(ArchivedCheckInLog)
+class ArchivedCheckInLogAdmin(admin.ModelAdmin):
+    list_display = ['kind', 'source_id', 'timestamp', 'action', 'name', 'sport', 'booking_id']
+    list_filter = ['kind', 'action']
+    search_fields = ['name', 'sport']
+    date_hierarchy = 'timestamp'
+    readonly_fields = ['archived_at']
+
+
+@admin.register(DailySportStats)
+class DailySportStatsAdmin(admin.ModelAdmin):
+    list_display = ['sport', 'date', 'bookings', 'cancellations', 'revenue', 'players', 'check_ins', 'free_slots']
+    list_filter = ['sport']
+    date_hierarchy = 'date'
+    readonly_fields = ['updated_at']
+
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ['to', 'subject', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at']
+    list_filter = ['status']
+    search_fields = ['to', 'subject']
+    readonly_fields = ['created_at', 'sent_at', 'last_error']
+
+
+@admin.register(PaymentWebhookEvent)
+class PaymentWebhookEventAdmin(admin.ModelAdmin):
+    list_display = ['event_id', 'event', 'status', 'attempts', 'received_at', 'processed_at']
+    list_filter = ['status', 'event']
+    search_fields = ['event_id']
+    readonly_fields = ['event_id', 'event', 'payload', 'received_at', 'processed_at', 'last_error']
@@ -0,0 +1,98 @@
+"""
+Check-in log retention
+
+archive_logs() moves AttendanceEvent rows (the store behind CheckInLog,
+OrganizerCheckInLog and UserCheckInLog) older than a cutoff into
+ArchivedCheckInLog, oldest first, one chunk per transaction: the chunk is
+copied with names resolved in bulk, then deleted by primary key. The hot
+table keeps only the retention window, which is what the dashboard and scan
+history read.
+"""
+from django.db import transaction
+
+from .models import ArchivedCheckInLog, AttendanceEvent, CustomUser, Player
+
+SOURCES = ('player', 'organizer', 'user')
+
+
+def _common(kind, event):
+    return {'kind': kind, 'source_id': event.pk, 'timestamp': event.timestamp, 'action': event.action}
+
+
+def _archive_rows(kind, events):
+    """ArchivedCheckInLog rows for one chunk of events of a subject type"""
+    rows = []
+    if kind == 'player':
+        players = Player.objects.select_related('booking__slot__sport').in_bulk({e.subject_id for e in events})
+        for event in events:
+            player = players.get(event.subject_id)
+            rows.append(ArchivedCheckInLog(
+                player_id=event.subject_id, booking_id=event.booking_id,
+                user_id=player.user_id if player else None,
+                name=player.name if player else '',
+                sport=player.booking.slot.sport.name if player else '',
+                location=event.device, **_common(kind, event),
+            ))
+    elif kind == 'organizer':
+        for event in events:
+            booking = event.booking
+            rows.append(ArchivedCheckInLog(
+                booking_id=event.booking_id, user_id=booking.user_id if booking else None,
+                name=booking.user.email if booking else '',
+                sport=booking.slot.sport.name if booking else '',
+                location=event.device, **_common(kind, event),
+            ))
+    else:
+        users = CustomUser.objects.in_bulk({e.subject_id for e in events})
+        for event in events:
+            user = users.get(event.subject_id)
+            rows.append(ArchivedCheckInLog(
+                user_id=event.subject_id, name=user.email if user else '',
+                location=event.device, **_common(kind, event),
+            ))
+    return rows
+
+
+def archive_logs(before, chunk_size=1000, kinds=None):
+    """Move events with timestamp < before into the archive. Returns {kind: rows moved}."""
+    moved = {}
+    for kind in kinds or SOURCES:
+        moved[kind] = 0
+        queryset = AttendanceEvent.objects.filter(subject_type=kind, timestamp__lt=before).order_by('pk')
+        if kind == 'organizer':
+            queryset = queryset.select_related('booking__user', 'booking__slot__sport')
+        while True:
+            with transaction.atomic():
+                events = list(queryset[:chunk_size])
+                if not events:
+                    break
+                ArchivedCheckInLog.objects.bulk_create(_archive_rows(kind, events))
+                AttendanceEvent.objects.filter(pk__in=[event.pk for event in events]).delete()
+            moved[kind] += len(events)
+    return moved
+
+
+def count_archivable(before, kinds=None):
+    """Rows archive_logs(before) would move, per kind"""
+    return {
+        kind: AttendanceEvent.objects.filter(subject_type=kind, timestamp__lt=before).count()
+        for kind in kinds or SOURCES
+    }
+
+
+def archived_logs(kind=None, start=None, end=None, player_id=None, booking_id=None, user_id=None):
+    """Archived logs filtered by kind, [start, end) timestamps and subject ids, newest first"""
+    queryset = ArchivedCheckInLog.objects.all()
+    if kind:
+        queryset = queryset.filter(kind=kind)
+    if start:
+        queryset = queryset.filter(timestamp__gte=start)
+    if end:
+        queryset = queryset.filter(timestamp__lt=end)
+    if player_id:
+        queryset = queryset.filter(player_id=player_id)
+    if booking_id:
+        queryset = queryset.filter(booking_id=booking_id)
+    if user_id:
+        queryset = queryset.filter(user_id=user_id)
+    return queryset.order_by('-timestamp', '-id')
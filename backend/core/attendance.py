@@ -0,0 +1,91 @@
+"""
+Live attendance counters
+
+Per-sport, per-day counts of players and organizers currently checked in are
+held in the cache backend (Redis in production) and moved with atomic
+incr/decr by the scan code paths once their transaction commits. A sequence
+key is bumped on every change so the SSE stream only pushes when something
+moved. Counters are seeded from the database the first time a day is used,
+so a cache flush just costs one recount.
+"""
+from django.core.cache import cache
+from django.db.models import Count
+
+from .models import Booking, Player, Sport
+
+COUNTER_TTL = 60 * 60 * 48
+KINDS = ('players', 'organizers')
+
+
+def _key(day, sport_id, kind):
+    return f'attendance:{day}:{sport_id}:{kind}'
+
+
+def _seq_key(day):
+    return f'attendance:{day}:seq'
+
+
+def _ensure_seeded(day):
+    """Load today's counts from the database once. Returns True if this call seeded."""
+    if not cache.add(f'attendance:{day}:seeded', 1, COUNTER_TTL):
+        return False
+    players = (
+        Player.objects.filter(booking__slot__date=day, is_in=True)
+        .values('booking__slot__sport_id').annotate(n=Count('id')).order_by()
+    )
+    organizers = (
+        Booking.objects.filter(slot__date=day, organizer_is_in=True)
+        .values('slot__sport_id').annotate(n=Count('id')).order_by()
+    )
+    values = {_key(day, row['booking__slot__sport_id'], 'players'): row['n'] for row in players}
+    values.update({_key(day, row['slot__sport_id'], 'organizers'): row['n'] for row in organizers})
+    if values:
+        cache.set_many(values, COUNTER_TTL)
+    cache.add(_seq_key(day), 0, COUNTER_TTL)
+    return True
+
+
+def _incr(key, delta):
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        # Missing key: create it, then retry (add is a no-op if another worker won)
+        cache.add(key, 0, COUNTER_TTL)
+        return cache.incr(key, delta)
+
+
+def record_transition(day, sport_id, kind, action):
+    """Apply a committed IN/OUT transition to the live counters"""
+    if not _ensure_seeded(day):
+        # A fresh seed already reflects this committed transition
+        _incr(_key(day, sport_id, kind), 1 if action == 'IN' else -1)
+    _incr(_seq_key(day), 1)
+
+
+def current_version(day):
+    """Change sequence for the day's counters"""
+    return cache.get(_seq_key(day), 0)
+
+
+def snapshot(day):
+    """Counts of players and organizers currently in, per active sport"""
+    _ensure_seeded(day)
+    sports = list(Sport.objects.filter(is_active=True).values('id', 'name'))
+    keys = [_key(day, sport['id'], kind) for sport in sports for kind in KINDS]
+    counts = cache.get_many(keys)
+    rows = []
+    for sport in sports:
+        players = max(counts.get(_key(day, sport['id'], 'players'), 0), 0)
+        organizers = max(counts.get(_key(day, sport['id'], 'organizers'), 0), 0)
+        rows.append({
+            'sport_id': sport['id'],
+            'sport': sport['name'],
+            'players_in': players,
+            'organizers_in': organizers,
+        })
+    return {
+        'date': str(day),
+        'version': current_version(day),
+        'total_in': sum(r['players_in'] + r['organizers_in'] for r in rows),
+        'sports': rows,
+    }
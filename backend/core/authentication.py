@@ -0,0 +1,72 @@
+"""
+JWTs carrying role claims
+
+Tokens issued by jwt_login / jwt_register embed `user_type`, `is_staff` and
+`email`. ClaimsJWTAuthentication uses them on safe (read-only) requests to
+build the user without a query: a CustomUser whose other fields are
+deferred and loaded together on first access. Such a user is not checked
+against the database, so a deactivated, deleted or re-roled account keeps
+reading as before until its access token expires. That is why it is not a
+default authentication class: views opt in with
+CLAIMS_AUTHENTICATION_CLASSES, and only for public reference data and a
+customer's own bookings and players. Staff tokens, unsafe requests and
+tokens issued before the claims existed always load the user row as usual
+(including the is_active check), so staff access is never granted from a
+claim alone.
+"""
+from django.contrib.auth import get_user_model
+from rest_framework.authentication import BasicAuthentication, SessionAuthentication
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+CLAIMS = ('user_type', 'is_staff', 'email')
+
+
+def user_type_of(user):
+    """The user's profile type, from token claims when available"""
+    claimed = getattr(user, 'token_user_type', None)
+    if claimed:
+        return claimed
+    profile = getattr(user, 'profile', None)
+    return profile.user_type if profile else 'customer'
+
+
+def tokens_for_user(user, user_type=None):
+    """Refresh token (and its access token) with the role claims added"""
+    refresh = RefreshToken.for_user(user)
+    refresh['user_type'] = user_type or user_type_of(user)
+    refresh['is_staff'] = user.is_staff
+    refresh['email'] = user.email
+    return refresh
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that trusts non-staff role claims for GET/HEAD/OPTIONS"""
+
+    def authenticate(self, request):
+        self.read_only = request.method in SAFE_METHODS
+        return super().authenticate(request)
+
+    def get_user(self, validated_token):
+        if (not getattr(self, 'read_only', False) or any(claim not in validated_token for claim in CLAIMS)
+                or validated_token['is_staff']):
+            return super().get_user(validated_token)
+
+        User = get_user_model()
+        known = {
+            'id': validated_token[api_settings.USER_ID_CLAIM],
+            'email': validated_token['email'],
+            'is_staff': validated_token['is_staff'],
+        }
+        # from_db expects values in model field order
+        names = [f.attname for f in User._meta.concrete_fields if f.attname in known]
+        user = User.from_db('default', names, [known[name] for name in names])
+        user.token_user_type = validated_token['user_type']
+        return user
+
+
+# For low-risk public and customer reads only; never for staff-gated views
+# (exports, reports, roster, archive, dashboard, ops, sync)
+CLAIMS_AUTHENTICATION_CLASSES = [ClaimsJWTAuthentication, SessionAuthentication, BasicAuthentication]
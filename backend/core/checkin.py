@@ -0,0 +1,130 @@
+"""
+Check-in / check-out state transitions shared by the scan endpoints
+
+Every transition is a single conditional UPDATE (`... WHERE check_in_count = n`)
+so two scanners reading the same QR at the same moment cannot both apply it;
+the loser gets a CheckInError instead of double-counting. The attendance
+event is recorded in the same transaction as the UPDATE (see core.events for
+buffering), and the live attendance counters are moved once it commits.
+"""
+from functools import partial
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import attendance, events
+from .models import Booking, CustomUser, DailySportStats, Player
+from .qr_tokens import KIND_ORGANIZER, KIND_PLAYER
+
+
+class CheckInError(Exception):
+    """Raised when a scan cannot change the check-in state"""
+
+
+STALE_SCAN_MESSAGE = 'This QR code was just scanned by another device. Please try again.'
+DATE_MISMATCH_MESSAGE = 'QR code date mismatch. This may be an old or invalid code.'
+
+
+def scan_target(kind, data):
+    """The player, booking or user a verified QR token payload is for.
+
+    Used by both the live and the offline scan paths. Raises CheckInError if
+    the token was issued for another slot date than the target's (the slot was
+    moved, or the code is old), and DoesNotExist if the target is gone.
+    """
+    if kind == KIND_PLAYER:
+        target = Player.objects.select_related('booking__slot__sport').get(id=data.get('player_id'))
+        token_date, slot_date = data.get('date'), target.booking.slot.date
+    elif kind == KIND_ORGANIZER:
+        target = Booking.objects.select_related('slot__sport', 'user').get(id=data.get('booking_id'))
+        token_date, slot_date = data.get('slot_date'), target.slot.date
+    else:
+        return CustomUser.objects.get(id=data.get('user_id'))
+    if token_date and token_date != str(slot_date):
+        raise CheckInError(DATE_MISMATCH_MESSAGE)
+    return target
+
+
+def _apply(model, pk, field, expected, **updates):
+    """UPDATE model SET ... WHERE pk = pk AND field = expected. Returns True if applied."""
+    return model.objects.filter(pk=pk, **{field: expected}).update(**updates) == 1
+
+
+def check_in_player(player, at=None, device=None):
+    """Move a player from Registered -> IN -> OUT. Returns 'IN' or 'OUT'."""
+    when = at or timezone.now()
+    booking_date = player.booking.slot.date
+    if booking_date != timezone.localdate(when):
+        raise CheckInError(f'This QR code is only valid on {booking_date}.')
+
+    current = player.check_in_count
+    if current >= 2:
+        raise CheckInError('Maximum check-ins reached for today')
+    if current == 0:
+        action, updates = 'IN', {'last_check_in': when, 'is_in': True}
+    else:
+        action, updates = 'OUT', {'last_check_out': when, 'is_in': False}
+
+    with transaction.atomic():
+        if not _apply(Player, player.pk, 'check_in_count', current,
+                      check_in_count=F('check_in_count') + 1, updated_at=timezone.now(), **updates):
+            raise CheckInError(STALE_SCAN_MESSAGE)
+        events.record('player', player.pk, action, booking_id=player.booking_id, device=device, at=when)
+        if action == 'IN' and player.booking.payment_verified and not player.booking.is_cancelled:
+            DailySportStats.bump(player.booking.slot.sport_id, booking_date, check_ins=1)
+        transaction.on_commit(partial(
+            attendance.record_transition, booking_date, player.booking.slot.sport_id, 'players', action
+        ))
+
+    player.check_in_count = current + 1
+    for field, value in updates.items():
+        setattr(player, field, value)
+    return action
+
+
+def check_in_organizer(booking, at=None, device=None):
+    """Move a booking's organizer from Registered -> IN -> OUT. Returns 'IN' or 'OUT'."""
+    when = at or timezone.now()
+    if booking.slot.date != timezone.localdate(when):
+        raise CheckInError('This QR code is only valid on the booking date')
+
+    current = booking.organizer_check_in_count
+    if current >= 2:
+        raise CheckInError('Organizer QR code already used (max 2 scans)')
+    action = 'IN' if current == 0 else 'OUT'
+
+    with transaction.atomic():
+        if not _apply(Booking, booking.pk, 'organizer_check_in_count', current,
+                      organizer_check_in_count=F('organizer_check_in_count') + 1,
+                      organizer_is_in=action == 'IN', updated_at=timezone.now()):
+            raise CheckInError(STALE_SCAN_MESSAGE)
+        events.record('organizer', booking.pk, action, booking_id=booking.pk, device=device, at=when)
+        transaction.on_commit(partial(
+            attendance.record_transition, booking.slot.date, booking.slot.sport_id, 'organizers', action
+        ))
+
+    booking.organizer_check_in_count = current + 1
+    booking.organizer_is_in = action == 'IN'
+    return action
+
+
+def check_in_user(user, at=None, device=None):
+    """Toggle a user's academy check-in. Returns 'IN' or 'OUT'."""
+    current = user.check_in_count
+    if current in (0, 2):
+        action, new_count = 'IN', 1
+    elif current == 1:
+        action, new_count = 'OUT', 2
+    else:
+        raise CheckInError('Invalid check-in state')
+
+    with transaction.atomic():
+        if not _apply(CustomUser, user.pk, 'check_in_count', current,
+                      check_in_count=new_count, is_in=action == 'IN'):
+            raise CheckInError(STALE_SCAN_MESSAGE)
+        events.record('user', user.pk, action, device=device, at=at)
+
+    user.check_in_count = new_count
+    user.is_in = action == 'IN'
+    return action
@@ -0,0 +1,172 @@
+"""
+Resilient Celery dispatch
+
+dispatch(task, ...) publishes a Celery task once the current transaction
+commits; dispatch_batch(task, item) collects items into one task([...])
+call per transaction. A circuit breaker tracks broker failures: after
+CELERY_BREAKER_FAILURES consecutive publish errors it opens and, for
+CELERY_BREAKER_RESET_SECONDS, tasks skip the broker entirely instead of
+blocking the request on connection retries. While the breaker is open (or a
+publish fails) the task runs on a small in-process thread pool; if that pool
+already has CELERY_FALLBACK_MAX_PENDING tasks queued the task is dropped and
+counted, so only dispatch work that has a durable backstop (e.g. the email
+outbox cron). metrics() reports the counters for the ops endpoint.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """Closed -> open after `threshold` consecutive failures -> half-open after `reset_seconds`"""
+
+    def __init__(self, threshold, reset_seconds):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        """True if a call may go to the broker (one probe at a time when half-open)"""
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+
+breaker = CircuitBreaker(settings.CELERY_BREAKER_FAILURES, settings.CELERY_BREAKER_RESET_SECONDS)
+_executor = ThreadPoolExecutor(max_workers=settings.CELERY_FALLBACK_WORKERS, thread_name_prefix='task-fallback')
+_counters = {'published': 0, 'publish_errors': 0, 'fallbacks': 0, 'dropped': 0, 'fallback_errors': 0}
+_pending = 0
+_lock = threading.Lock()
+_batches = threading.local()
+
+
+def _count(name, delta=1):
+    global _pending
+    with _lock:
+        if name == 'pending':
+            _pending += delta
+        else:
+            _counters[name] += delta
+
+
+def dispatch(task, *args, **kwargs):
+    """Send `task` to Celery after the current transaction commits (immediately outside one)"""
+    transaction.on_commit(lambda: send(task, args, kwargs))
+
+
+def dispatch_batch(task, item):
+    """Collect `item` for a single task([items...]) call after the current transaction commits
+
+    Items from a transaction that rolls back ride along with the next batch,
+    so batch tasks must skip ids that no longer need work.
+    """
+    _batches.__dict__.setdefault(task.name, []).append(item)
+    # The first callback to run after commit sends everything collected; the rest find nothing
+    transaction.on_commit(lambda: _send_batch(task))
+
+
+def _send_batch(task):
+    items = _batches.__dict__.pop(task.name, None)
+    if items:
+        send(task, (list(dict.fromkeys(items)),))
+
+
+def send(task, args=(), kwargs=None):
+    """Publish to the broker, or run on the local fallback pool when it is unavailable"""
+    kwargs = kwargs or {}
+    if breaker.allow():
+        try:
+            task.apply_async(args, kwargs, retry=False, ignore_result=True)
+        except Exception as e:
+            breaker.record_failure()
+            _count('publish_errors')
+            logger.warning('Celery publish of %s failed (breaker %s): %s', task.name, breaker.state, e)
+        else:
+            breaker.record_success()
+            _count('published')
+            return 'published'
+    return _run_locally(task, args, kwargs)
+
+
+def _run_locally(task, args, kwargs):
+    with _lock:
+        if _pending >= settings.CELERY_FALLBACK_MAX_PENDING:
+            _counters['dropped'] += 1
+            logger.error('Fallback pool full, dropping %s', task.name)
+            return 'dropped'
+    _count('fallbacks')
+    _count('pending')
+    _executor.submit(_run, task, args, kwargs)
+    return 'fallback'
+
+
+def _run(task, args, kwargs):
+    try:
+        task.apply(args, kwargs, throw=True)
+    except Exception:
+        _count('fallback_errors')
+        logger.exception('Fallback run of %s failed', task.name)
+    finally:
+        _count('pending', -1)
+        connections.close_all()
+
+
+def broker_queue_depth():
+    """Messages waiting in each Redis broker queue, or None if the broker is unavailable"""
+    if breaker.state == 'open':
+        return None
+    from redball_academy.celery import app, QUEUES
+    try:
+        with app.connection_for_read() as conn:
+            client = conn.default_channel.client
+            return {queue: client.llen(queue) for queue in QUEUES}
+    except Exception:
+        return None
+
+
+def metrics():
+    with _lock:
+        counters = dict(_counters)
+        pending = _pending
+    return {
+        'breaker': breaker.state,
+        'consecutive_failures': breaker.failures,
+        'broker_queue_depth': broker_queue_depth(),
+        'fallback_queue_depth': pending,
+        **counters,
+    }
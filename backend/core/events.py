@@ -0,0 +1,62 @@
+"""
+Attendance event write path
+
+record() appends one AttendanceEvent. Inside a buffered() block events are
+held in memory instead and written with a single bulk_create when the block
+exits, so a burst of scans applied together (an offline gate device syncing
+its queue) costs one INSERT rather than one per scan. The buffer is scoped
+to the caller's transaction: it is flushed before that transaction commits
+and discarded if the block raises, so an acknowledged scan is never left
+without its event.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.utils import timezone
+
+from .models import AttendanceEvent
+
+BATCH_SIZE = 500
+
+_buffer = ContextVar('attendance_event_buffer', default=None)
+
+
+def record(subject_type, subject_id, action, booking_id=None, device=None, at=None):
+    """Append an attendance event (buffered inside a buffered() block)"""
+    event = AttendanceEvent(
+        subject_type=subject_type, subject_id=subject_id, booking_id=booking_id,
+        action=action, device=device or None, timestamp=at or timezone.now(),
+    )
+    pending = _buffer.get()
+    if pending is None:
+        event.save()
+        return event
+    pending.append(event)
+    if len(pending) >= BATCH_SIZE:
+        flush(pending)
+    return event
+
+
+def flush(pending):
+    """Write buffered events with bulk_create and empty the buffer"""
+    if pending:
+        AttendanceEvent.objects.bulk_create(pending, batch_size=BATCH_SIZE)
+        pending.clear()
+
+
+@contextmanager
+def buffered():
+    """Collect record() calls and insert them in bulk when the block exits.
+
+    Nested blocks share the outermost buffer.
+    """
+    if _buffer.get() is not None:
+        yield
+        return
+    pending = []
+    token = _buffer.set(pending)
+    try:
+        yield
+        flush(pending)
+    finally:
+        _buffer.reset(token)
@@ -0,0 +1,200 @@
+"""
+Streaming CSV exports
+
+Each export walks its queryset with .iterator(chunk_size=CHUNK_SIZE) (a
+server-side cursor on PostgreSQL) and yields one encoded CSV line per row,
+so memory stays flat however many rows the date range covers. Related rows
+come from select_related, one query per export.
+
+Under ASGI a StreamingHttpResponse drains a sync iterator into a list before
+sending anything, so the view streams astream_csv(), which pulls CHUNK_SIZE
+lines at a time from stream_csv() in the request's sync thread.
+"""
+import csv
+from datetime import datetime, time, timedelta
+from itertools import islice
+from operator import attrgetter
+
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+
+from .models import AttendanceEvent, Booking, CheckInLog, OrganizerCheckInLog, Player, UserCheckInLog
+
+CHUNK_SIZE = 2000
+
+EXPORTS = {
+    'bookings': {
+        'model': Booking,
+        'select_related': ('user', 'slot__sport'),
+        'date_field': 'slot__date',
+        'sport_field': 'slot__sport_id',
+        'columns': [
+            ('booking_id', 'id'),
+            ('sport', 'slot.sport.name'),
+            ('date', 'slot.date'),
+            ('start_time', 'slot.start_time'),
+            ('end_time', 'slot.end_time'),
+            ('organizer_email', 'user.email'),
+            ('status', 'status'),
+            ('payment_verified', 'payment_verified'),
+            ('is_cancelled', 'is_cancelled'),
+            ('amount_paid', 'amount_paid'),
+            ('order_id', 'order_id'),
+            ('payment_id', 'payment_id'),
+            ('created_at', 'created_at'),
+        ],
+    },
+    'players': {
+        'model': Player,
+        'select_related': ('booking__slot__sport',),
+        'date_field': 'booking__slot__date',
+        'sport_field': 'booking__slot__sport_id',
+        'columns': [
+            ('player_id', 'id'),
+            ('booking_id', 'booking_id'),
+            ('sport', 'booking.slot.sport.name'),
+            ('date', 'booking.slot.date'),
+            ('name', 'name'),
+            ('email', 'email'),
+            ('phone', 'phone'),
+            ('check_in_count', 'check_in_count'),
+            ('last_check_in', 'last_check_in'),
+            ('last_check_out', 'last_check_out'),
+        ],
+    },
+    'attendance': {
+        'model': AttendanceEvent,
+        'select_related': ('booking__slot__sport',),
+        'timestamp_field': 'timestamp',
+        'sport_field': 'booking__slot__sport_id',
+        'columns': [
+            ('event_id', 'id'),
+            ('timestamp', 'timestamp'),
+            ('subject_type', 'subject_type'),
+            ('subject_id', 'subject_id'),
+            ('action', 'action'),
+            ('booking_id', 'booking_id'),
+            ('sport', 'booking.slot.sport.name'),
+            ('device', 'device'),
+        ],
+    },
+    'check-ins': {
+        'model': CheckInLog,
+        'select_related': ('player__booking__slot__sport',),
+        'timestamp_field': 'timestamp',
+        'sport_field': 'player__booking__slot__sport_id',
+        'columns': [
+            ('log_id', 'id'),
+            ('timestamp', 'timestamp'),
+            ('action', 'action'),
+            ('player_id', 'player_id'),
+            ('player', 'player.name'),
+            ('booking_id', 'player.booking_id'),
+            ('sport', 'player.booking.slot.sport.name'),
+            ('location', 'location'),
+        ],
+    },
+    'organizer-check-ins': {
+        'model': OrganizerCheckInLog,
+        'select_related': ('user', 'booking__slot__sport'),
+        'timestamp_field': 'timestamp',
+        'sport_field': 'booking__slot__sport_id',
+        'columns': [
+            ('log_id', 'id'),
+            ('timestamp', 'timestamp'),
+            ('action', 'action'),
+            ('booking_id', 'booking_id'),
+            ('organizer_email', 'user.email'),
+            ('sport', 'booking.slot.sport.name'),
+            ('date', 'booking.slot.date'),
+        ],
+    },
+    'user-check-ins': {
+        'model': UserCheckInLog,
+        'select_related': ('user',),
+        'timestamp_field': 'timestamp',
+        'sport_field': None,
+        'columns': [
+            ('log_id', 'id'),
+            ('timestamp', 'timestamp'),
+            ('action', 'action'),
+            ('user_id', 'user_id'),
+            ('email', 'user.email'),
+        ],
+    },
+}
+
+
+class _Echo:
+    """File-like object whose write() hands the line back to csv.writer's caller"""
+
+    def write(self, value):
+        return value
+
+
+def export_queryset(name, start, end, sport_id=None):
+    """Rows of export `name` in [start, end] (slot date, or local log date), oldest first"""
+    export = EXPORTS[name]
+    queryset = export['model'].objects.select_related(*export['select_related'])
+    if 'date_field' in export:
+        queryset = queryset.filter(**{
+            f"{export['date_field']}__gte": start,
+            f"{export['date_field']}__lte": end,
+        })
+    else:
+        # Range on the raw column so the timestamp index is usable
+        tz = timezone.get_current_timezone()
+        queryset = queryset.filter(**{
+            f"{export['timestamp_field']}__gte": timezone.make_aware(datetime.combine(start, time.min), tz),
+            f"{export['timestamp_field']}__lt": timezone.make_aware(
+                datetime.combine(end + timedelta(days=1), time.min), tz
+            ),
+        })
+    if sport_id:
+        queryset = queryset.filter(**{export['sport_field']: sport_id})
+    return queryset.order_by('pk')
+
+
+def _cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return timezone.localtime(value).isoformat(timespec='seconds')
+    if isinstance(value, str) and value[:1] in ('=', '+', '-', '@'):
+        # Keep spreadsheet apps from evaluating user-entered text as a formula
+        return "'" + value
+    return value
+
+
+def _getter(path):
+    get = attrgetter(path)
+
+    def value(obj):
+        try:
+            return get(obj)
+        except AttributeError:
+            # Null foreign key part-way along the path
+            return None
+    return value
+
+
+def stream_csv(name, queryset):
+    """Yield the header and each row of `queryset` as CSV lines"""
+    columns = EXPORTS[name]['columns']
+    getters = [_getter(path) for _, path in columns]
+    writer = csv.writer(_Echo())
+    yield writer.writerow([header for header, _ in columns])
+    for obj in queryset.iterator(chunk_size=CHUNK_SIZE):
+        yield writer.writerow([_cell(get(obj)) for get in getters])
+
+
+async def astream_csv(name, queryset):
+    """stream_csv() as an async iterator yielding blocks of up to CHUNK_SIZE lines"""
+    lines = stream_csv(name, queryset)
+    # thread_sensitive keeps every step (and the cursor) on the request's DB connection
+    next_block = sync_to_async(lambda: ''.join(islice(lines, CHUNK_SIZE)), thread_sensitive=True)
+    try:
+        while block := await next_block():
+            yield block
+    finally:
+        await sync_to_async(lines.close, thread_sensitive=True)()
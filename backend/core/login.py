@@ -0,0 +1,79 @@
+"""
+Password login with failure throttling
+
+authenticate_login() does one case-insensitive lookup and exactly one
+password hash per attempt (a dummy hash when the account does not exist, so
+response time does not reveal which emails are registered). Failures are
+counted in the cache per client IP and per account over a fixed window;
+once either limit is hit further attempts are refused before any hashing,
+so a credential-stuffing burst costs a cache read per request instead of a
+PBKDF2 computation.
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+
+
+class LoginThrottled(Exception):
+    """Too many failed logins from this IP or for this account"""
+
+    def __init__(self, retry_after):
+        super().__init__('Too many failed login attempts')
+        self.retry_after = retry_after
+
+
+def client_ip(request):
+    """Client address; behind Render's proxy that is the last X-Forwarded-For hop"""
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+    if forwarded:
+        return forwarded.split(',')[-1].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def _keys(ip, identifier):
+    account = hashlib.sha256(identifier.strip().lower().encode()).hexdigest()[:32]
+    return (
+        (f'login:fail:ip:{ip}', settings.LOGIN_MAX_FAILURES_PER_IP),
+        (f'login:fail:account:{account}', settings.LOGIN_MAX_FAILURES_PER_ACCOUNT),
+    )
+
+
+def check_throttle(ip, identifier):
+    """Raise LoginThrottled if either failure counter is at its limit"""
+    counts = cache.get_many([key for key, _ in _keys(ip, identifier)])
+    for key, limit in _keys(ip, identifier):
+        if counts.get(key, 0) >= limit:
+            raise LoginThrottled(settings.LOGIN_FAILURE_WINDOW)
+
+
+def record_failure(ip, identifier):
+    for key, _ in _keys(ip, identifier):
+        # add() starts the window; incr() keeps its original expiry
+        cache.add(key, 0, settings.LOGIN_FAILURE_WINDOW)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, settings.LOGIN_FAILURE_WINDOW)
+
+
+def clear_account_failures(ip, identifier):
+    cache.delete(_keys(ip, identifier)[1][0])
+
+
+def authenticate_login(request, identifier, password):
+    """Return the active user for email/password, or None. Raises LoginThrottled."""
+    ip = client_ip(request)
+    check_throttle(ip, identifier)
+
+    User = get_user_model()
+    user = User.objects.filter(email__iexact=identifier.strip()).order_by('pk').first()
+    if user is None:
+        # Hash anyway so unknown emails take as long as wrong passwords
+        User().set_password(password)
+    elif user.check_password(password) and user.is_active:
+        clear_account_failures(ip, identifier)
+        return user
+    record_failure(ip, identifier)
+    return None
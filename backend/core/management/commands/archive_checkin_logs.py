@@ -0,0 +1,30 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.archive import SOURCES, archive_logs, count_archivable
+
+
+class Command(BaseCommand):
+    help = 'Move check-in logs older than the retention window into the archive table (run nightly)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.CHECKIN_LOG_RETENTION_DAYS,
+                            help='Keep this many days of logs in the hot tables')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Rows moved per transaction')
+        parser.add_argument('--kind', action='append', choices=list(SOURCES),
+                            help='Only archive this log kind (repeatable)')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the rows that would move')
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options['days'])
+        if options['dry_run']:
+            counts = count_archivable(before, options['kind'])
+            verb = 'Would archive'
+        else:
+            counts = archive_logs(before, options['chunk_size'], options['kind'])
+            verb = 'Archived'
+        summary = ', '.join(f'{count} {kind}' for kind, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f'{verb} logs older than {before:%Y-%m-%d %H:%M}: {summary}'))
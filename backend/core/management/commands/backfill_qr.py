@@ -0,0 +1,54 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from core.qr_batch import TARGETS, render_rows
+
+
+class Command(BaseCommand):
+    help = 'Backfill missing player, organizer and user QR codes in primary-key chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kinds', nargs='*', choices=list(TARGETS), help='What to backfill (default: all)')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Rows per chunk')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Render processes (default: CPU count, 0 renders in-process)')
+        parser.add_argument('--start-after', type=int, default=0, help='Resume after this primary key')
+
+    def handle(self, *args, **options):
+        kinds = options['kinds'] or list(TARGETS)
+        workers = options['workers']
+        executor = ProcessPoolExecutor(max_workers=workers) if workers != 0 else None
+        try:
+            for kind in kinds:
+                self.backfill(kind, options['chunk_size'], options['start_after'], executor)
+        finally:
+            if executor:
+                executor.shutdown()
+
+    def backfill(self, kind, chunk_size, start_after, executor):
+        queryset_factory = TARGETS[kind][0]
+        last_pk = start_after
+        done = 0
+        started = time.perf_counter()
+        self.stdout.write(f'Backfilling {kind} QR codes (after pk {last_pk})...')
+
+        while True:
+            rows = list(queryset_factory().filter(pk__gt=last_pk).order_by('pk')[:chunk_size])
+            if not rows:
+                break
+
+            chunk_started = time.perf_counter()
+            render_rows(kind, rows, executor)
+
+            last_pk = rows[-1].pk
+            done += len(rows)
+            rate = len(rows) / max(time.perf_counter() - chunk_started, 1e-9)
+            self.stdout.write(f'  {kind}: {done} done, last pk {last_pk} ({rate:.0f} rows/s)')
+
+        elapsed = time.perf_counter() - started
+        overall = done / elapsed if elapsed and done else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Backfilled {done} {kind} QR codes in {elapsed:.1f}s ({overall:.0f} rows/s)'
+        ))
@@ -0,0 +1,86 @@
+import statistics
+import tempfile
+import time
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from core import payments
+from core.models import Booking, CustomUser, Sport, TimeSlot
+from core.razorpay_stub import RazorpayStub
+from core.views import create_razorpay_order, verify_razorpay_payment
+
+KEY_ID, KEY_SECRET = 'rzp_test_bench', 'bench_secret'
+
+
+class Command(BaseCommand):
+    help = 'Measure create-order and verify latency against a local Razorpay stub (rolled back afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200, help='Payments to run')
+        parser.add_argument('--latency-ms', type=float, default=0, help='Simulated gateway latency')
+
+    def handle(self, *args, **options):
+        stub = RazorpayStub(KEY_ID, KEY_SECRET, latency=options['latency_ms'] / 1000).start()
+        overrides = override_settings(RAZORPAY_KEY_ID=KEY_ID, RAZORPAY_KEY_SECRET=KEY_SECRET,
+                                      RAZORPAY_BASE_URL=stub.base_url)
+        try:
+            with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root), overrides:
+                payments.reset_client()
+                with transaction.atomic():
+                    try:
+                        self.run(stub, options['iterations'])
+                    finally:
+                        transaction.set_rollback(True)
+        finally:
+            payments.reset_client()
+            stub.stop()
+
+    def run(self, stub, iterations):
+        suffix = uuid.uuid4().hex[:8]
+        sport = Sport.objects.create(name=f'Benchmark {suffix}', price_per_hour=500)
+        user = CustomUser.objects.create_user(email=f'bench-{suffix}@example.com', password=None)
+        first_day = timezone.localdate() + timedelta(days=1)
+        bookings = [
+            Booking.objects.create(user=user, slot=TimeSlot.objects.create(
+                sport=sport, date=first_day + timedelta(days=i // 24),
+                start_time=f'{i % 24:02d}:00', end_time=f'{i % 24:02d}:59', price=500,
+            ), amount_paid=500)
+            for i in range(iterations)
+        ]
+
+        factory = APIRequestFactory()
+        timings = {'create-order': [], 'verify': []}
+        for booking in bookings:
+            request = factory.post('/api/payment/create-order/', {'booking_id': booking.pk, 'amount': '500.00'},
+                                   format='json')
+            force_authenticate(request, user=user)
+            started = time.perf_counter()
+            response = create_razorpay_order(request)
+            timings['create-order'].append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                self.stderr.write(f'create-order: unexpected {response.status_code} {response.data}')
+                return
+
+            checkout = stub.pay(response.data['order_id'])
+            request = factory.post('/api/payment/verify/', {**checkout, 'booking_id': booking.pk}, format='json')
+            force_authenticate(request, user=user)
+            started = time.perf_counter()
+            response = verify_razorpay_payment(request)
+            timings['verify'].append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                self.stderr.write(f'verify: unexpected {response.status_code} {response.data}')
+                return
+
+        self.stdout.write(f'{"step":<14} {"p50 ms":>8} {"p99 ms":>8} {"mean ms":>8}')
+        for name, values in timings.items():
+            values.sort()
+            p99 = values[min(len(values) - 1, int(len(values) * 0.99))]
+            self.stdout.write(f'{name:<14} {statistics.median(values):>8.2f} {p99:>8.2f} '
+                              f'{statistics.fmean(values):>8.2f}')
+        self.stdout.write(f'Gateway requests: {stub.requests} for {len(bookings)} payments')
@@ -0,0 +1,53 @@
+import time
+
+from django.core import signing
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.qr_tokens import (
+    KIND_ORGANIZER, KIND_PLAYER, KIND_USER,
+    build_qr, load_qr_token, make_compact_token, render_qr_png,
+)
+
+
+class Command(BaseCommand):
+    help = 'Compare legacy and compact QR tokens: length, QR version, render and verify time'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200, help='Iterations per measurement')
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        now = timezone.now()
+        today = now.date()
+
+        samples = [
+            ('player', 'player-qr-token',
+             signing.dumps({'player_id': 123456, 'booking_id': 654321, 'ts': now.isoformat()}, salt='player-qr-token'),
+             make_compact_token(KIND_PLAYER, 123456, 654321, on_date=today)),
+            ('organizer', 'organizer-qr-token',
+             signing.dumps({'booking_id': 654321, 'user_id': 98765, 'type': 'organizer', 'slot_date': str(today),
+                            'sport': 'Box Cricket', 'ts': now.isoformat()}, salt='organizer-qr-token'),
+             make_compact_token(KIND_ORGANIZER, 654321, on_date=today)),
+            ('user', 'user-qr-token',
+             signing.dumps({'user_id': 98765, 'email': 'someone.long@example.com', 'ts': now.isoformat()},
+                           salt='user-qr-token'),
+             make_compact_token(KIND_USER, 98765)),
+        ]
+
+        self.stdout.write(f'{"token":<10} {"format":<8} {"length":>6} {"qr ver":>6} {"render ms":>10} {"verify us":>10}')
+        for name, salt, legacy, compact in samples:
+            for label, token in (('legacy', legacy), ('compact', compact)):
+                version = build_qr(token).version
+
+                start = time.perf_counter()
+                for _ in range(iterations):
+                    render_qr_png(token)
+                render_ms = (time.perf_counter() - start) * 1000 / iterations
+
+                start = time.perf_counter()
+                for _ in range(iterations):
+                    load_qr_token(token, salt)
+                verify_us = (time.perf_counter() - start) * 1_000_000 / iterations
+
+                self.stdout.write(f'{name:<10} {label:<8} {len(token):>6} {version:>6} {render_ms:>10.2f} {verify_us:>10.1f}')
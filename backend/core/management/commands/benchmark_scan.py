@@ -0,0 +1,81 @@
+import statistics
+import tempfile
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from core.models import Booking, CustomUser, Player, Sport, TimeSlot
+from core.views import scan
+
+
+class Command(BaseCommand):
+    help = 'Measure p50/p99 latency and query count of POST /api/scan/ per token type (rolled back afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200, help='Scans per token type')
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            with transaction.atomic():
+                try:
+                    self.run(iterations)
+                finally:
+                    transaction.set_rollback(True)
+
+    def run(self, iterations):
+        suffix = uuid.uuid4().hex[:8]
+        today = timezone.localdate()
+        sport = Sport.objects.create(name=f'Benchmark {suffix}', price_per_hour=500)
+        slot = TimeSlot.objects.create(sport=sport, date=today, start_time='06:00', end_time='07:00', price=500)
+        staff = CustomUser.objects.create_user(email=f'bench-{suffix}@example.com', password=None, is_staff=True)
+        booking = Booking.objects.create(user=staff, slot=slot, amount_paid=500, payment_verified=True)
+        players = Player.objects.bulk_create([
+            Player(booking=booking, name=f'Bench {i}', email=f'bench{i}-{suffix}@example.com') for i in range(50)
+        ])
+        for player in players:
+            player.booking = booking
+            player.qr_token = player.make_qr_token()
+        Player.objects.bulk_update(players, ['qr_token'])
+
+        cases = [
+            ('player', [p.qr_token for p in players], lambda: Player.objects.filter(booking=booking).update(
+                check_in_count=0, is_in=False)),
+            ('organizer', [booking.make_organizer_qr_token()], lambda: Booking.objects.filter(pk=booking.pk).update(
+                organizer_check_in_count=0, organizer_is_in=False)),
+            ('user', [staff.make_qr_token()], lambda: None),
+        ]
+
+        factory = APIRequestFactory()
+        self.stdout.write(f'{"type":<10} {"queries":>7} {"p50 ms":>8} {"p99 ms":>8} {"mean ms":>8}')
+        for name, tokens, reset in cases:
+            timings = []
+            queries = None
+            for i in range(iterations):
+                token = tokens[i % len(tokens)]
+                if i % len(tokens) == 0:
+                    reset()
+                request = factory.post('/api/scan/', {'token': token}, format='json')
+                force_authenticate(request, user=staff)
+                with CaptureQueriesContext(connection) as captured:
+                    start = time.perf_counter()
+                    response = scan(request)
+                    timings.append((time.perf_counter() - start) * 1000)
+                if response.status_code != 200:
+                    self.stderr.write(f'{name}: unexpected {response.status_code} {response.data}')
+                    break
+                queries = len(captured)
+
+            if timings:
+                timings.sort()
+                p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+                self.stdout.write(
+                    f'{name:<10} {queries:>7} {statistics.median(timings):>8.2f} {p99:>8.2f} '
+                    f'{statistics.fmean(timings):>8.2f}'
+                )
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from core.webhooks import process_events
+
+
+class Command(BaseCommand):
+    help = 'Apply pending Razorpay webhook events from the inbox (run every minute as a backstop)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Events per transaction')
+        parser.add_argument('--max-batches', type=int, default=50, help='Stop after this many batches')
+
+    def handle(self, *args, **options):
+        total_processed = total_failed = 0
+        for _ in range(options['max_batches']):
+            processed, failed = process_events(batch_size=options['batch_size'])
+            total_processed += processed
+            total_failed += failed
+            if processed + failed < options['batch_size']:
+                break
+        self.stdout.write(self.style.SUCCESS(
+            f'Applied {total_processed} webhook events, {total_failed} failed (will retry or gave up)'
+        ))
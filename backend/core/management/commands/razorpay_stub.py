@@ -0,0 +1,32 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.razorpay_stub import RazorpayStub
+
+
+class Command(BaseCommand):
+    help = 'Run an in-memory Razorpay API stub for offline payment testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency-ms', type=float, default=0, help='Delay added to every response')
+
+    def handle(self, *args, **options):
+        stub = RazorpayStub(
+            settings.RAZORPAY_KEY_ID or 'rzp_test_stub', settings.RAZORPAY_KEY_SECRET or 'stub_secret',
+            host=options['host'], port=options['port'], latency=options['latency_ms'] / 1000,
+        ).start()
+        self.stdout.write(self.style.SUCCESS(f'Razorpay stub listening on {stub.base_url}'))
+        self.stdout.write(f'Run the app with RAZORPAY_BASE_URL={stub.base_url} (key id {stub.key_id})')
+        try:
+            while True:
+                time.sleep(60)
+                self.stdout.write(f'  {stub.requests} requests, {len(stub.orders)} orders, '
+                                  f'{len(stub.payments)} payments')
+        except KeyboardInterrupt:
+            pass
+        finally:
+            stub.stop()
@@ -0,0 +1,32 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.stats import rebuild_daily_stats
+
+
+class Command(BaseCommand):
+    help = 'Reconcile the DailySportStats rollup with bookings, players and slots (run nightly)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=45,
+                            help='Rebuild slot dates from this many days ago up to the booking horizon')
+        parser.add_argument('--start', help='First date to rebuild (YYYY-MM-DD), overrides --days')
+        parser.add_argument('--end', help='Last date to rebuild (YYYY-MM-DD)')
+        parser.add_argument('--all', action='store_true', help='Rebuild every date')
+
+    def handle(self, *args, **options):
+        if options['all']:
+            start = end = None
+        else:
+            try:
+                start = (datetime.strptime(options['start'], '%Y-%m-%d').date() if options['start']
+                         else timezone.localdate() - timedelta(days=options['days']))
+                end = datetime.strptime(options['end'], '%Y-%m-%d').date() if options['end'] else None
+            except ValueError as e:
+                raise CommandError(f'Invalid date: {e}')
+
+        count = rebuild_daily_stats(start, end)
+        window = 'all dates' if options['all'] else f'{start} to {end or "latest"}'
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} daily sport stats rows ({window})'))
@@ -0,0 +1,50 @@
+import csv
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.payments import GatewayError
+from core.reconcile import FIXED, reconcile, window
+
+COLUMNS = ['kind', 'payment_id', 'order_id', 'booking_id', 'payment_amount', 'booking_amount', 'detail']
+
+
+class Command(BaseCommand):
+    help = 'Match gateway payments to bookings, mark paid ones confirmed and report discrepancies (run nightly)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=date.fromisoformat, help='First day (YYYY-MM-DD, default: yesterday)')
+        parser.add_argument('--end', type=date.fromisoformat, help='Last day (YYYY-MM-DD, default: --start)')
+        parser.add_argument('--page-size', type=int, default=100, help='Payments per gateway page (max 100)')
+        parser.add_argument('--report', help='Write the discrepancy report as CSV to this path ("-" for stdout)')
+        parser.add_argument('--dry-run', action='store_true', help='Report only, change nothing')
+
+    def handle(self, *args, **options):
+        start = options['start'] or timezone.localdate() - timedelta(days=1)
+        end = options['end'] or start
+        if end < start:
+            raise CommandError('--end is before --start')
+        try:
+            report, counts = reconcile(*window(start, end), page_size=min(options['page_size'], 100),
+                                       apply=not options['dry_run'])
+        except GatewayError as e:
+            raise CommandError(f'Payment gateway error: {e}')
+
+        if options['report']:
+            if options['report'] == '-':
+                self.write_report(self.stdout, report)
+            else:
+                with open(options['report'], 'w', newline='') as out:
+                    self.write_report(out, report)
+
+        fixed = counts.pop(FIXED, 0)
+        verb = 'Would mark' if options['dry_run'] else 'Marked'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {fixed} bookings paid for {start} to {end}'))
+        for kind, count in sorted(counts.items()):
+            self.stdout.write(self.style.WARNING(f'  {kind}: {count}'))
+
+    def write_report(self, out, report):
+        writer = csv.DictWriter(out, fieldnames=COLUMNS)
+        writer.writeheader()
+        writer.writerows(report)
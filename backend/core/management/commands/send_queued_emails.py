@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from core.outbox import drain_outbox
+
+
+class Command(BaseCommand):
+    help = 'Send due emails from the outbox over a reused SMTP connection (run every minute)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Emails per SMTP connection')
+        parser.add_argument('--max-batches', type=int, default=50, help='Stop after this many batches')
+
+    def handle(self, *args, **options):
+        sent, failed = drain_outbox(options['batch_size'], options['max_batches'])
+        self.stdout.write(self.style.SUCCESS(f'Sent {sent} emails, {failed} failed (will retry or gave up)'))
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.8 on 2026-10-19 01:38
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='organizercheckinlog',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.CreateModel(
+            name='OfflineScan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('device_id', models.CharField(max_length=64)),
+                ('scan_id', models.CharField(max_length=64)),
+                ('kind', models.CharField(blank=True, choices=[('player', 'Player'), ('organizer', 'Organizer'), ('user', 'User')], max_length=10)),
+                ('subject_id', models.BigIntegerField(blank=True, null=True)),
+                ('action', models.CharField(blank=True, max_length=3)),
+                ('status', models.CharField(choices=[('applied', 'Applied'), ('rejected', 'Rejected')], max_length=10)),
+                ('error', models.CharField(blank=True, max_length=255)),
+                ('scanned_at', models.DateTimeField()),
+                ('synced_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Offline Scan',
+                'verbose_name_plural': 'Offline Scans',
+                'ordering': ['-scanned_at'],
+                'unique_together': {('device_id', 'scan_id')},
+            },
+        ),
+    ]
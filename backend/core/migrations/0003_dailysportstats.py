@@ -0,0 +1,42 @@
+# Generated by Django 4.2.8 on 2026-10-19 01:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_initial_stats(apps, schema_editor):
+    from core.stats import rebuild_daily_stats
+    rebuild_daily_stats(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_offlinescan'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySportStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('bookings', models.IntegerField(default=0)),
+                ('cancellations', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('players', models.IntegerField(default=0)),
+                ('check_ins', models.IntegerField(default=0)),
+                ('slots', models.IntegerField(default=0)),
+                ('free_slots', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('sport', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='core.sport')),
+            ],
+            options={
+                'verbose_name': 'Daily Sport Stats',
+                'verbose_name_plural': 'Daily Sport Stats',
+                'ordering': ['date', 'sport'],
+                'unique_together': {('sport', 'date')},
+            },
+        ),
+        migrations.RunPython(build_initial_stats, migrations.RunPython.noop),
+    ]
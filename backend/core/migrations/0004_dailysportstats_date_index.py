@@ -0,0 +1,17 @@
+# Generated by Django 4.2.8 on 2026-10-19 01:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_dailysportstats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dailysportstats',
+            index=models.Index(fields=['date'], name='core_dailystats_date_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 4.2.8 on 2026-10-19 01:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_dailysportstats_date_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedCheckInLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('player', 'Player'), ('organizer', 'Organizer'), ('user', 'User')], max_length=10)),
+                ('source_id', models.BigIntegerField()),
+                ('timestamp', models.DateTimeField()),
+                ('action', models.CharField(max_length=3)),
+                ('player_id', models.BigIntegerField(blank=True, null=True)),
+                ('booking_id', models.BigIntegerField(blank=True, null=True)),
+                ('user_id', models.BigIntegerField(blank=True, null=True)),
+                ('name', models.CharField(blank=True, max_length=255)),
+                ('sport', models.CharField(blank=True, max_length=100)),
+                ('location', models.CharField(blank=True, max_length=255, null=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Archived Check-In Log',
+                'verbose_name_plural': 'Archived Check-In Logs',
+                'ordering': ['-timestamp'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='checkinlog',
+            index=models.Index(fields=['timestamp'], name='core_checkinlog_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='organizercheckinlog',
+            index=models.Index(fields=['timestamp'], name='core_orgcheckinlog_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usercheckinlog',
+            index=models.Index(fields=['timestamp'], name='core_usercheckinlog_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedcheckinlog',
+            index=models.Index(fields=['kind', 'timestamp'], name='core_archivedlog_kind_ts_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='archivedcheckinlog',
+            unique_together={('kind', 'source_id')},
+        ),
+    ]
@@ -0,0 +1,177 @@
+# Generated by Django 4.2.8 on 2026-10-19 01:50
+
+from django.core.management.color import no_style
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def copy_legacy_logs(apps, schema_editor):
+    """Move the three log tables into AttendanceEvent before they become views"""
+    AttendanceEvent = apps.get_model('core', 'AttendanceEvent')
+    sources = [
+        ('player', apps.get_model('core', 'CheckInLog'),
+         lambda log: {'subject_id': log.player_id, 'booking_id': log.player.booking_id, 'device': log.location}),
+        ('organizer', apps.get_model('core', 'OrganizerCheckInLog'),
+         lambda log: {'subject_id': log.booking_id, 'booking_id': log.booking_id}),
+        ('user', apps.get_model('core', 'UserCheckInLog'),
+         lambda log: {'subject_id': log.user_id}),
+    ]
+    for subject_type, model, fields in sources:
+        queryset = model.objects.order_by('pk')
+        if subject_type == 'player':
+            queryset = queryset.select_related('player')
+        batch = []
+        for log in queryset.iterator(chunk_size=2000):
+            batch.append(AttendanceEvent(subject_type=subject_type, action=log.action,
+                                         timestamp=log.timestamp, **fields(log)))
+            if len(batch) >= 2000:
+                AttendanceEvent.objects.bulk_create(batch)
+                batch = []
+        AttendanceEvent.objects.bulk_create(batch)
+
+
+LEGACY_LOGS = ('CheckInLog', 'OrganizerCheckInLog', 'UserCheckInLog')
+
+# Events of players/users deleted since are dropped: the old tables have foreign keys
+RESTORE_LOGS = [
+    """INSERT INTO core_checkinlog (id, player_id, "action", "timestamp", location)
+       SELECT id, subject_id, "action", "timestamp", device FROM core_attendanceevent
+       WHERE subject_type = 'player' AND subject_id IN (SELECT id FROM core_player)""",
+    """INSERT INTO core_organizercheckinlog (id, booking_id, user_id, "action", "timestamp")
+       SELECT e.id, e.booking_id, b.user_id, e."action", e."timestamp"
+       FROM core_attendanceevent e JOIN core_booking b ON b.id = e.booking_id
+       WHERE e.subject_type = 'organizer'""",
+    """INSERT INTO core_usercheckinlog (id, user_id, "action", "timestamp")
+       SELECT id, subject_id, "action", "timestamp" FROM core_attendanceevent
+       WHERE subject_type = 'user' AND subject_id IN (SELECT id FROM core_customuser)""",
+]
+
+
+def restore_legacy_logs(apps, schema_editor):
+    """Copy AttendanceEvent rows back into the recreated log tables (ids kept)"""
+    for sql in RESTORE_LOGS:
+        schema_editor.execute(sql)
+    models = [apps.get_model('core', name) for name in LEGACY_LOGS]
+    for sql in schema_editor.connection.ops.sequence_reset_sql(no_style(), models):
+        schema_editor.execute(sql)
+
+
+def drop_legacy_tables(apps, schema_editor):
+    for name in LEGACY_LOGS:
+        schema_editor.execute(f'DROP TABLE core_{name.lower()}')
+
+
+def recreate_legacy_tables(apps, schema_editor):
+    """The log tables as they were before this migration, empty"""
+    for name in LEGACY_LOGS:
+        schema_editor.create_model(apps.get_model('core', name))
+
+
+LOG_VIEWS = [
+    """CREATE VIEW core_checkinlog AS
+       SELECT id, subject_id AS player_id, "action", "timestamp", device AS location
+       FROM core_attendanceevent WHERE subject_type = 'player'""",
+    """CREATE VIEW core_organizercheckinlog AS
+       SELECT e.id, e.booking_id, b.user_id, e."action", e."timestamp"
+       FROM core_attendanceevent e JOIN core_booking b ON b.id = e.booking_id
+       WHERE e.subject_type = 'organizer'""",
+    """CREATE VIEW core_usercheckinlog AS
+       SELECT id, subject_id AS user_id, "action", "timestamp"
+       FROM core_attendanceevent WHERE subject_type = 'user'""",
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_checkin_log_archive'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='archivedcheckinlog',
+            unique_together=set(),
+        ),
+        migrations.CreateModel(
+            name='AttendanceEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject_type', models.CharField(choices=[('player', 'Player'), ('organizer', 'Organizer'), ('user', 'User')], max_length=10)),
+                ('subject_id', models.BigIntegerField()),
+                ('action', models.CharField(choices=[('IN', 'Check In'), ('OUT', 'Check Out')], max_length=3)),
+                ('device', models.CharField(blank=True, max_length=255, null=True)),
+                ('timestamp', models.DateTimeField(default=django.utils.timezone.now)),
+                ('booking', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='attendance_events', to='core.booking')),
+            ],
+            options={
+                'verbose_name': 'Attendance Event',
+                'verbose_name_plural': 'Attendance Events',
+                'ordering': ['-timestamp'],
+                'indexes': [models.Index(fields=['subject_type', 'subject_id', 'timestamp'], name='core_attevent_subject_idx'), models.Index(fields=['timestamp'], include=('subject_type', 'subject_id', 'action'), name='core_attevent_ts_idx')],
+            },
+        ),
+        migrations.RunPython(copy_legacy_logs, restore_legacy_logs),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(drop_legacy_tables, recreate_legacy_tables),
+                migrations.RunSQL(LOG_VIEWS, reverse_sql=[
+                    'DROP VIEW core_checkinlog',
+                    'DROP VIEW core_organizercheckinlog',
+                    'DROP VIEW core_usercheckinlog',
+                ]),
+            ],
+            state_operations=[
+                migrations.RemoveIndex(model_name='checkinlog', name='core_checkinlog_ts_idx'),
+                migrations.RemoveIndex(model_name='organizercheckinlog', name='core_orgcheckinlog_ts_idx'),
+                migrations.RemoveIndex(model_name='usercheckinlog', name='core_usercheckinlog_ts_idx'),
+                migrations.AlterField(
+                    model_name='checkinlog',
+                    name='player',
+                    field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='check_logs', to='core.player'),
+                ),
+                migrations.AlterField(
+                    model_name='checkinlog',
+                    name='timestamp',
+                    field=models.DateTimeField(),
+                ),
+                migrations.AlterField(
+                    model_name='organizercheckinlog',
+                    name='booking',
+                    field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='organizer_checkin_logs', to='core.booking'),
+                ),
+                migrations.AlterField(
+                    model_name='organizercheckinlog',
+                    name='user',
+                    field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, to='core.customuser'),
+                ),
+                migrations.AlterField(
+                    model_name='organizercheckinlog',
+                    name='timestamp',
+                    field=models.DateTimeField(),
+                ),
+                migrations.AlterField(
+                    model_name='usercheckinlog',
+                    name='user',
+                    field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='checkin_logs', to='core.customuser'),
+                ),
+                migrations.AlterField(
+                    model_name='usercheckinlog',
+                    name='timestamp',
+                    field=models.DateTimeField(),
+                ),
+                migrations.AlterModelOptions(
+                    name='checkinlog',
+                    options={'managed': False, 'ordering': ['-timestamp'], 'verbose_name': 'Check-In Log', 'verbose_name_plural': 'Check-In Logs'},
+                ),
+                migrations.AlterModelOptions(
+                    name='organizercheckinlog',
+                    options={'managed': False, 'ordering': ['-timestamp']},
+                ),
+                migrations.AlterModelOptions(
+                    name='usercheckinlog',
+                    options={'managed': False, 'ordering': ['-timestamp']},
+                ),
+            ],
+        ),
+    ]
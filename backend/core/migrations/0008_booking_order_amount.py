@@ -0,0 +1,18 @@
+# Generated by Django 4.2.8 on 2026-10-19 02:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_email_outbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='order_amount',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+    ]
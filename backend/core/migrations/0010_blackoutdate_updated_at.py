@@ -0,0 +1,20 @@
+# Generated by Django 4.2.8 on 2026-10-19 03:12
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_payment_webhook_event'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blackoutdate',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.8 on 2026-10-19 03:40
+
+from django.db import migrations
+
+
+def rebuild_stats(apps, schema_editor):
+    # players/check_ins now count only players on confirmed bookings
+    from core.stats import rebuild_daily_stats
+    rebuild_daily_stats(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_sync_updated_at_indexes_tombstones'),
+    ]
+
+    operations = [
+        migrations.RunPython(rebuild_stats, migrations.RunPython.noop),
+    ]
@@ -1,29 +1,19 @@
 """
 Models for Red Ball Cricket Academy Management System
 """
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser, BaseUserManager
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
+from django.core.cache import cache
 from django.dispatch import receiver
 from django.utils.translation import gettext_lazy as _
 from django.core.validators import MinValueValidator
 from django.utils import timezone
-import qrcode
-from io import BytesIO
-from django.core.files import File
 from PIL import Image
 import json
 from django.conf import settings
-from django.core.mail import send_mail
-try:
-    # Optional Celery task for async emails; fallback to direct send if unavailable
-    from .tasks import send_player_credentials_email  # type: ignore
-except Exception:
-    send_player_credentials_email = None
-try:
-    from .tasks import send_player_credentials_email
-except Exception:
-    send_player_credentials_email = None
+from django.core.files.base import ContentFile
+from .qr_tokens import make_compact_token, render_qr_png, KIND_PLAYER, KIND_ORGANIZER, KIND_USER
 
 
 class CustomUserManager(BaseUserManager):
@@ -74,42 +64,39 @@ class CustomUser(AbstractUser):
         verbose_name = _('user')
         verbose_name_plural = _('users')
     
+    def refresh_from_db(self, using=None, fields=None):
+        # A user built from JWT claims (core.authentication) has most fields
+        # deferred; load all of them on the first access instead of one per field
+        if fields is not None and getattr(self, 'token_user_type', None):
+            fields = set(fields) | self.get_deferred_fields()
+        super().refresh_from_db(using=using, fields=fields)
+    
     def __str__(self):
         return self.email
     
-    def generate_qr_code(self):
-        """Generate QR code and token for user"""
+    def make_qr_token(self):
+        """Build a signed QR token for this user (no image rendering)"""
         from django.core import signing
         
-        # Create token with user info
-        payload = {
-            'user_id': self.id,
-            'email': self.email,
-            'ts': timezone.now().isoformat()
-        }
-        token = signing.dumps(payload, salt='user-qr-token')
+        if settings.QR_COMPACT_TOKENS:
+            token = make_compact_token(KIND_USER, self.id)
+        else:
+            payload = {
+                'user_id': self.id,
+                'email': self.email,
+                'ts': timezone.now().isoformat()
+            }
+            token = signing.dumps(payload, salt='user-qr-token')
+        return token
+
+    def generate_qr_code(self):
+        """Generate QR code and token for user"""
+        token = self.make_qr_token()
         self.qr_token = token
         
-        # Generate QR code image
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
-        )
-        qr.add_data(token)
-        qr.make(fit=True)
-        
-        img = qr.make_image(fill_color="black", back_color="white")
-        
-        # Save to BytesIO
-        buffer = BytesIO()
-        img.save(buffer, format='PNG')
-        buffer.seek(0)
-        
-        # Save to ImageField
+        # Generate QR code image and save to ImageField
         filename = f'user_{self.id}_qr.png'
-        self.qr_code.save(filename, File(buffer), save=False)
+        self.qr_code.save(filename, ContentFile(render_qr_png(token)), save=False)
         
         return token
 class UserProfile(models.Model):
@@ -145,9 +132,6 @@ def ensure_user_qr_code(sender, instance, created, **kwargs):
 
 from django.core.validators import MinValueValidator
 from django.utils import timezone
-import qrcode
-from io import BytesIO
-from django.core.files import File
 from PIL import Image
 import json
 
@@ -169,6 +153,7 @@ class Sport(models.Model):
 
     class Meta:
         ordering = ['name']
+        indexes = [models.Index(fields=['updated_at'], name='core_sport_updated_idx')]
         verbose_name = 'Sport'
         verbose_name_plural = 'Sports'
 
@@ -265,6 +250,7 @@ class BlackoutDate(models.Model):
     reason = models.CharField(max_length=255)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         verbose_name = 'Blackout Date'
@@ -301,29 +287,59 @@ class TimeSlot(models.Model):
     class Meta:
         ordering = ['date', 'start_time']
         unique_together = ['sport', 'date', 'start_time']
+        indexes = [models.Index(fields=['updated_at'], name='core_slot_updated_idx')]
         verbose_name = 'Time Slot'
         verbose_name_plural = 'Time Slots'
 
     def __str__(self):
         return f"{self.sport.name} - {self.date} ({self.start_time} - {self.end_time})"
 
+    @property
+    def is_free(self):
+        """Not booked and not disabled (counted as a free slot in DailySportStats)"""
+        return not self.is_booked and not self.admin_disabled
+
+    def save(self, *args, **kwargs):
+        created = self._state.adding
+        with transaction.atomic():
+            # Keep the daily rollup in step with slot creation and booked/free flips. The
+            # stored row is read under a lock so concurrent saves can't count one flip twice.
+            stored = None if created else (
+                TimeSlot.objects.select_for_update().filter(pk=self.pk)
+                .values('is_booked', 'admin_disabled').first()
+            )
+            was_free = bool(stored) and not stored['is_booked'] and not stored['admin_disabled']
+            super().save(*args, **kwargs)
+            if created or was_free != self.is_free:
+                DailySportStats.bump(
+                    self.sport_id, self.date,
+                    slots=1 if created else 0,
+                    free_slots=int(self.is_free) - int(was_free),
+                )
+
     def is_available(self):
         """Check if slot is available for booking"""
         # Check basic availability conditions
         if self.is_booked or self.admin_disabled or self.date < timezone.now().date():
             return False
         
-        # Check if there's an active blackout date for this sport and date
-        if BlackoutDate.objects.filter(
-            sport=self.sport,
-            date=self.date,
-            is_active=True
-        ).exists():
+        # Check if there's an active blackout date for this sport and date (cached)
+        from .refdata import blackout_dates
+        if self.date in blackout_dates(self.sport_id):
             return False
         
         return True
 
 
+NOT_COUNTED = (False, False, 0)
+
+
+def counted_booking_state(payment_verified, is_cancelled, amount_paid):
+    """(confirmed, cancelled, revenue) of a booking as counted in DailySportStats"""
+    confirmed = payment_verified and not is_cancelled
+    return confirmed, is_cancelled, (amount_paid or 0) if confirmed else 0
+
+
 class Booking(models.Model):
     """Booking made by users"""
     user = models.ForeignKey(
@@ -347,6 +363,8 @@ class Booking(models.Model):
     organizer_check_in_count = models.IntegerField(default=0)  # 0=registered, 1=in, 2=out
     payment_id = models.CharField(max_length=255, blank=True, null=True)
     order_id = models.CharField(max_length=255, blank=True, null=True)
+    # Amount (rupees) the Razorpay order in order_id was created for
+    order_amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     amount_paid = models.DecimalField(
         max_digits=10, 
         decimal_places=2,
@@ -369,51 +387,76 @@ class Booking(models.Model):
             self.status = 'confirmed'
         else:
             self.status = 'pending'
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            # What DailySportStats counts for the stored row, read under a lock so two
+            # saves of the same booking can't both add the same change
+            stored = None if self._state.adding else (
+                Booking.objects.select_for_update().filter(pk=self.pk)
+                .values('payment_verified', 'is_cancelled', 'amount_paid').first()
+            )
+            old = counted_booking_state(**stored) if stored else NOT_COUNTED
+            super().save(*args, **kwargs)
+            self._update_daily_stats(old)
+
+    def _counted_state(self):
+        """(confirmed, cancelled, revenue) as counted in DailySportStats"""
+        return counted_booking_state(self.payment_verified, self.is_cancelled, self.amount_paid)
+
+    def _update_daily_stats(self, old, deleted=False):
+        new = NOT_COUNTED if deleted else self._counted_state()
+        if old == new:
+            return
+        players = {}
+        if old[0] != new[0] and not deleted:
+            # Players (and their check-ins) count only while the booking is confirmed.
+            # On delete the players' own post_delete takes them out first.
+            sign = 1 if new[0] else -1
+            counts = self.players.aggregate(n=models.Count('id'),
+                                            checked_in=models.Count('id', filter=models.Q(last_check_in__isnull=False)))
+            players = {'players': sign * counts['n'], 'check_ins': sign * counts['checked_in']}
+        DailySportStats.bump(
+            self.slot.sport_id, self.slot.date,
+            bookings=int(new[0]) - int(old[0]),
+            cancellations=int(new[1]) - int(old[1]),
+            revenue=new[2] - old[2],
+            **players,
+        )
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [models.Index(fields=['updated_at'], name='core_booking_updated_idx')]
         verbose_name = 'Booking'
         verbose_name_plural = 'Bookings'
 
     def __str__(self):
         return f"Booking #{self.id} - {self.user.email} - {self.slot}"
 
-    def generate_organizer_qr_code(self):
-        """Generate QR code for the organizer (user) for this specific booking"""
+    def make_organizer_qr_token(self):
+        """Build a signed organizer QR token for this booking (no image rendering)"""
         from django.core import signing
         
-        payload = {
-            'booking_id': self.id,
-            'user_id': self.user.id,
-            'type': 'organizer',
-            'slot_date': str(self.slot.date),
-            'sport': self.slot.sport.name if self.slot and self.slot.sport else 'Sport',
-            'ts': timezone.now().isoformat()
-        }
-        token = signing.dumps(payload, salt='organizer-qr-token')
+        if settings.QR_COMPACT_TOKENS:
+            token = make_compact_token(KIND_ORGANIZER, self.id, on_date=self.slot.date)
+        else:
+            payload = {
+                'booking_id': self.id,
+                'user_id': self.user.id,
+                'type': 'organizer',
+                'slot_date': str(self.slot.date),
+                'sport': self.slot.sport.name if self.slot and self.slot.sport else 'Sport',
+                'ts': timezone.now().isoformat()
+            }
+            token = signing.dumps(payload, salt='organizer-qr-token')
+        return token
+
+    def generate_organizer_qr_code(self):
+        """Generate QR code for the organizer (user) for this specific booking"""
+        token = self.make_organizer_qr_token()
         self.organizer_qr_token = token
         
-        # Generate QR code image
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
-        )
-        qr.add_data(token)
-        qr.make(fit=True)
-        
-        img = qr.make_image(fill_color="black", back_color="white")
-        
-        # Save to BytesIO
-        buffer = BytesIO()
-        img.save(buffer, format='PNG')
-        buffer.seek(0)
-        
-        # Save to ImageField
+        # Generate QR code image and save to ImageField
         filename = f'organizer_booking_{self.id}_qr.png'
-        self.organizer_qr_code.save(filename, File(buffer), save=False)
+        self.organizer_qr_code.save(filename, ContentFile(render_qr_png(token)), save=False)
         
         return token
 
@@ -450,70 +493,54 @@ class Player(models.Model):
     last_check_in = models.DateTimeField(null=True, blank=True)
     last_check_out = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['name']
+        indexes = [models.Index(fields=['updated_at'], name='core_player_updated_idx')]
         verbose_name = 'Player'
         verbose_name_plural = 'Players'
 
     def __str__(self):
         return f"{self.name} ({self.email})"
 
+    def make_qr_token(self):
+        """Build a signed (tamper-proof) QR token for this player (no image rendering)"""
+        from django.core import signing
+        if settings.QR_COMPACT_TOKENS:
+            token = make_compact_token(KIND_PLAYER, self.id, self.booking.id, on_date=self.booking.slot.date)
+        else:
+            payload = {
+                'player_id': self.id,
+                'booking_id': self.booking.id,
+                'ts': timezone.now().isoformat(),
+            }
+            token = signing.dumps(payload, salt='player-qr-token')
+        return token
+
     def generate_qr_code(self):
         """Generate QR code with a signed token payload"""
-        from django.core import signing
-        payload = {
-            'player_id': self.id,
-            'booking_id': self.booking.id,
-            'ts': timezone.now().isoformat(),
-        }
-        # Signed (tamper-proof) token
-        token = signing.dumps(payload, salt='player-qr-token')
+        token = self.make_qr_token()
         self.qr_token = token
 
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
-        )
-        # Encode only the token in the QR image
-        qr.add_data(token)
-        qr.make(fit=True)
-
-        img = qr.make_image(fill_color="black", back_color="white")
-        
-        # Save to BytesIO
-        buffer = BytesIO()
-        img.save(buffer, format='PNG')
-        buffer.seek(0)
-        
-        # Save to model
+        # Encode only the token in the QR image and save to model
         filename = f'player_{self.id}_qr.png'
-        self.qr_code.save(filename, File(buffer), save=False)
-        buffer.close()
+        self.qr_code.save(filename, ContentFile(render_qr_png(token)), save=False)
 
     def can_check_in(self):
         """Check if player can check in today"""
         booking_date = self.booking.slot.date
-        today = timezone.now().date()
+        today = timezone.localdate()
         return booking_date == today and self.check_in_count < 2
 
     def check_in(self):
-        """Mark player as checked in/out"""
-        if self.can_check_in():
-            self.check_in_count += 1
-            if self.check_in_count == 1:
-                # First scan - Check IN
-                self.last_check_in = timezone.now()
-                self.is_in = True
-            elif self.check_in_count == 2:
-                # Second scan - Check OUT
-                self.last_check_out = timezone.now()
-                self.is_in = False
-            self.save()
+        """Mark player as checked in/out (atomic conditional UPDATE plus log entry)"""
+        from .checkin import CheckInError, check_in_player
+        try:
+            check_in_player(self)
             return True
-        return False
+        except CheckInError:
+            return False
 
     def get_status(self):
         """Get current check-in status"""
@@ -525,21 +552,73 @@ class Player(models.Model):
             return "Checked Out"
 
 
+class AttendanceEvent(models.Model):
+    """Append-only record of every check-in and check-out.
+
+    One row per scan for players, organizers and academy users. CheckInLog,
+    OrganizerCheckInLog and UserCheckInLog are read-only database views over
+    this table; write through core.events.record().
+    """
+    SUBJECT_CHOICES = (
+        ('player', 'Player'),
+        ('organizer', 'Organizer'),
+        ('user', 'User'),
+    )
+    ACTION_CHOICES = (
+        ('IN', 'Check In'),
+        ('OUT', 'Check Out'),
+    )
+    subject_type = models.CharField(max_length=10, choices=SUBJECT_CHOICES)
+    subject_id = models.BigIntegerField()  # Player, Booking (organizer) or CustomUser id
+    booking = models.ForeignKey(
+        Booking,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='attendance_events'
+    )
+    action = models.CharField(max_length=3, choices=ACTION_CHOICES)
+    device = models.CharField(max_length=255, blank=True, null=True)  # Gate device or scan location
+    timestamp = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-timestamp']
+        indexes = [
+            # Per-subject history and the legacy log views
+            models.Index(fields=['subject_type', 'subject_id', 'timestamp'], name='core_attevent_subject_idx'),
+            # Recent activity / retention; covering on PostgreSQL so it is index-only
+            models.Index(fields=['timestamp'], include=['subject_type', 'subject_id', 'action'],
+                         name='core_attevent_ts_idx'),
+        ]
+        verbose_name = 'Attendance Event'
+        verbose_name_plural = 'Attendance Events'
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('Attendance events are append-only')
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.subject_type} #{self.subject_id} - {self.action} at {self.timestamp}"
+
+
 class CheckInLog(models.Model):
-    """Log of check-in/check-out activities"""
+    """Log of check-in/check-out activities (read-only view over AttendanceEvent)"""
     player = models.ForeignKey(
         Player, 
-        on_delete=models.CASCADE, 
+        on_delete=models.DO_NOTHING, 
+        db_constraint=False,
         related_name='check_logs'
     )
     action = models.CharField(
         max_length=10,
         choices=[('IN', 'Check In'), ('OUT', 'Check Out')]
     )
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField()
     location = models.CharField(max_length=255, blank=True, null=True)
 
     class Meta:
+        managed = False
         ordering = ['-timestamp']
         verbose_name = 'Check-In Log'
         verbose_name_plural = 'Check-In Logs'
@@ -549,16 +628,18 @@ class CheckInLog(models.Model):
 
 
 class UserCheckInLog(models.Model):
-    """Log of user check-ins and check-outs"""
+    """Log of user check-ins and check-outs (read-only view over AttendanceEvent)"""
     ACTION_CHOICES = (
         ('IN', 'Check In'),
         ('OUT', 'Check Out'),
     )
-    user = models.ForeignKey('CustomUser', on_delete=models.CASCADE, related_name='checkin_logs')
-    timestamp = models.DateTimeField(auto_now_add=True)
+    user = models.ForeignKey('CustomUser', on_delete=models.DO_NOTHING, db_constraint=False,
+                             related_name='checkin_logs')
+    timestamp = models.DateTimeField()
     action = models.CharField(max_length=3, choices=ACTION_CHOICES)
     
     class Meta:
+        managed = False
         ordering = ['-timestamp']
     
     def __str__(self):
@@ -566,33 +647,379 @@ class UserCheckInLog(models.Model):
 
 
 class OrganizerCheckInLog(models.Model):
-    """Log of organizer check-ins and check-outs for specific bookings"""
+    """Log of organizer check-ins and check-outs for specific bookings (read-only view over AttendanceEvent)"""
     ACTION_CHOICES = (
         ('IN', 'Check In'),
         ('OUT', 'Check Out'),
     )
-    user = models.ForeignKey('CustomUser', on_delete=models.CASCADE, null=True, blank=True)
-    booking = models.ForeignKey('Booking', on_delete=models.CASCADE, related_name='organizer_checkin_logs')
-    timestamp = models.DateTimeField(auto_now_add=True)
+    user = models.ForeignKey('CustomUser', on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True)
+    booking = models.ForeignKey('Booking', on_delete=models.DO_NOTHING, db_constraint=False,
+                                related_name='organizer_checkin_logs')
+    timestamp = models.DateTimeField()
     action = models.CharField(max_length=3, choices=ACTION_CHOICES)
     
     class Meta:
+        managed = False
         ordering = ['-timestamp']
     
     def __str__(self):
         return f"Booking #{self.booking.id} Organizer - {self.action} at {self.timestamp}"
 
 
+class OfflineScan(models.Model):
+    """A scan queued on a gate device while offline and synced later"""
+    KIND_CHOICES = (
+        ('player', 'Player'),
+        ('organizer', 'Organizer'),
+        ('user', 'User'),
+    )
+    STATUS_CHOICES = (
+        ('applied', 'Applied'),
+        ('rejected', 'Rejected'),
+    )
+    device_id = models.CharField(max_length=64)
+    scan_id = models.CharField(max_length=64)  # Client-generated, unique per device
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, blank=True)
+    subject_id = models.BigIntegerField(null=True, blank=True)
+    action = models.CharField(max_length=3, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES)
+    error = models.CharField(max_length=255, blank=True)
+    scanned_at = models.DateTimeField()
+    synced_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-scanned_at']
+        unique_together = ['device_id', 'scan_id']
+        verbose_name = 'Offline Scan'
+        verbose_name_plural = 'Offline Scans'
+
+    def __str__(self):
+        return f"{self.device_id}/{self.scan_id} - {self.status}"
+
+
+class ArchivedCheckInLog(models.Model):
+    """A check-in log row moved out of the hot log tables by archive_checkin_logs.
+
+    Names are copied in, and ids are plain integers rather than foreign keys,
+    so archived rows survive the player, booking or user being deleted.
+    """
+    KIND_CHOICES = (
+        ('player', 'Player'),
+        ('organizer', 'Organizer'),
+        ('user', 'User'),
+    )
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    source_id = models.BigIntegerField()  # AttendanceEvent id (log table id if archived before the event store)
+    timestamp = models.DateTimeField()
+    action = models.CharField(max_length=3)
+    player_id = models.BigIntegerField(null=True, blank=True)
+    booking_id = models.BigIntegerField(null=True, blank=True)
+    user_id = models.BigIntegerField(null=True, blank=True)
+    name = models.CharField(max_length=255, blank=True)  # Player name or user email
+    sport = models.CharField(max_length=100, blank=True)
+    location = models.CharField(max_length=255, blank=True, null=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-timestamp']
+        indexes = [models.Index(fields=['kind', 'timestamp'], name='core_archivedlog_kind_ts_idx')]
+        verbose_name = 'Archived Check-In Log'
+        verbose_name_plural = 'Archived Check-In Logs'
+
+    def __str__(self):
+        return f"{self.kind} #{self.source_id} - {self.action} at {self.timestamp}"
+
+
+class EmailOutbox(models.Model):
+    """An email waiting to be sent by the outbox dispatcher (core.outbox).
+
+    Rows are written in the same transaction as the change that triggers the
+    email, so nothing is sent for a rolled-back change and nothing is lost if
+    SMTP is down.
+    """
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    )
+    to = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['status', 'next_attempt_at'], name='core_emailoutbox_due_idx')]
+        verbose_name = 'Email Outbox'
+        verbose_name_plural = 'Email Outbox'
+
+    def __str__(self):
+        return f"{self.to} - {self.subject} ({self.status})"
+
+    @classmethod
+    def queue(cls, to, subject, body):
+        """Add an email to the outbox (inside the caller's transaction); the
+        emails queued by one transaction are sent as one batch once it commits"""
+        from .dispatch import dispatch_batch
+        from .tasks import send_emails_batch
+        email = cls.objects.create(to=to, subject=subject[:255], body=body)
+        dispatch_batch(send_emails_batch, email.pk)
+        return email
+
+
+class PaymentWebhookEvent(models.Model):
+    """A Razorpay webhook delivery, stored as received (core.webhooks applies it).
+
+    event_id is unique, so Razorpay's redeliveries of the same event collapse
+    into one row and are applied once.
+    """
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('processed', 'Processed'),
+        ('ignored', 'Ignored'),
+        ('failed', 'Failed'),
+    )
+    event_id = models.CharField(max_length=100, unique=True)
+    event = models.CharField(max_length=100)
+    payload = models.JSONField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-received_at']
+        indexes = [models.Index(fields=['status', 'received_at'], name='core_webhook_status_idx')]
+        verbose_name = 'Payment Webhook Event'
+        verbose_name_plural = 'Payment Webhook Events'
+
+    def __str__(self):
+        return f"{self.event} {self.event_id} ({self.status})"
+
+
+class SyncTombstone(models.Model):
+    """A deleted sport, slot, booking or player, reported by /api/sync/ (core.sync).
+
+    user_id is who may see it (None = everyone); a player's deletion is
+    recorded once for the booking's organizer and once for the player's own
+    account. Pruned after SYNC_TOMBSTONE_DAYS by prune_sync_tombstones.
+    """
+    KIND_CHOICES = (
+        ('sport', 'Sport'),
+        ('slot', 'Slot'),
+        ('booking', 'Booking'),
+        ('player', 'Player'),
+    )
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    # Not a foreign key: tombstones outlive the users they were recorded for
+    user_id = models.BigIntegerField(null=True, blank=True)
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['deleted_at']
+        indexes = [models.Index(fields=['deleted_at'], name='core_tombstone_deleted_idx')]
+        verbose_name = 'Sync Tombstone'
+        verbose_name_plural = 'Sync Tombstones'
+
+    def __str__(self):
+        return f"{self.kind} #{self.object_id} deleted {self.deleted_at}"
+
+
+def player_credentials_email(name, email, sport_name, date_str, time_window):
+    """Subject and body of the new player account email"""
+    return 'Your Player Account - Red Ball Cricket Academy', (
+        f"Hello {name},\n\n"
+        f"An account has been created for you at Red Ball Cricket Academy.\n\n"
+        f"Login Details:\n"
+        f"Email: {email}\n"
+        f"Temporary Password: redball\n\n"
+        f"Booking Details:\n"
+        f"Sport: {sport_name}\n"
+        f"Date: {date_str}\n"
+        f"Time: {time_window}\n\n"
+        f"Use the app to view your QR code and check-in on the day of your booking.\n"
+        f"For security, please change your password after first login.\n\n"
+        f"Regards,\nRed Ball Cricket Academy"
+    )
+
+
+class DailySportStats(models.Model):
+    """Per-sport, per-day rollup maintained incrementally by the booking, payment
+    and scan code paths and reconciled nightly (rebuild_daily_stats).
+
+    Rows are keyed by the slot date, so a booking counts on the day it is played.
+    """
+    sport = models.ForeignKey(Sport, on_delete=models.CASCADE, related_name='daily_stats')
+    date = models.DateField()
+    bookings = models.IntegerField(default=0)  # Confirmed, not cancelled
+    cancellations = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    players = models.IntegerField(default=0)
+    check_ins = models.IntegerField(default=0)  # Players checked in
+    slots = models.IntegerField(default=0)
+    free_slots = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['date', 'sport']
+        unique_together = ['sport', 'date']
+        indexes = [models.Index(fields=['date'], name='core_dailystats_date_idx')]
+        verbose_name = 'Daily Sport Stats'
+        verbose_name_plural = 'Daily Sport Stats'
+
+    def __str__(self):
+        return f"{self.sport_id} - {self.date}"
+
+    @classmethod
+    def bump(cls, sport_id, day, **deltas):
+        """Atomically add deltas to the (sport, day) row, creating it if needed"""
+        from django.db import IntegrityError
+        from django.db.models import F
+
+        deltas = {field: delta for field, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        updates = {field: F(field) + delta for field, delta in deltas.items()}
+        updates['updated_at'] = timezone.now()
+        rows = cls.objects.filter(sport_id=sport_id, date=day)
+        if rows.update(**updates):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(sport_id=sport_id, date=day, **deltas)
+        except IntegrityError:
+            # Another request created the row first
+            rows.update(**updates)
+
+
+@receiver(post_delete, sender=Booking)
+def remove_booking_from_daily_stats(sender, instance, **kwargs):
+    # A deleted booking was collected from the database, so its fields are the stored ones
+    instance._update_daily_stats(instance._counted_state(), deleted=True)
+
+
+@receiver(post_delete, sender=TimeSlot)
+def remove_slot_from_daily_stats(sender, instance, **kwargs):
+    DailySportStats.bump(instance.sport_id, instance.date, slots=-1, free_slots=-int(instance.is_free))
+
+
+@receiver(post_save, sender=Player)
+@receiver(post_delete, sender=Player)
+def count_player_in_daily_stats(sender, instance, created=False, **kwargs):
+    if kwargs.get('signal') is post_save and not created:
+        return
+    # Only players on confirmed bookings are counted (Booking._update_daily_stats moves them)
+    slot = TimeSlot.objects.filter(
+        booking__id=instance.booking_id, booking__payment_verified=True, booking__is_cancelled=False,
+    ).values('sport_id', 'date').first()
+    if slot:
+        sign = 1 if created else -1
+        DailySportStats.bump(slot['sport_id'], slot['date'], players=sign,
+                             check_ins=sign * int(instance.last_check_in is not None))
+
+
+DASHBOARD_STATS_CACHE_KEY = 'dashboard_stats'
+
+
+# Drop cached dashboard stats whenever bookings, payments or players change
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+@receiver(post_save, sender=Player)
+@receiver(post_delete, sender=Player)
+def invalidate_dashboard_stats(sender, **kwargs):
+    cache.delete(DASHBOARD_STATS_CACHE_KEY)
+
+
+OCCUPANCY_VERSION_KEY = 'occupancy_version'
+
+
+# Any slot or booking change invalidates cached occupancy heatmaps
+@receiver(post_save, sender=TimeSlot)
+@receiver(post_delete, sender=TimeSlot)
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+def bump_occupancy_version(sender, **kwargs):
+    try:
+        cache.incr(OCCUPANCY_VERSION_KEY)
+    except ValueError:
+        cache.set(OCCUPANCY_VERSION_KEY, 1, None)
+
+
+# Sports and their configuration, breaks and blackouts are cached per sport version (core.refdata)
+@receiver(post_save, sender=Sport)
+@receiver(post_delete, sender=Sport)
+@receiver(post_save, sender=BookingConfiguration)
+@receiver(post_delete, sender=BookingConfiguration)
+@receiver(post_save, sender=BreakTime)
+@receiver(post_delete, sender=BreakTime)
+@receiver(post_save, sender=BlackoutDate)
+@receiver(post_delete, sender=BlackoutDate)
+def bump_refdata_version(sender, instance, **kwargs):
+    from .refdata import bump_version
+    bump_version(instance.pk if sender is Sport else instance.sport_id)
+
+
+# Blackouts change is_available of the sport's slots; touch them so /api/sync/ re-sends them
+@receiver(post_save, sender=BlackoutDate)
+@receiver(post_delete, sender=BlackoutDate)
+def touch_slots_for_blackout(sender, instance, **kwargs):
+    TimeSlot.objects.filter(sport_id=instance.sport_id, date__gte=timezone.localdate()).update(
+        updated_at=timezone.now())
+
+
+# Deletions are reported to syncing clients through tombstones
+@receiver(post_delete, sender=Sport)
+@receiver(post_delete, sender=TimeSlot)
+@receiver(post_delete, sender=Booking)
+@receiver(post_delete, sender=Player)
+def record_sync_tombstone(sender, instance, **kwargs):
+    if sender is Booking:
+        kind, user_ids = 'booking', [instance.user_id]
+    elif sender is Player:
+        # Players are deleted before their booking in a cascade, so the booking is still there.
+        # It is touched too: its nested players and player_count changed.
+        booking = Booking.objects.filter(pk=instance.booking_id)
+        owner = booking.values_list('user_id', flat=True).first()
+        booking.update(updated_at=timezone.now())
+        kind, user_ids = 'player', {owner, instance.user_id} - {None}
+    else:
+        kind, user_ids = ('sport' if sender is Sport else 'slot'), [None]
+    SyncTombstone.objects.bulk_create([
+        SyncTombstone(kind=kind, object_id=instance.pk, user_id=user_id) for user_id in user_ids
+    ])
+
+
+@receiver(post_delete, sender=Player)
+@receiver(post_delete, sender=CustomUser)
+def delete_subject_attendance_events(sender, instance, **kwargs):
+    # Player and user events reference their subject by id only (organizer events cascade with the booking)
+    subject_type = 'player' if sender is Player else 'user'
+    AttendanceEvent.objects.filter(subject_type=subject_type, subject_id=instance.pk).delete()
+
+
 # Automatically generate organizer QR when booking is confirmed
 @receiver(post_save, sender=Booking)
 def generate_organizer_qr_on_booking_confirm(sender, instance: Booking, created, **kwargs):
-    """Generate organizer QR code when booking is payment verified"""
+    """Issue the organizer QR token when a booking is payment verified; the
+    image is rendered by render_organizer_qr_batch after commit"""
     if instance.payment_verified and not instance.organizer_qr_token:
         try:
-            instance.generate_organizer_qr_code()
-            instance.save(update_fields=['organizer_qr_token', 'organizer_qr_code'])
+            instance.organizer_qr_token = instance.make_organizer_qr_token()
+            Booking.objects.filter(pk=instance.pk).update(organizer_qr_token=instance.organizer_qr_token,
+                                                          updated_at=timezone.now())
         except Exception as e:
-            print(f"Failed to generate organizer QR for booking {instance.id}: {e}")
+            print(f"Failed to issue organizer QR token for booking {instance.id}: {e}")
+            return
+        from .dispatch import dispatch_batch
+        from .tasks import render_organizer_qr_batch
+        dispatch_batch(render_organizer_qr_batch, instance.pk)
 
 
 # Automatically handle Player creation side-effects
@@ -601,7 +1028,7 @@ def ensure_player_account_qr_and_email(sender, instance: Player, created, **kwar
     """On Player create:
     - Create/attach a CustomUser with default password 'redball' if missing
     - Ensure profile.user_type = 'player'
-    - Generate QR code if not present
+    - Issue a QR token if not present and queue the image render
     - Email credentials and booking details
     """
     if not created:
@@ -634,7 +1061,7 @@ def ensure_player_account_qr_and_email(sender, instance: Player, created, **kwar
             print(f"   ✅ User profile set to 'player'")
         # Save relation
         player.user = user
-        player.save(update_fields=['user'])
+        player.save(update_fields=['user', 'updated_at'])
         print(f"   ✅ Linked player to user account")
     else:
         if user:
@@ -642,55 +1069,35 @@ def ensure_player_account_qr_and_email(sender, instance: Player, created, **kwar
         else:
             print(f"   ⚠️  Player has no email, skipping user creation")
 
-    # 2) Generate QR code if missing
+    # 2) Issue the QR token now; the image is rendered by render_qr_batch after commit
     if not player.qr_token:
         try:
-            print(f"   📱 Generating QR code for player...")
-            player.generate_qr_code()
-            player.save(update_fields=['qr_token', 'qr_code'])
-            print(f"   ✅ QR code generated")
+            player.qr_token = player.make_qr_token()
+            player.save(update_fields=['qr_token', 'updated_at'])
+            print(f"   ✅ QR token issued")
         except Exception as e:
-            print(f"   ❌ Failed to generate QR for player {player.id}: {e}")
+            print(f"   ❌ Failed to issue QR token for player {player.id}: {e}")
             pass
     else:
         print(f"   ℹ️  Player already has QR code")
+    if player.qr_token and not player.qr_code:
+        from .dispatch import dispatch_batch
+        from .tasks import render_qr_batch
+        dispatch_batch(render_qr_batch, player.pk)
+        print(f"   📱 QR image render queued")
 
-    # 3) Email credentials (best-effort). Prefer Celery if available
-    try:
+    # 3) Email credentials via the outbox (sent by the dispatcher once this transaction commits)
+    if player.email:
         booking = player.booking
         slot = booking.slot if booking else None
-        sport_name = slot.sport.name if slot else ''
-        date_str = str(slot.date) if slot else ''
-        time_window = f"{slot.start_time} - {slot.end_time}" if slot else ''
-        print(f"   📧 Attempting to send credentials email to {player.email}...")
-        if send_player_credentials_email:
-            send_player_credentials_email.delay(player.email, player.name, sport_name, date_str, time_window)
-            print(f"   ✅ Email queued via Celery")
-        else:
-            send_mail(
-                subject='Your Player Account - Red Ball Cricket Academy',
-                message=(
-                    f"Hello {player.name},\n\n"
-                    f"An account has been created for you at Red Ball Cricket Academy.\n\n"
-                    f"Login Details:\n"
-                    f"Email: {player.email}\n"
-                    f"Temporary Password: redball\n\n"
-                    f"Booking Details:\n"
-                    f"Sport: {sport_name}\n"
-                    f"Date: {date_str}\n"
-                    f"Time: {time_window}\n\n"
-                    f"Use the app to view your QR code and check-in on the day of your booking.\n"
-                    f"For security, please change your password after first login.\n\n"
-                    f"Regards,\nRed Ball Cricket Academy"
-                ),
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[player.email] if player.email else [],
-                fail_silently=True,
-            )
-            print(f"   ✅ Email sent directly")
-    except Exception as e:
-        print(f"   ⚠️  Email sending failed (non-critical): {e}")
-        pass
+        subject, body = player_credentials_email(
+            player.name, player.email,
+            sport_name=slot.sport.name if slot else '',
+            date_str=str(slot.date) if slot else '',
+            time_window=f"{slot.start_time} - {slot.end_time}" if slot else '',
+        )
+        EmailOutbox.queue(player.email, subject, body)
+        print(f"   📧 Credentials email queued for {player.email}")
     
     print(f"🎉 Auto account creation completed for {player.name}")
 
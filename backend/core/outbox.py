@@ -0,0 +1,88 @@
+"""
+Email outbox dispatcher
+
+dispatch_outbox() claims due rows (SELECT ... FOR UPDATE SKIP LOCKED on
+PostgreSQL, so parallel dispatchers never send the same row), opens one SMTP
+connection and sends each message over it with send_messages(). A message
+that fails is retried with exponential backoff until EMAIL_OUTBOX_MAX_ATTEMPTS,
+then marked failed. Run it from the send_queued_emails command (cron), the
+drain_email_outbox Celery task, or send_emails_batch for specific rows.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import EmailOutbox
+
+
+def backoff(attempts):
+    """Delay before retry number `attempts` (1-based), capped"""
+    return timedelta(seconds=min(
+        settings.EMAIL_OUTBOX_RETRY_SECONDS * 2 ** (attempts - 1),
+        settings.EMAIL_OUTBOX_MAX_RETRY_SECONDS,
+    ))
+
+
+def _failed(row, now, error):
+    row.attempts += 1
+    row.last_error = error[:2000]
+    if row.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+        row.status = 'failed'
+    else:
+        row.next_attempt_at = now + backoff(row.attempts)
+
+
+def dispatch_outbox(batch_size=100, connection=None, ids=None):
+    """Send one batch of due emails (only rows in `ids`, if given).
+    Returns (sent, failed) counts for the batch."""
+    now = timezone.now()
+    with transaction.atomic():
+        due = EmailOutbox.objects.select_for_update(skip_locked=True).filter(status='pending', next_attempt_at__lte=now)
+        if ids is not None:
+            due = due.filter(pk__in=ids)
+        rows = list(due.order_by('next_attempt_at', 'id')[:batch_size])
+        if not rows:
+            return 0, 0
+
+        connection = connection or get_connection(fail_silently=False)
+        sent = failed = 0
+        try:
+            connection.open()
+        except Exception as e:
+            # SMTP unreachable: every row in the batch waits for its next attempt
+            for row in rows:
+                _failed(row, now, f'Connection failed: {e}')
+            failed = len(rows)
+        else:
+            try:
+                for row in rows:
+                    message = EmailMessage(row.subject, row.body, settings.DEFAULT_FROM_EMAIL, [row.to],
+                                           connection=connection)
+                    try:
+                        connection.send_messages([message])
+                    except Exception as e:
+                        _failed(row, now, str(e))
+                        failed += 1
+                    else:
+                        row.status, row.sent_at, row.last_error = 'sent', timezone.now(), ''
+                        sent += 1
+            finally:
+                connection.close()
+
+        EmailOutbox.objects.bulk_update(rows, ['status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at'])
+    return sent, failed
+
+
+def drain_outbox(batch_size=100, max_batches=50):
+    """Dispatch batches until nothing is due (or max_batches). Returns total (sent, failed)."""
+    total_sent = total_failed = 0
+    for _ in range(max_batches):
+        sent, failed = dispatch_outbox(batch_size)
+        total_sent += sent
+        total_failed += failed
+        if sent + failed < batch_size:
+            break
+    return total_sent, total_failed
@@ -0,0 +1,192 @@
+"""
+Razorpay gateway
+
+One razorpay.Client per process, built on a requests.Session whose connection
+pool keeps the TLS connection to the API open between payments. Calls carry
+RAZORPAY_TIMEOUT (connect, read) and failed connections are retried
+RAZORPAY_MAX_RETRIES times; only GETs are retried after a 5xx, so an order is
+never created twice by a retry. Signature checks are a local HMAC and never
+touch the network.
+
+RAZORPAY_BASE_URL points the client at another host, e.g. the offline stub in
+core.razorpay_stub (`python manage.py razorpay_stub`).
+"""
+import hashlib
+import hmac
+import threading
+from decimal import Decimal
+from functools import lru_cache
+
+import razorpay
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class GatewayError(Exception):
+    """Raised when Razorpay cannot be reached or rejects a request"""
+
+
+class OrderError(Exception):
+    """Raised when a booking cannot be paid for"""
+
+
+class _Client(razorpay.Client):
+    # The stock client looks its own version up through pkg_resources on every request
+    @lru_cache(maxsize=None)
+    def _get_version(self):
+        return super()._get_version()
+
+
+_lock = threading.Lock()
+_client = None
+
+
+def _session():
+    retries = Retry(
+        total=settings.RAZORPAY_MAX_RETRIES,
+        connect=settings.RAZORPAY_MAX_RETRIES,
+        read=0,
+        status=settings.RAZORPAY_MAX_RETRIES,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset({'GET'}),
+        backoff_factor=0.2,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.RAZORPAY_POOL_SIZE, max_retries=retries)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_client():
+    """The process-wide Razorpay client"""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                if not settings.RAZORPAY_KEY_ID or not settings.RAZORPAY_KEY_SECRET:
+                    raise GatewayError('Razorpay credentials not configured')
+                _client = _Client(
+                    session=_session(),
+                    auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET),
+                    base_url=settings.RAZORPAY_BASE_URL,
+                )
+    return _client
+
+
+def reset_client():
+    """Drop the cached client (after changing credentials or RAZORPAY_BASE_URL)"""
+    global _client
+    with _lock:
+        if _client is not None:
+            _client.session.close()
+        _client = None
+
+
+def _call(method, *args, **kwargs):
+    try:
+        return method(*args, timeout=tuple(settings.RAZORPAY_TIMEOUT), **kwargs)
+    except (razorpay.errors.BadRequestError, razorpay.errors.GatewayError,
+            razorpay.errors.ServerError, requests.RequestException, ValueError) as e:
+        raise GatewayError(str(e) or e.__class__.__name__) from e
+
+
+def create_order(amount, receipt=None, notes=None, currency='INR'):
+    """Create an auto-captured order for `amount` paise"""
+    data = {'amount': amount, 'currency': currency, 'payment_capture': 1, 'notes': notes or {}}
+    if receipt:
+        data['receipt'] = receipt
+    client = get_client()
+    return _call(client.order.create, data=data)
+
+
+def fetch_order(order_id):
+    client = get_client()
+    return _call(client.order.fetch, order_id)
+
+
+def order_payments(order_id):
+    """Payments made against an order (list of payment dicts)"""
+    client = get_client()
+    return _call(client.order.payments, order_id).get('items', [])
+
+
+def fetch_payment(payment_id):
+    client = get_client()
+    return _call(client.payment.fetch, payment_id)
+
+
+def payment_pages(start, end, page_size=100):
+    """Yield pages (lists) of payments created in [start, end) (Unix timestamps)"""
+    client = get_client()
+    skip = 0
+    while True:
+        page = _call(client.payment.all, {'from': start, 'to': end, 'count': page_size, 'skip': skip})
+        items = page.get('items', [])
+        if items:
+            yield items
+        if len(items) < page_size:
+            return
+        skip += page_size
+
+
+def _signature(message, secret):
+    return hmac.new(secret.encode(), message.encode() if isinstance(message, str) else message,
+                    hashlib.sha256).hexdigest()
+
+
+def payment_signature(order_id, payment_id, secret=None):
+    """The signature Checkout returns for a successful payment"""
+    return _signature(f'{order_id}|{payment_id}', secret or settings.RAZORPAY_KEY_SECRET)
+
+
+def verify_payment_signature(order_id, payment_id, signature):
+    """True if `signature` is Razorpay's HMAC of order_id|payment_id"""
+    if not settings.RAZORPAY_KEY_SECRET or not signature:
+        return False
+    return hmac.compare_digest(payment_signature(order_id, payment_id), str(signature))
+
+
+def webhook_signature(body, secret=None):
+    """The X-Razorpay-Signature of a webhook body"""
+    return _signature(body, secret or settings.RAZORPAY_WEBHOOK_SECRET)
+
+
+def verify_webhook_signature(body, signature):
+    """True if `signature` is the HMAC of the raw webhook body with the webhook secret"""
+    if not settings.RAZORPAY_WEBHOOK_SECRET or not signature:
+        return False
+    return hmac.compare_digest(webhook_signature(body), str(signature))
+
+
+def to_paise(amount):
+    return int((Decimal(amount) * 100).to_integral_value())
+
+
+def order_for_booking(booking_id):
+    """The open Razorpay order for a booking, created only if there is none for its current price.
+
+    The booking row is locked while the order is looked up or created, so
+    concurrent taps on "Pay" share one remote order. Returns (booking, reused).
+    """
+    from .models import Booking
+    with transaction.atomic():
+        booking = Booking.objects.select_for_update(of=('self',)).select_related('slot').get(pk=booking_id)
+        if booking.is_cancelled:
+            raise OrderError('This booking has been cancelled')
+        if booking.payment_verified:
+            raise OrderError('This booking is already paid')
+        price = booking.slot.price
+        if booking.order_id and booking.order_amount == price:
+            return booking, True
+        order = create_order(to_paise(price), receipt=f'booking-{booking.pk}',
+                             notes={'booking_id': str(booking.pk)})
+        booking.order_id, booking.order_amount = order['id'], price
+        Booking.objects.filter(pk=booking.pk).update(order_id=booking.order_id, order_amount=price,
+                                                      updated_at=timezone.now())
+    return booking, False
@@ -0,0 +1,74 @@
+"""
+Batch QR rendering
+
+render_rows() gives a list of players, bookings (organizer QR) or users their
+QR images in one pass: tokens are built (or reused: signals issue the token
+at once and leave the image to a batch task), PNGs rendered (optionally on a
+process pool) and written, and the rows saved with a single bulk_update.
+Used by the backfill_qr command and the render_*_qr_batch Celery tasks.
+"""
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Booking, CustomUser, Player
+from .qr_tokens import render_qr_png
+
+
+def _missing(token_field, image_field):
+    return (Q(**{f'{token_field}__isnull': True}) | Q(**{token_field: ''})
+            | Q(**{f'{image_field}__isnull': True}) | Q(**{image_field: ''}))
+
+
+def _player_targets():
+    return Player.objects.filter(_missing('qr_token', 'qr_code')).select_related('booking__slot__sport')
+
+
+def _organizer_targets():
+    return (
+        Booking.objects.filter(payment_verified=True, is_cancelled=False)
+        .filter(_missing('organizer_qr_token', 'organizer_qr_code'))
+        .select_related('slot__sport', 'user')
+    )
+
+
+def _user_targets():
+    return CustomUser.objects.filter(_missing('qr_token', 'qr_code'))
+
+
+# kind -> (queryset factory, token builder, token field, image field, filename pattern)
+TARGETS = {
+    'player': (_player_targets, lambda p: p.make_qr_token(), 'qr_token', 'qr_code', 'player_{}_qr.png'),
+    'organizer': (_organizer_targets, lambda b: b.make_organizer_qr_token(),
+                  'organizer_qr_token', 'organizer_qr_code', 'organizer_booking_{}_qr.png'),
+    'user': (_user_targets, lambda u: u.make_qr_token(), 'qr_token', 'qr_code', 'user_{}_qr.png'),
+}
+
+
+def render_rows(kind, rows, executor=None):
+    """Render and store QR images for `rows` of the given kind. Returns the number saved."""
+    if not rows:
+        return 0
+    _, make_token, token_field, image_field, filename = TARGETS[kind]
+    tokens = [getattr(row, token_field) or make_token(row) for row in rows]
+    if executor:
+        images = list(executor.map(render_qr_png, tokens, chunksize=max(1, len(tokens) // 32)))
+    else:
+        images = [render_qr_png(token) for token in tokens]
+
+    model, fields = type(rows[0]), [token_field, image_field]
+    touched = {}
+    if hasattr(model, 'updated_at'):
+        # bulk_update skips auto_now, and /api/sync/ relies on it
+        fields.append('updated_at')
+        touched['updated_at'] = timezone.now()
+    for row, token, png in zip(rows, tokens, images):
+        setattr(row, token_field, token)
+        getattr(row, image_field).save(filename.format(row.pk), ContentFile(png), save=False)
+        for field, value in touched.items():
+            setattr(row, field, value)
+
+    with transaction.atomic():
+        model.objects.bulk_update(rows, fields)
+    return len(rows)
@@ -0,0 +1,165 @@
+"""
+Compact QR token format for Red Ball Cricket Academy
+
+Legacy tokens are `signing.dumps` of a JSON payload and often run past 150
+characters. Compact tokens pack the IDs and dates with `struct`, append a
+truncated HMAC and are base32-encoded, so the whole token fits in the QR
+alphanumeric character set (a much smaller QR version).
+
+Layout (version 1, 25 bytes before encoding):
+    kind        uint8   1=player, 2=organizer, 3=user
+    subject_id  uint32  player / booking / user id
+    booking_id  uint32  0 when not applicable
+    date        uint16  days since 2000-01-01, 0 when not applicable
+    issued_at   uint32  unix seconds
+    mac         10 bytes of HMAC-SHA256 over prefix + packed fields
+"""
+import base64
+import hashlib
+import struct
+from datetime import date, timedelta
+from io import BytesIO
+
+import qrcode
+from django.core import signing
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+COMPACT_PREFIX = 'RB1'
+MAC_LENGTH = 10
+
+KIND_PLAYER = 1
+KIND_ORGANIZER = 2
+KIND_USER = 3
+
+# Legacy signing salts mapped to the compact token kind they correspond to
+SALT_KINDS = {
+    'player-qr-token': KIND_PLAYER,
+    'organizer-qr-token': KIND_ORGANIZER,
+    'user-qr-token': KIND_USER,
+}
+
+_FIELDS = struct.Struct('>BIIHI')
+_DATE_EPOCH = date(2000, 1, 1)
+_HMAC_SALT = 'core.qr_tokens.compact'
+
+
+def _mac(body):
+    return salted_hmac(_HMAC_SALT, COMPACT_PREFIX.encode() + body, algorithm='sha256').digest()[:MAC_LENGTH]
+
+
+def is_compact_token(token):
+    """Return True if the token uses the compact format"""
+    return bool(token) and token.startswith(COMPACT_PREFIX)
+
+
+def make_compact_token(kind, subject_id, booking_id=None, on_date=None, issued_at=None):
+    """Build a signed compact token (QR alphanumeric safe)"""
+    issued_at = issued_at or timezone.now()
+    day = (on_date - _DATE_EPOCH).days if on_date else 0
+    body = _FIELDS.pack(kind, subject_id, booking_id or 0, day, int(issued_at.timestamp()))
+    encoded = base64.b32encode(body + _mac(body)).decode('ascii').rstrip('=')
+    return COMPACT_PREFIX + encoded
+
+
+def load_compact_token(token):
+    """Verify a compact token and return its fields as a dict.
+
+    Raises signing.BadSignature if the token is malformed or tampered with.
+    """
+    if not is_compact_token(token):
+        raise signing.BadSignature('Not a compact QR token')
+    encoded = token[len(COMPACT_PREFIX):].upper()
+    try:
+        raw = base64.b32decode(encoded + '=' * (-len(encoded) % 8))
+    except (ValueError, TypeError):
+        raise signing.BadSignature('Malformed compact QR token')
+    if len(raw) != _FIELDS.size + MAC_LENGTH:
+        raise signing.BadSignature('Malformed compact QR token')
+
+    body, mac = raw[:_FIELDS.size], raw[_FIELDS.size:]
+    if not constant_time_compare(mac, _mac(body)):
+        raise signing.BadSignature('Compact QR token signature mismatch')
+
+    kind, subject_id, booking_id, day, issued = _FIELDS.unpack(body)
+    return {
+        'kind': kind,
+        'subject_id': subject_id,
+        'booking_id': booking_id or None,
+        'date': _DATE_EPOCH + timedelta(days=day) if day else None,
+        'issued_at': issued,
+    }
+
+
+def load_qr_token(token, salt):
+    """Verify a QR token in either format and return the legacy payload shape.
+
+    Compact tokens must be of the kind matching `salt`; legacy tokens are
+    checked with `signing.loads` exactly as before.
+    """
+    if not is_compact_token(token):
+        return signing.loads(token, salt=salt)
+
+    data = load_compact_token(token)
+    if data['kind'] != SALT_KINDS.get(salt):
+        raise signing.BadSignature('QR token type mismatch')
+    return _compact_payload(data)
+
+
+def _compact_payload(data):
+    """Map decoded compact token fields onto the legacy payload keys"""
+    payload = {'ts': data['issued_at']}
+    slot_date = str(data['date']) if data['date'] else None
+    if data['kind'] == KIND_PLAYER:
+        payload.update(player_id=data['subject_id'], booking_id=data['booking_id'], date=slot_date)
+    elif data['kind'] == KIND_ORGANIZER:
+        payload.update(booking_id=data['subject_id'], type='organizer', slot_date=slot_date)
+    else:
+        payload.update(user_id=data['subject_id'])
+    return payload
+
+
+def build_qr(token):
+    """Return a fitted QRCode object for the token"""
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=10,
+        border=4,
+    )
+    qr.add_data(token)
+    qr.make(fit=True)
+    return qr
+
+
+def render_qr_png(token):
+    """Render the token as a PNG and return the raw bytes"""
+    img = build_qr(token).make_image(fill_color="black", back_color="white")
+    buffer = BytesIO()
+    img.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def identify_qr_token(token):
+    """Detect the type of a QR token and verify it.
+
+    Returns (kind, payload) where payload has the legacy shape returned by
+    `load_qr_token`. Raises signing.BadSignature if no salt matches.
+    """
+    if is_compact_token(token):
+        data = load_compact_token(token)
+        if data['kind'] not in SALT_KINDS.values():
+            raise signing.BadSignature('Unknown QR token type')
+        return data['kind'], _compact_payload(data)
+
+    for salt, kind in SALT_KINDS.items():
+        try:
+            return kind, signing.loads(token, salt=salt)
+        except signing.BadSignature:
+            continue
+    raise signing.BadSignature('Invalid QR token')
+
+
+def token_digest(token):
+    """Short, stable digest of a token for offline roster lookups"""
+    return hashlib.sha256(token.encode()).hexdigest()[:20]
@@ -0,0 +1,213 @@
+"""
+Offline Razorpay stub
+
+A small in-memory HTTP server that answers the Razorpay endpoints the app
+uses (create/fetch order, order payments, list/fetch payments) so the payment flow
+can be exercised and load-tested without network access:
+
+    python manage.py razorpay_stub --port 8765
+    RAZORPAY_BASE_URL=http://127.0.0.1:8765 python manage.py runserver
+
+pay(order_id) plays the part of Checkout: it records a captured payment and
+returns the razorpay_* fields (with a valid signature) that the client
+would post to /api/payment/verify/, and webhook() builds the matching signed
+webhook delivery for /api/payment/webhook/. Requests must use basic auth with the
+configured key id and secret.
+"""
+import base64
+import itertools
+import json
+import re
+import secrets
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+from .payments import payment_signature, webhook_signature
+
+
+class RazorpayStub:
+    """In-memory order/payment store behind a threaded HTTP server"""
+
+    def __init__(self, key_id, key_secret, host='127.0.0.1', port=0, latency=0.0):
+        self.key_id = key_id
+        self.key_secret = key_secret
+        self.latency = latency
+        self.orders = {}
+        self.payments = {}
+        self.requests = 0
+        self.connections = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _new_id(self, prefix):
+        return f'{prefix}_{next(self._ids):06d}{secrets.token_hex(4)}'
+
+    def create_order(self, data):
+        with self._lock:
+            order = {
+                'id': self._new_id('order'),
+                'entity': 'order',
+                'amount': int(data['amount']),
+                'amount_paid': 0,
+                'amount_due': int(data['amount']),
+                'currency': data.get('currency', 'INR'),
+                'receipt': data.get('receipt'),
+                'status': 'created',
+                'attempts': 0,
+                'notes': data.get('notes') or {},
+                'created_at': int(time.time()),
+            }
+            self.orders[order['id']] = order
+        return order
+
+    def list_payments(self, query):
+        """Payments created in [from, to), newest first, paged with count/skip like the real API"""
+        start, end = int(query.get('from', 0)), int(query.get('to', 2 ** 31))
+        count, skip = min(int(query.get('count', 10)), 100), int(query.get('skip', 0))
+        with self._lock:
+            items = sorted((p for p in self.payments.values() if start <= p['created_at'] < end),
+                           key=lambda p: (p['created_at'], p['id']), reverse=True)
+        page = items[skip:skip + count]
+        return {'entity': 'collection', 'count': len(page), 'items': page}
+
+    def pay(self, order_id, status='captured', amount=None, created_at=None):
+        """Record a payment for the order and return what Checkout hands the client"""
+        with self._lock:
+            order = self.orders[order_id]
+            payment = {
+                'id': self._new_id('pay'),
+                'entity': 'payment',
+                'amount': order['amount'] if amount is None else amount,
+                'currency': order['currency'],
+                'status': status,
+                'order_id': order_id,
+                'method': 'upi',
+                'captured': status == 'captured',
+                'created_at': int(created_at or time.time()),
+            }
+            self.payments[payment['id']] = payment
+            order['attempts'] += 1
+            if status == 'captured':
+                order.update(status='paid', amount_paid=order['amount'], amount_due=0)
+            else:
+                order['status'] = 'attempted'
+        return {
+            'razorpay_order_id': order_id,
+            'razorpay_payment_id': payment['id'],
+            'razorpay_signature': payment_signature(order_id, payment['id'], self.key_secret),
+        }
+
+    def webhook(self, checkout, event='payment.captured', secret=None):
+        """Body and headers of the webhook Razorpay would send for a pay() result"""
+        payment = self.payments[checkout['razorpay_payment_id']]
+        order = self.orders[payment['order_id']]
+        body = json.dumps({
+            'entity': 'event',
+            'event': event,
+            'contains': ['payment', 'order'],
+            'payload': {'payment': {'entity': payment}, 'order': {'entity': order}},
+            'created_at': int(time.time()),
+        }).encode()
+        headers = {
+            'HTTP_X_RAZORPAY_SIGNATURE': webhook_signature(body, secret or self.key_secret),
+            'HTTP_X_RAZORPAY_EVENT_ID': self._new_id('evt'),
+        }
+        return body, headers
+
+    def _handler(self):
+        stub = self
+        routes = [
+            ('POST', re.compile(r'^/v1/orders$'), lambda m, body: (200, stub.create_order(body))),
+            ('GET', re.compile(r'^/v1/orders/([\w]+)$'), lambda m, body: stub._lookup(stub.orders, m.group(1))),
+            ('GET', re.compile(r'^/v1/orders/([\w]+)/payments$'), lambda m, body: (200, {
+                'entity': 'collection',
+                'items': [p for p in stub.payments.values() if p['order_id'] == m.group(1)],
+            })),
+            ('GET', re.compile(r'^/v1/payments$'), lambda m, body: (200, stub.list_payments(body))),
+            ('GET', re.compile(r'^/v1/payments/([\w]+)$'), lambda m, body: stub._lookup(stub.payments, m.group(1))),
+        ]
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                with stub._lock:
+                    stub.connections += 1
+                # Headers and body go out in separate writes; don't let Nagle hold the body
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _dispatch(self, method):
+                length = int(self.headers.get('Content-Length') or 0)
+                raw = self.rfile.read(length) if length else b''
+                with stub._lock:
+                    stub.requests += 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+                expected = 'Basic ' + base64.b64encode(f'{stub.key_id}:{stub.key_secret}'.encode()).decode()
+                if self.headers.get('Authorization') != expected:
+                    return self._reply(401, _error('BAD_REQUEST_ERROR', 'Authentication failed'))
+                path, _, query = self.path.partition('?')
+                for route_method, pattern, view in routes:
+                    match = pattern.match(path)
+                    if match and route_method == method:
+                        if method == 'GET':
+                            body = {key: values[-1] for key, values in parse_qs(query).items()}
+                        else:
+                            try:
+                                body = json.loads(raw or b'{}')
+                            except ValueError:
+                                return self._reply(400, _error('BAD_REQUEST_ERROR', 'Invalid JSON'))
+                        try:
+                            return self._reply(*view(match, body))
+                        except (KeyError, ValueError) as e:
+                            return self._reply(400, _error('BAD_REQUEST_ERROR', f'Invalid request: {e}'))
+                return self._reply(404, _error('BAD_REQUEST_ERROR', 'The requested URL was not found'))
+
+            def do_GET(self):
+                self._dispatch('GET')
+
+            def do_POST(self):
+                self._dispatch('POST')
+
+        return Handler
+
+    def _lookup(self, store, key):
+        if key in store:
+            return 200, store[key]
+        return 400, _error('BAD_REQUEST_ERROR', 'The id provided does not exist')
+
+
+def _error(code, description):
+    return {'error': {'code': code, 'description': description}}
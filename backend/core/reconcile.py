@@ -0,0 +1,146 @@
+"""
+Payment reconciliation
+
+reconcile() pages through the gateway's payments for a time window and
+matches each page to bookings with one `order_id IN (...) OR payment_id IN
+(...)` query. Bookings with a captured payment that are still unpaid are
+fixed in one bulk_update per page; since that skips Booking.save(), the
+stats rollup, dashboard/occupancy caches and organizer QR are brought up to
+date here. Everything else that does not line up is reported, not changed:
+
+  unmatched_payment        captured payment with no booking
+  amount_mismatch          captured amount differs from the booking's order amount
+  paid_but_cancelled       captured payment for a cancelled booking (refund?)
+  duplicate_payment        booking already paid by a different payment
+  pending_without_payment  unpaid booking with an order in the window but no capture
+"""
+from collections import defaultdict
+from datetime import datetime, time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from . import payments
+from .dispatch import dispatch_batch
+from .models import DASHBOARD_STATS_CACHE_KEY, Booking, DailySportStats, Player, bump_occupancy_version
+from .tasks import render_organizer_qr_batch
+
+FIXED = 'marked_paid'
+
+
+def window(start, end):
+    """Aware datetimes for local dates [start, end] inclusive"""
+    tz = timezone.get_current_timezone()
+    return (timezone.make_aware(datetime.combine(start, time.min), tz),
+            timezone.make_aware(datetime.combine(end, time.max), tz))
+
+
+def _row(kind, payment=None, booking=None, detail=''):
+    return {
+        'kind': kind,
+        'payment_id': (payment or {}).get('id', ''),
+        'order_id': (payment or {}).get('order_id') or (booking.order_id if booking else ''),
+        'booking_id': booking.pk if booking else '',
+        'payment_amount': (payment or {}).get('amount', ''),
+        'booking_amount': payments.to_paise(booking.order_amount or booking.amount_paid or 0) if booking else '',
+        'detail': detail,
+    }
+
+
+def _mark_paid(fixed):
+    """Persist bookings found paid and apply the side effects save() would have"""
+    with transaction.atomic():
+        now = timezone.now()
+        for booking in fixed:
+            booking.updated_at = now
+            # Issued here like generate_organizer_qr_on_booking_confirm does, signed
+            # with the SECRET_KEY this command shares with the web service
+            if not booking.organizer_qr_token:
+                booking.organizer_qr_token = booking.make_organizer_qr_token()
+        Booking.objects.bulk_update(fixed, ['payment_verified', 'status', 'payment_id', 'order_id',
+                                            'organizer_qr_token', 'updated_at'])
+        # Their players now count too (see Booking._update_daily_stats)
+        players = {
+            row['booking_id']: row for row in Player.objects.filter(booking__in=fixed).values('booking_id').annotate(
+                n=Count('id'), checked_in=Count('id', filter=Q(last_check_in__isnull=False)),
+            ).order_by()
+        }
+        totals = defaultdict(lambda: [0, 0, 0, 0])
+        for booking in fixed:
+            day = totals[(booking.slot.sport_id, booking.slot.date)]
+            counted = players.get(booking.pk, {'n': 0, 'checked_in': 0})
+            day[0] += 1
+            day[1] += booking.amount_paid or 0
+            day[2] += counted['n']
+            day[3] += counted['checked_in']
+        for (sport_id, day), (count, revenue, n_players, check_ins) in totals.items():
+            DailySportStats.bump(sport_id, day, bookings=count, revenue=revenue,
+                                 players=n_players, check_ins=check_ins)
+        for booking in fixed:
+            dispatch_batch(render_organizer_qr_batch, booking.pk)
+    cache.delete(DASHBOARD_STATS_CACHE_KEY)
+    bump_occupancy_version(sender=Booking)
+
+
+def reconcile(start, end, page_size=100, apply=True):
+    """Reconcile payments created between two aware datetimes.
+
+    Returns (report rows, counts by kind). With apply=False nothing is written
+    and bookings that would be fixed are reported as `marked_paid` all the same.
+    """
+    report = []
+    seen_orders = set()
+    pages = payments.payment_pages(int(start.timestamp()), int(end.timestamp()) + 1, page_size)
+    for page in pages:
+        captured = [p for p in page if p.get('status') == 'captured']
+        order_ids = {p['order_id'] for p in captured if p.get('order_id')}
+        payment_ids = {p['id'] for p in captured}
+        seen_orders.update(order_ids)
+        bookings = list(
+            Booking.objects.filter(Q(order_id__in=order_ids) | Q(payment_id__in=payment_ids))
+            .select_related('slot')
+        )
+        by_order = {b.order_id: b for b in bookings if b.order_id}
+        by_payment = {b.payment_id: b for b in bookings if b.payment_id}
+
+        fixed = []
+        for payment in captured:
+            booking = by_payment.get(payment['id']) or by_order.get(payment.get('order_id'))
+            if booking is None:
+                report.append(_row('unmatched_payment', payment))
+                continue
+            expected = payments.to_paise(booking.order_amount or booking.amount_paid or 0)
+            if int(payment.get('amount', 0)) != expected:
+                report.append(_row('amount_mismatch', payment, booking))
+                continue
+            if booking.is_cancelled:
+                report.append(_row('paid_but_cancelled', payment, booking))
+            elif booking.payment_verified:
+                if booking.payment_id and booking.payment_id != payment['id']:
+                    report.append(_row('duplicate_payment', payment, booking,
+                                       detail=f'booking paid by {booking.payment_id}'))
+            else:
+                booking.payment_verified = True
+                booking.status = 'confirmed'
+                booking.payment_id = payment['id']
+                booking.order_id = payment.get('order_id') or booking.order_id
+                fixed.append(booking)
+                report.append(_row(FIXED, payment, booking))
+        if fixed and apply:
+            _mark_paid(fixed)
+
+    unpaid = (
+        Booking.objects.filter(payment_verified=False, is_cancelled=False, order_id__isnull=False,
+                               created_at__gte=start, created_at__lte=end)
+        .exclude(order_id='')
+    )
+    for booking in unpaid.iterator():
+        if booking.order_id not in seen_orders:
+            report.append(_row('pending_without_payment', booking=booking))
+
+    counts = defaultdict(int)
+    for row in report:
+        counts[row['kind']] += 1
+    return report, dict(counts)
@@ -0,0 +1,113 @@
+"""
+Reference data cache
+
+Sports, booking configurations, break times and blackout dates are tiny,
+change rarely and are read on nearly every request. They are cached under
+version keys: a save or delete bumps the owning sport's version and the
+global one (signals in models.py), so stale entries are never read again and
+just expire. sport_ref() is the compiled per-sport view the hot paths use
+(TimeSlot.is_available(), slot generation); it is memoised per process, so a
+warm lookup costs one cache read of the version and no database query.
+
+A bump only reaches the processes that share the cache. Without
+REDIS_CACHE_URL each worker has its own LocMemCache and never sees another
+worker's bumps, so the version keys expire after REFDATA_CACHE_SECONDS like
+the entries do, and that setting defaults to a dashboard-style 10 seconds
+unless the cache is shared: that is how stale another worker's view can be.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+VERSION_KEY = 'refdata_version'
+
+# (sport_id, version) -> compiled sport reference, for this process
+_compiled = {}
+_COMPILED_MAX = 256
+
+
+def _version_key(sport_id=None):
+    return VERSION_KEY if sport_id is None else f'{VERSION_KEY}:{sport_id}'
+
+
+def _fresh_version():
+    # Never restart from 1 after a version key is evicted, or old entries would be read again
+    return time.time_ns()
+
+
+def get_version(sport_id=None):
+    """Current version of all reference data (or of one sport's)"""
+    key = _version_key(sport_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _fresh_version(), settings.REFDATA_CACHE_SECONDS)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(sport_id=None):
+    """Invalidate everything cached for a sport (and every cross-sport list)"""
+    keys = [VERSION_KEY] if sport_id is None else [_version_key(sport_id), VERSION_KEY]
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _fresh_version(), settings.REFDATA_CACHE_SECONDS)
+
+
+def _compile(sport_id):
+    from .models import BlackoutDate, BookingConfiguration, BreakTime, Sport
+
+    sport = Sport.objects.filter(pk=sport_id).values().first()
+    if sport is None:
+        return None
+    return {
+        'sport': sport,
+        'config': BookingConfiguration.objects.filter(sport_id=sport_id, is_active=True).values().first(),
+        'break_times': tuple(BreakTime.objects.filter(sport_id=sport_id, is_active=True)
+                             .order_by('start_time').values()),
+        'blackout_dates': frozenset(BlackoutDate.objects.filter(sport_id=sport_id, is_active=True)
+                                    .values_list('date', flat=True)),
+    }
+
+
+def sport_ref(sport_id):
+    """Compiled reference data for a sport, or None if it does not exist.
+
+    A dict with the sport's field values ('sport'), its active booking
+    configuration ('config', or None), active break times ('break_times') and
+    active blackout dates as a frozenset ('blackout_dates'). Treat it as
+    read-only: it is shared by every caller in the process.
+    """
+    version = get_version(sport_id)
+    memo_key = (sport_id, version)
+    ref = _compiled.get(memo_key)
+    if ref is not None:
+        return ref
+
+    cache_key = f'refdata:sport:{sport_id}:{version}'
+    ref = cache.get(cache_key)
+    if ref is None:
+        ref = _compile(sport_id)
+        if ref is None:
+            return None
+        cache.set(cache_key, ref, settings.REFDATA_CACHE_SECONDS)
+    if len(_compiled) >= _COMPILED_MAX:
+        _compiled.clear()
+    _compiled[memo_key] = ref
+    return ref
+
+
+def blackout_dates(sport_id):
+    """Active blackout dates of a sport as a frozenset of dates"""
+    ref = sport_ref(sport_id)
+    return ref['blackout_dates'] if ref else frozenset()
+
+
+def list_cache_key(name, uri, *versions):
+    """Cache key for a serialized list response at the current reference data version"""
+    digest = hashlib.sha256(uri.encode()).hexdigest()[:32]
+    parts = ':'.join(str(v) for v in (get_version(), *versions))
+    return f'refdata:list:{name}:{parts}:{digest}'
@@ -0,0 +1,135 @@
+"""
+Revenue, utilization and occupancy reports
+
+Both reports aggregate the DailySportStats rollup (one row per sport per day),
+so a period query touches O(days x sports) small rows however many bookings
+exist. Grouping by week or month is done in the database with TruncWeek /
+TruncMonth.
+"""
+from decimal import Decimal
+
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import ExtractHour, ExtractWeekDay, TruncMonth, TruncWeek
+
+from .models import DailySportStats, TimeSlot
+
+PERIODS = {
+    'day': F('date'),
+    'week': TruncWeek('date'),
+    'month': TruncMonth('date'),
+}
+
+
+def _grouped(start, end, period, sport_id=None):
+    queryset = DailySportStats.objects.filter(date__gte=start, date__lte=end)
+    if sport_id:
+        queryset = queryset.filter(sport_id=sport_id)
+    return (
+        queryset.annotate(period=PERIODS[period])
+        .values('period', 'sport_id', 'sport__name')
+        .order_by('period', 'sport__name')
+    )
+
+
+def _money(value):
+    return str((value or Decimal('0')).quantize(Decimal('0.01')))
+
+
+def revenue_report(start, end, period='day', sport_id=None):
+    """Confirmed bookings, cancellations and revenue per sport per period"""
+    rows = _grouped(start, end, period, sport_id).annotate(
+        total_bookings=Sum('bookings'),
+        total_cancellations=Sum('cancellations'),
+        total_revenue=Sum('revenue'),
+    )
+    data = [
+        {
+            'period': str(row['period']),
+            'sport_id': row['sport_id'],
+            'sport': row['sport__name'],
+            'bookings': row['total_bookings'],
+            'cancellations': row['total_cancellations'],
+            'revenue': _money(row['total_revenue']),
+        }
+        for row in rows
+    ]
+    return {
+        'rows': data,
+        'totals': {
+            'bookings': sum(r['bookings'] for r in data),
+            'cancellations': sum(r['cancellations'] for r in data),
+            'revenue': _money(sum((Decimal(r['revenue']) for r in data), Decimal('0'))),
+        },
+    }
+
+
+def utilization_report(start, end, period='day', sport_id=None):
+    """Offered slots vs confirmed bookings, players and check-ins per sport per period"""
+    rows = _grouped(start, end, period, sport_id).annotate(
+        total_slots=Sum('slots'),
+        total_booked=Sum('bookings'),
+        total_players=Sum('players'),
+        total_check_ins=Sum('check_ins'),
+    )
+    data = []
+    for row in rows:
+        booked = row['total_booked']
+        data.append({
+            'period': str(row['period']),
+            'sport_id': row['sport_id'],
+            'sport': row['sport__name'],
+            'slots': row['total_slots'],
+            'booked_slots': booked,
+            'utilization': round(booked / row['total_slots'], 4) if row['total_slots'] else 0,
+            'players': row['total_players'],
+            'check_ins': row['total_check_ins'],
+        })
+    slots = sum(r['slots'] for r in data)
+    booked = sum(r['booked_slots'] for r in data)
+    return {
+        'rows': data,
+        'totals': {
+            'slots': slots,
+            'booked_slots': booked,
+            'utilization': round(booked / slots, 4) if slots else 0,
+            'players': sum(r['players'] for r in data),
+            'check_ins': sum(r['check_ins'] for r in data),
+        },
+    }
+
+
+# ExtractWeekDay numbering (database independent)
+WEEKDAYS = {1: 'Sunday', 2: 'Monday', 3: 'Tuesday', 4: 'Wednesday', 5: 'Thursday', 6: 'Friday', 7: 'Saturday'}
+
+
+def occupancy_heatmap(start, end, sport_id=None):
+    """Offered vs confirmed-booked slots per sport, by weekday and start hour.
+
+    One grouped query over TimeSlot (admin-disabled slots are not offered).
+    """
+    queryset = TimeSlot.objects.filter(date__gte=start, date__lte=end, admin_disabled=False)
+    if sport_id:
+        queryset = queryset.filter(sport_id=sport_id)
+    cells = (
+        queryset.annotate(weekday=ExtractWeekDay('date'), hour=ExtractHour('start_time'))
+        .values('sport_id', 'sport__name', 'weekday', 'hour')
+        .annotate(
+            offered=Count('id'),
+            booked=Count('id', filter=Q(booking__payment_verified=True, booking__is_cancelled=False)),
+        )
+        .order_by('sport__name', 'weekday', 'hour')
+    )
+
+    sports = {}
+    for cell in cells:
+        sport = sports.setdefault(cell['sport_id'], {
+            'sport_id': cell['sport_id'], 'sport': cell['sport__name'], 'cells': [],
+        })
+        sport['cells'].append({
+            'weekday': cell['weekday'],
+            'hour': cell['hour'],
+            'offered': cell['offered'],
+            'booked': cell['booked'],
+            'occupancy': round(cell['booked'] / cell['offered'], 4) if cell['offered'] else 0,
+        })
+    return {'weekdays': WEEKDAYS, 'sports': list(sports.values())}
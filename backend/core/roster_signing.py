@@ -0,0 +1,74 @@
+"""
+Gate roster signatures
+
+Gate devices scan offline from the roster /api/scan/roster/ exports, so they
+must be able to check that a roster really came from the server. It is
+signed with Ed25519 over its canonical JSON (sorted keys, no whitespace,
+without the `signature` field): devices hold only the public key, served by
+/api/scan/roster/key/, and cannot forge a roster with it the way they could
+with an HMAC key.
+
+The private key is the base64 32-byte seed in GATE_ROSTER_SIGNING_KEY. When
+that is unset it is derived from SECRET_KEY, which every service shares, so
+all processes sign with the same key; rotating SECRET_KEY then rotates it too.
+"""
+import base64
+import hashlib
+import json
+from functools import lru_cache
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey, Ed25519PublicKey
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
+from django.conf import settings
+
+_HKDF_INFO = b'core.roster_signing'
+
+
+@lru_cache(maxsize=4)
+def _private_key(seed, secret_key):
+    if seed:
+        raw = base64.b64decode(seed)
+    else:
+        raw = HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=_HKDF_INFO).derive(secret_key.encode())
+    return Ed25519PrivateKey.from_private_bytes(raw)
+
+
+def signing_key():
+    return _private_key(settings.GATE_ROSTER_SIGNING_KEY, settings.SECRET_KEY)
+
+
+def public_key():
+    """The raw 32-byte public key, base64-encoded"""
+    raw = signing_key().public_key().public_bytes(Encoding.Raw, PublicFormat.Raw)
+    return base64.b64encode(raw).decode('ascii')
+
+
+def key_id(public=None):
+    """Short fingerprint of a public key, so devices can tell a rotated key apart"""
+    return hashlib.sha256(base64.b64decode(public or public_key())).hexdigest()[:16]
+
+
+def canonical(roster):
+    """The signed bytes: json.dumps(sort_keys=True, separators=(',', ':')), ASCII-escaped"""
+    unsigned = {field: value for field, value in roster.items() if field != 'signature'}
+    return json.dumps(unsigned, sort_keys=True, separators=(',', ':')).encode()
+
+
+def sign_roster(roster):
+    """Add `key_id` and a base64 `signature` to the roster dict (in place) and return it"""
+    roster['key_id'] = key_id()
+    roster['signature'] = base64.b64encode(signing_key().sign(canonical(roster))).decode('ascii')
+    return roster
+
+
+def verify_roster(roster, public):
+    """True if the roster's signature verifies with the given base64 public key"""
+    try:
+        key = Ed25519PublicKey.from_public_bytes(base64.b64decode(public))
+        key.verify(base64.b64decode(roster['signature']), canonical(roster))
+    except (InvalidSignature, KeyError, ValueError):
+        return False
+    return True
@@ -3,7 +3,7 @@ Serializers for Red Ball Cricket Academy API
 """
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from .models import Sport, TimeSlot, Booking, Player, CheckInLog, BookingConfiguration, BreakTime, BlackoutDate
+from .models import Sport, TimeSlot, Booking, Player, CheckInLog, ArchivedCheckInLog, BookingConfiguration, BreakTime, BlackoutDate
 
 User = get_user_model()
 
@@ -234,6 +234,23 @@ class BookingSerializer(serializers.ModelSerializer):
         return booking
 
 
+class SyncTimeSlotSerializer(TimeSlotSerializer):
+    """Slot row for /api/sync/: the sport is synced as its own row, not nested"""
+    sport_details = None
+
+    class Meta(TimeSlotSerializer.Meta):
+        fields = [f for f in TimeSlotSerializer.Meta.fields if f != 'sport_details']
+
+
+class SyncBookingSerializer(BookingSerializer):
+    """Booking row for /api/sync/: without the sport and the user's own QR/check-in details"""
+    user_details = None
+    slot_details = SyncTimeSlotSerializer(source='slot', read_only=True)
+
+    class Meta(BookingSerializer.Meta):
+        fields = [f for f in BookingSerializer.Meta.fields if f != 'user_details']
+
+
 class BookingCreateSerializer(serializers.ModelSerializer):
     """Simplified serializer for creating bookings"""
     class Meta:
@@ -302,6 +319,16 @@ class CheckInLogSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'timestamp']
 
 
+class ArchivedCheckInLogSerializer(serializers.ModelSerializer):
+    """Serializer for archived check-in logs"""
+
+    class Meta:
+        model = ArchivedCheckInLog
+        fields = ['id', 'kind', 'source_id', 'timestamp', 'action', 'player_id', 'booking_id',
+                  'user_id', 'name', 'sport', 'location', 'archived_at']
+        read_only_fields = fields
+
+
 class QRCodeScanSerializer(serializers.Serializer):
     """Serializer for QR code scanning"""
     qr_data = serializers.JSONField(required=False)
@@ -321,7 +348,8 @@ class QRCodeScanSerializer(serializers.Serializer):
 class PaymentOrderSerializer(serializers.Serializer):
     """Serializer for creating Razorpay order"""
     booking_id = serializers.IntegerField()
-    amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+    # Ignored: the order amount always comes from the slot price
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
 
 
 class PaymentVerificationSerializer(serializers.Serializer):
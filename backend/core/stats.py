@@ -0,0 +1,68 @@
+"""
+Rebuild of the DailySportStats rollup from the transactional tables
+"""
+from django.apps import apps as global_apps
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+
+
+def rebuild_daily_stats(start=None, end=None, apps=global_apps):
+    """Recompute DailySportStats rows for slot dates in [start, end] (all dates if None).
+
+    `apps` lets data migrations pass their historical app registry.
+    Returns the number of rows written.
+    """
+    Booking = apps.get_model('core', 'Booking')
+    Player = apps.get_model('core', 'Player')
+    TimeSlot = apps.get_model('core', 'TimeSlot')
+    DailySportStats = apps.get_model('core', 'DailySportStats')
+
+    def window(queryset, date_field):
+        if start:
+            queryset = queryset.filter(**{f'{date_field}__gte': start})
+        if end:
+            queryset = queryset.filter(**{f'{date_field}__lte': end})
+        return queryset
+
+    rows = {}
+
+    def row(sport_id, day):
+        return rows.setdefault((sport_id, day), DailySportStats(sport_id=sport_id, date=day))
+
+    confirmed = Q(payment_verified=True, is_cancelled=False)
+    bookings = window(Booking.objects.all(), 'slot__date').values('slot__sport_id', 'slot__date').annotate(
+        n_bookings=Count('id', filter=confirmed),
+        n_cancellations=Count('id', filter=Q(is_cancelled=True)),
+        total_revenue=Sum('amount_paid', filter=confirmed),
+    ).order_by()
+    for b in bookings:
+        stats = row(b['slot__sport_id'], b['slot__date'])
+        stats.bookings = b['n_bookings']
+        stats.cancellations = b['n_cancellations']
+        stats.revenue = b['total_revenue'] or 0
+
+    players = window(Player.objects.filter(booking__payment_verified=True, booking__is_cancelled=False),
+                     'booking__slot__date').values(
+        'booking__slot__sport_id', 'booking__slot__date'
+    ).annotate(
+        n_players=Count('id'),
+        n_check_ins=Count('id', filter=Q(last_check_in__isnull=False)),
+    ).order_by()
+    for p in players:
+        stats = row(p['booking__slot__sport_id'], p['booking__slot__date'])
+        stats.players = p['n_players']
+        stats.check_ins = p['n_check_ins']
+
+    slots = window(TimeSlot.objects.all(), 'date').values('sport_id', 'date').annotate(
+        n_slots=Count('id'),
+        n_free=Count('id', filter=Q(is_booked=False, admin_disabled=False)),
+    ).order_by()
+    for s in slots:
+        stats = row(s['sport_id'], s['date'])
+        stats.slots = s['n_slots']
+        stats.free_slots = s['n_free']
+
+    with transaction.atomic():
+        window(DailySportStats.objects.all(), 'date').delete()
+        DailySportStats.objects.bulk_create(rows.values(), batch_size=1000)
+    return len(rows)
@@ -0,0 +1,175 @@
+"""
+Delta sync for mobile clients
+
+changes() returns the sports, upcoming slots, bookings and players a user
+can see that were written since a cursor (by the indexed updated_at
+columns), plus the ids deleted since then (SyncTombstone rows written by a
+post_delete receiver). The cursor is the server time of the previous sync in
+microseconds; changes from the last SYNC_OVERLAP_SECONDS before it are sent
+again, so a row committed by a transaction still open at that moment is not
+skipped. Re-sent rows are plain upserts for the client.
+
+A row is also re-sent when something it shows from another row changed: a
+sport's available_slots_count when one of its slots changes or is deleted, a
+slot's sport_name, a booking's slot_details and players, a player's
+booking_details. Blackout changes touch the sport's upcoming slots and player
+deletions touch their booking (receivers in models.py), so is_available and
+player_count follow too. Sync rows do not nest other synced kinds whole
+(views.SYNC_SERIALIZERS), or one booking would re-send every slot.
+
+Results come in pages of at most SYNC_PAGE_SIZE rows in (kind, id) order.
+Until the last page the returned cursor is a continuation cursor (has_more);
+it pins the sync window, so the final cursor covers writes made meanwhile.
+
+A cursor older than the tombstone retention (SYNC_TOMBSTONE_DAYS) cannot
+prove nothing was deleted, so the client gets a full sync with reset=True
+and should drop its local copy first.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from .authentication import user_type_of
+from .models import Booking, Player, Sport, SyncTombstone, TimeSlot
+
+KINDS = ('sports', 'slots', 'bookings', 'players')
+_TOMBSTONE_KINDS = {'sport': 'sports', 'slot': 'slots', 'booking': 'bookings', 'player': 'players'}
+
+
+class CursorError(Exception):
+    """Raised for a cursor that was not issued by this endpoint"""
+
+
+def _micros(at):
+    return str(int(at.timestamp() * 1_000_000))
+
+
+def _parse_time(value):
+    try:
+        micros = int(value)
+        at = datetime.fromtimestamp(micros / 1_000_000, tz=dt_timezone.utc)
+    except (TypeError, ValueError, OverflowError, OSError):
+        raise CursorError('Invalid cursor')
+    if micros < 0 or at > timezone.now() + timedelta(minutes=5):
+        raise CursorError('Invalid cursor')
+    return at
+
+
+def make_cursor(at):
+    return _micros(at)
+
+
+def make_continuation(since, until, position):
+    """Cursor for the next page of the sync of [since, until]; since is None for a full sync"""
+    kind_index, last_id = position
+    return '.'.join([_micros(since) if since else '', _micros(until), str(kind_index), str(last_id)])
+
+
+def parse_cursor(cursor):
+    """(since, resume) for a cursor; resume is (until, position) for a continuation cursor, else None"""
+    parts = str(cursor).split('.')
+    if len(parts) == 1:
+        return _parse_time(parts[0]), None
+    if len(parts) != 4 or not parts[2].isdigit() or not parts[3].isdigit() or int(parts[2]) >= len(KINDS):
+        raise CursorError('Invalid cursor')
+    since = _parse_time(parts[0]) if parts[0] else None
+    return since, (_parse_time(parts[1]), (int(parts[2]), int(parts[3])))
+
+
+def visible(user):
+    """Querysets of everything the user can see, like the list endpoints"""
+    slots = TimeSlot.objects.filter(date__gte=timezone.localdate())
+    if user.is_staff:
+        bookings, players = Booking.objects.all(), Player.objects.all()
+    else:
+        bookings = Booking.objects.filter(user=user)
+        if user_type_of(user) == 'player':
+            players = Player.objects.filter(user=user)
+        else:
+            players = Player.objects.filter(booking__user=user)
+    return {
+        'sports': Sport.objects.all(),
+        'slots': slots.select_related('sport'),
+        'bookings': bookings.select_related('user', 'slot__sport').prefetch_related('players'),
+        'players': players.select_related('booking__slot__sport', 'booking__user'),
+    }
+
+
+def _changed_since(querysets, after, slots_deleted):
+    """Rows written since `after`, or showing something from a row that was"""
+    slot_changed = TimeSlot.objects.filter(sport=OuterRef('pk'), updated_at__gte=after)
+    player_changed = Player.objects.filter(booking=OuterRef('pk'), updated_at__gte=after)
+    sports = querysets['sports']
+    if not slots_deleted:
+        # available_slots_count: any of the sport's slots created, booked or freed
+        sports = sports.filter(Q(updated_at__gte=after) | Exists(slot_changed))
+    return {
+        'sports': sports,
+        'slots': querysets['slots'].filter(Q(updated_at__gte=after) | Q(sport__updated_at__gte=after)),
+        'bookings': querysets['bookings'].filter(
+            Q(updated_at__gte=after) | Q(slot__updated_at__gte=after) | Q(slot__sport__updated_at__gte=after)
+            | Exists(player_changed)
+        ),
+        'players': querysets['players'].filter(
+            Q(updated_at__gte=after) | Q(booking__updated_at__gte=after)
+            | Q(booking__slot__updated_at__gte=after) | Q(booking__slot__sport__updated_at__gte=after)
+        ),
+    }
+
+
+def changes(user, since=None):
+    """What changed for `user` since the `since` datetime (None: everything).
+
+    Returns (upserted querysets by kind, deleted ids by kind, reset).
+    """
+    querysets = visible(user)
+    reset = since is not None and since < timezone.now() - timedelta(days=settings.SYNC_TOMBSTONE_DAYS)
+    deleted = {kind: set() for kind in KINDS}
+    if since is None or reset:
+        upserted = dict(querysets)
+        if not user.is_staff:
+            upserted['slots'] = upserted['slots'].filter(admin_disabled=False)
+        return upserted, {kind: [] for kind in KINDS}, reset
+
+    after = since - timedelta(seconds=settings.SYNC_OVERLAP_SECONDS)
+    tombstones = SyncTombstone.objects.filter(deleted_at__gte=after)
+    if not user.is_staff:
+        tombstones = tombstones.filter(Q(user_id__isnull=True) | Q(user_id=user.pk))
+    for kind, object_id in tombstones.values_list('kind', 'object_id'):
+        deleted[_TOMBSTONE_KINDS[kind]].add(object_id)
+
+    upserted = _changed_since(querysets, after, slots_deleted=bool(deleted['slots']))
+    if not user.is_staff:
+        # Slots an admin disabled since the cursor disappear from the user's lists
+        deleted['slots'].update(upserted['slots'].filter(admin_disabled=True).values_list('pk', flat=True))
+        upserted['slots'] = upserted['slots'].filter(admin_disabled=False)
+    return upserted, {kind: sorted(ids) for kind, ids in deleted.items()}, False
+
+
+def page(upserted, position=(0, 0), limit=None):
+    """Up to `limit` upserted rows after `position` ((kind index, last id)) in (kind, id) order.
+
+    Returns (rows by kind, position to continue from, or None after the last row).
+    """
+    limit = limit or settings.SYNC_PAGE_SIZE
+    start_kind, last_id = position
+    rows = {kind: [] for kind in KINDS}
+    for index in range(start_kind, len(KINDS)):
+        queryset = upserted[KINDS[index]].order_by('pk')
+        if index == start_kind:
+            queryset = queryset.filter(pk__gt=last_id)
+        remaining = limit - sum(len(r) for r in rows.values())
+        batch = list(queryset[:remaining + 1])
+        if len(batch) > remaining:
+            rows[KINDS[index]] = batch[:remaining]
+            return rows, (index, batch[remaining - 1].pk if remaining else (last_id if index == start_kind else 0))
+        rows[KINDS[index]] = batch
+    return rows, None
+
+
+def prune_tombstones(days=None):
+    """Delete tombstones older than the retention window. Returns the number deleted."""
+    before = timezone.now() - timedelta(days=settings.SYNC_TOMBSTONE_DAYS if days is None else days)
+    return SyncTombstone.objects.filter(deleted_at__lt=before).delete()[0]
@@ -1,30 +1,62 @@
+"""
+Celery tasks
+
+Routed to dedicated queues in redball_academy/celery.py: email tasks to
+`email`, QR renders to `qr`, stats rebuilds to `reports`, payment webhooks
+to the default queue. The batch tasks take
+lists of ids so one task pays for one query and one SMTP connection.
+"""
 from celery import shared_task
-from django.core.mail import send_mail
-from django.conf import settings
+
+from .models import EmailOutbox, player_credentials_email
+
+
+@shared_task
+def drain_email_outbox():
+    """Send every due email in the outbox over one SMTP connection per batch"""
+    from .outbox import drain_outbox
+    return drain_outbox()
+
+
+@shared_task
+def send_emails_batch(outbox_ids):
+    """Send the given outbox rows (those still due) over one SMTP connection"""
+    from .outbox import dispatch_outbox
+    return dispatch_outbox(batch_size=len(outbox_ids), ids=outbox_ids)
+
+
+@shared_task
+def render_qr_batch(player_ids):
+    """Render QR images for the given players that do not have one yet"""
+    from .qr_batch import TARGETS, render_rows
+    players = list(TARGETS['player'][0]().filter(pk__in=player_ids).order_by('pk'))
+    return render_rows('player', players)
+
+
+@shared_task
+def render_organizer_qr_batch(booking_ids):
+    """Render organizer QR images for the given paid bookings that do not have one yet"""
+    from .qr_batch import TARGETS, render_rows
+    bookings = list(TARGETS['organizer'][0]().filter(pk__in=booking_ids).order_by('pk'))
+    return render_rows('organizer', bookings)
+
+
+@shared_task
+def process_payment_webhooks(event_ids):
+    """Apply the given Razorpay webhook events (those still pending)"""
+    from .webhooks import process_events
+    return process_events(ids=event_ids)
+
+
+@shared_task
+def rebuild_daily_stats_range(start=None, end=None):
+    """Recompute DailySportStats for slot dates in [start, end] (ISO dates)"""
+    from .stats import rebuild_daily_stats
+    return rebuild_daily_stats(start, end)
+
 
 @shared_task
 def send_player_credentials_email(email, name, sport_name, date_str, time_window):
-    try:
-        send_mail(
-            subject='Your Player Account - Red Ball Cricket Academy',
-            message=(
-                f"Hello {name},\n\n"
-                f"An account has been created for you at Red Ball Cricket Academy.\n\n"
-                f"Login Details:\n"
-                f"Email: {email}\n"
-                f"Temporary Password: redball\n\n"
-                f"Booking Details:\n"
-                f"Sport: {sport_name}\n"
-                f"Date: {date_str}\n"
-                f"Time: {time_window}\n\n"
-                f"Use the app to view your QR code and check-in on the day of your booking.\n"
-                f"For security, please change your password after first login.\n\n"
-                f"Regards,\nRed Ball Cricket Academy"
-            ),
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[email],
-            fail_silently=True,
-        )
-    except Exception:
-        # Best effort; do not raise to Celery
-        pass
+    # Kept for tasks queued before the outbox existed; new code uses EmailOutbox.queue
+    subject, body = player_credentials_email(name, email, sport_name, date_str, time_window)
+    EmailOutbox.queue(email, subject, body)
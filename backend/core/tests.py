@@ -1,3 +1,1189 @@
-from django.test import TestCase
+import importlib.util
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.hashers import check_password
+from django.core import mail, signing
+from django.core.cache import cache
+from django.core.mail import get_connection
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .qr_tokens import (
+    KIND_ORGANIZER, KIND_PLAYER, build_qr, is_compact_token,
+    load_qr_token, make_compact_token,
+)
+from .checkin import CheckInError, check_in_organizer, check_in_player
+from .models import (
+    ArchivedCheckInLog, AttendanceEvent, BlackoutDate, Booking, CheckInLog, CustomUser, DailySportStats, EmailOutbox, OfflineScan, OrganizerCheckInLog, PaymentWebhookEvent, Player, Sport, SyncTombstone, TimeSlot,
+)
+from .stats import rebuild_daily_stats
+from . import dispatch, events, payments, refdata, roster_signing, sync, views
+from .outbox import dispatch_outbox
+from .razorpay_stub import RazorpayStub
+from .reconcile import reconcile, window
+from .tasks import process_payment_webhooks, render_qr_batch, send_emails_batch
+
+
+def make_booking(email='organizer@example.com', on_date=None, **booking_fields):
+    """Create a sport, slot, organizer and booking for tests"""
+    sport, _ = Sport.objects.get_or_create(name='Cricket', defaults={'price_per_hour': 500})
+    on_date = on_date or timezone.now().date()
+    start = TimeSlot.objects.filter(sport=sport, date=on_date).count()
+    slot = TimeSlot.objects.create(
+        sport=sport, date=on_date, start_time=f'{6 + start:02d}:00', end_time=f'{7 + start:02d}:00', price=500,
+    )
+    user = CustomUser.objects.filter(email=email).first() or CustomUser.objects.create_user(email=email, password='pw')
+    return Booking.objects.create(user=user, slot=slot, amount_paid=slot.price, **booking_fields)
+
+
+def make_player(booking, name='Player', email='player@example.com'):
+    """Create a player with a QR token, bypassing the account/email signal"""
+    player = Player.objects.bulk_create([Player(booking=booking, name=name, email=email)])[0]
+    player.generate_qr_code()
+    player.save(update_fields=['qr_token', 'qr_code'])
+    return player
+
+
+class MediaRootMixin:
+    """Write QR images to a throwaway MEDIA_ROOT"""
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+
+class CompactQRTokenTests(TestCase):
+    def test_round_trip_matches_legacy_payload_shape(self):
+        token = make_compact_token(KIND_PLAYER, 42, 7, on_date=date(2025, 11, 3))
+        self.assertTrue(is_compact_token(token))
+        data = load_qr_token(token, salt='player-qr-token')
+        self.assertEqual(data['player_id'], 42)
+        self.assertEqual(data['booking_id'], 7)
+        self.assertEqual(data['date'], '2025-11-03')
+
+    def test_token_is_short_and_alphanumeric(self):
+        token = make_compact_token(KIND_ORGANIZER, 123456, on_date=date(2025, 11, 3))
+        self.assertLess(len(token), 50)
+        self.assertLessEqual(build_qr(token).version, 2)
+
+    def test_tampered_token_is_rejected(self):
+        token = make_compact_token(KIND_PLAYER, 42, 7, on_date=date(2025, 11, 3))
+        tampered = token[:-1] + ('A' if token[-1] != 'A' else 'B')
+        with self.assertRaises(signing.BadSignature):
+            load_qr_token(tampered, salt='player-qr-token')
+
+    def test_wrong_kind_is_rejected(self):
+        token = make_compact_token(KIND_PLAYER, 42, 7, on_date=date(2025, 11, 3))
+        with self.assertRaises(signing.BadSignature):
+            load_qr_token(token, salt='organizer-qr-token')
+
+    def test_legacy_tokens_still_accepted(self):
+        token = signing.dumps({'user_id': 5}, salt='user-qr-token')
+        self.assertEqual(load_qr_token(token, salt='user-qr-token')['user_id'], 5)
+
+
+class BackfillQRCommandTests(MediaRootMixin, TestCase):
+    def test_backfills_missing_tokens_in_chunks(self):
+        booking = make_booking(payment_verified=True)
+        # bulk_create skips the post_save signal, leaving players without QR codes
+        Player.objects.bulk_create([
+            Player(booking=booking, name=f'Player {i}', email=f'p{i}@example.com') for i in range(5)
+        ])
+        Booking.objects.filter(pk=booking.pk).update(organizer_qr_token=None)
+
+        out = StringIO()
+        call_command('backfill_qr', 'player', 'organizer', chunk_size=2, workers=0, stdout=out)
+
+        self.assertFalse(Player.objects.filter(qr_token__isnull=True).exists())
+        self.assertTrue(all(p.qr_code for p in Player.objects.all()))
+        self.assertTrue(Booking.objects.get(pk=booking.pk).organizer_qr_token)
+        self.assertIn('Backfilled 5 player QR codes', out.getvalue())
+
+
+class OfflineGateScanTests(MediaRootMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = CustomUser.objects.create_user(email='admin@example.com', password='pw', is_staff=True)
+        self.client.force_authenticate(self.admin)
+        self.booking = make_booking(payment_verified=True)
+        self.player = make_player(self.booking)
+
+    def test_roster_lists_todays_tokens_by_digest(self):
+        response = self.client.get('/api/scan/roster/')
+        self.assertEqual(response.status_code, 200)
+        sport = response.data['sports'][0]
+        self.assertEqual(sport['players'][0]['player_id'], self.player.id)
+        self.assertEqual(sport['organizers'][0]['booking_id'], self.booking.id)
+        self.assertNotIn(self.player.qr_token, str(response.data))
+
+        # Devices verify the roster as received with the public key alone
+        key = self.client.get('/api/scan/roster/key/').data
+        roster = response.json()
+        self.assertEqual((key['algorithm'], roster['key_id']), ('Ed25519', key['key_id']))
+        self.assertTrue(roster_signing.verify_roster(roster, key['public_key']))
+        roster['sports'][0]['players'][0]['name'] = 'Someone else'
+        self.assertFalse(roster_signing.verify_roster(roster, key['public_key']))
+
+    def test_sync_applies_scans_in_device_order_and_is_idempotent(self):
+        now = timezone.now()
+        payload = {'device_id': 'gate-1', 'scans': [
+            {'scan_id': 'b', 'token': self.player.qr_token, 'scanned_at': now.isoformat()},
+            {'scan_id': 'a', 'token': self.player.qr_token,
+             'scanned_at': (now - timezone.timedelta(seconds=1)).isoformat()},
+            {'scan_id': 'c', 'token': 'garbage', 'scanned_at': now.isoformat()},
+        ]}
+        response = self.client.post('/api/scan/sync/', payload, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['applied'], response.data['rejected']), (2, 1))
+        actions = {r['scan_id']: r['action'] for r in response.data['results']}
+        self.assertEqual((actions['a'], actions['b']), ('IN', 'OUT'))
+
+        again = self.client.post('/api/scan/sync/', payload, format='json')
+        self.assertEqual(again.data['duplicates'], 3)
+        self.assertEqual(Player.objects.get(pk=self.player.pk).check_in_count, 2)
+        self.assertEqual(CheckInLog.objects.count(), 2)
+        self.assertEqual(OfflineScan.objects.count(), 3)
+
+    def test_concurrent_resend_returns_the_stored_result(self):
+        scan = {'scan_id': 'x', 'token': self.player.qr_token, 'scanned_at': timezone.now().isoformat()}
+        real_apply = views._apply_offline_scans
+        attempts = []
+
+        def lose_the_race(device_id, queued):
+            attempts.append(device_id)
+            if len(attempts) == 1:
+                # Another request stores the same scan and commits first
+                OfflineScan.objects.create(device_id=device_id, scan_id='x', scanned_at=timezone.now(),
+                                           status='applied', kind='player', action='IN')
+                raise IntegrityError('duplicate key value violates unique constraint')
+            return real_apply(device_id, queued)
+
+        with mock.patch('core.views._apply_offline_scans', side_effect=lose_the_race):
+            response = self.client.post('/api/scan/sync/', {'device_id': 'gate-1', 'scans': [scan]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(attempts), 2)
+        self.assertEqual(response.data['results'][0], {
+            'scan_id': 'x', 'status': 'applied', 'action': 'IN', 'error': '', 'duplicate': True,
+        })
+        self.assertEqual(Player.objects.get(pk=self.player.pk).check_in_count, 0)
+
+    def test_sync_rejects_a_token_issued_for_another_day(self):
+        # Same check as /api/scan/: the booking was moved to today's slot after the code was issued
+        old = make_compact_token(KIND_PLAYER, self.player.pk, self.booking.pk,
+                                 on_date=timezone.localdate() - timedelta(days=1))
+        scan = {'scan_id': 'x', 'token': old, 'scanned_at': timezone.now().isoformat()}
+        response = self.client.post('/api/scan/sync/', {'device_id': 'gate-1', 'scans': [scan]}, format='json')
+        self.assertEqual(response.data['results'][0]['status'], 'rejected')
+        self.assertIn('date mismatch', response.data['results'][0]['error'])
+        self.assertEqual(self.client.post('/api/scan/', {'token': old}, format='json').status_code, 400)
+        self.assertEqual(Player.objects.get(pk=self.player.pk).check_in_count, 0)
+
+
+class AtomicCheckInTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.booking = make_booking(payment_verified=True)
+        self.player = make_player(self.booking)
+
+    def test_racing_scanners_apply_transition_exactly_once(self):
+        # Both scanners read the row before either writes
+        first = Player.objects.select_related('booking__slot').get(pk=self.player.pk)
+        second = Player.objects.select_related('booking__slot').get(pk=self.player.pk)
+
+        self.assertEqual(check_in_player(first), 'IN')
+        with self.assertRaises(CheckInError):
+            check_in_player(second)
+
+        player = Player.objects.get(pk=self.player.pk)
+        self.assertEqual((player.check_in_count, player.is_in), (1, True))
+        self.assertEqual(CheckInLog.objects.filter(player=player).count(), 1)
+
+    def test_organizer_in_then_out_then_rejected(self):
+        booking = Booking.objects.select_related('slot').get(pk=self.booking.pk)
+        self.assertEqual(check_in_organizer(booking), 'IN')
+        self.assertEqual(check_in_organizer(booking), 'OUT')
+        with self.assertRaises(CheckInError):
+            check_in_organizer(booking)
+        self.assertEqual(Booking.objects.get(pk=booking.pk).organizer_check_in_count, 2)
+        self.assertEqual(OrganizerCheckInLog.objects.filter(booking=booking).count(), 2)
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'Needs a database with concurrent writers')
+class ConcurrentCheckInTests(MediaRootMixin, TransactionTestCase):
+    def test_parallel_scans_count_once(self):
+        player = make_player(make_booking(payment_verified=True))
+        workers = 8
+        barrier = threading.Barrier(workers)
+        outcomes = []
+
+        def scan():
+            stale = Player.objects.select_related('booking__slot').get(pk=player.pk)
+            barrier.wait()
+            try:
+                outcomes.append(check_in_player(stale))
+            except CheckInError:
+                outcomes.append(None)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=scan) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(outcomes.count('IN'), 1)
+        self.assertEqual(Player.objects.get(pk=player.pk).check_in_count, 1)
+        self.assertEqual(CheckInLog.objects.filter(player_id=player.pk).count(), 1)
+
+
+class UnifiedScanEndpointTests(MediaRootMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.booking = make_booking(payment_verified=True)
+        self.player = make_player(self.booking)
+        self.client.force_authenticate(self.booking.user)
+
+    def test_dispatches_on_token_type(self):
+        self.booking.refresh_from_db()
+        for token, expected_type in [
+            (self.player.qr_token, 'player'),
+            (self.booking.organizer_qr_token, 'organizer'),
+            (self.booking.user.qr_token, 'user'),
+        ]:
+            response = self.client.post('/api/scan/', {'token': token}, format='json')
+            self.assertEqual(response.status_code, 200, response.data)
+            self.assertEqual((response.data['type'], response.data['action']), (expected_type, 'IN'))
+
+    def test_legacy_token_and_bad_token(self):
+        legacy = signing.dumps({'player_id': self.player.id, 'booking_id': self.booking.id}, salt='player-qr-token')
+        response = self.client.post('/api/scan/', {'token': legacy}, format='json')
+        self.assertEqual(response.data['type'], 'player')
+
+        response = self.client.post('/api/scan/', {'token': 'not-a-token'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class DashboardStatsTests(MediaRootMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.admin = CustomUser.objects.create_user(email='admin@example.com', password='pw', is_staff=True)
+        self.client.force_authenticate(self.admin)
+
+    def test_aggregates_exact_revenue_and_caches_until_booking_changes(self):
+        make_booking(payment_verified=True)
+        cheap = make_booking()
+        cheap.amount_paid = Decimal('0.10')
+        cheap.payment_verified = True
+        cheap.save()
+        make_booking()  # pending, not counted
+
+        response = self.client.get('/api/dashboard/stats/')
+        self.assertEqual(response.data['total_bookings'], 2)
+        self.assertEqual(response.data['total_revenue'], '500.10')
+
+        with self.assertNumQueries(0):
+            self.client.get('/api/dashboard/stats/')
+
+        make_booking(payment_verified=True)
+        self.assertEqual(self.client.get('/api/dashboard/stats/').data['total_bookings'], 3)
+
+
+class DailySportStatsTests(MediaRootMixin, TestCase):
+    FIELDS = ['sport_id', 'date', 'bookings', 'cancellations', 'revenue', 'players', 'check_ins', 'slots', 'free_slots']
+
+    def snapshot(self):
+        return list(DailySportStats.objects.order_by('sport_id', 'date').values_list(*self.FIELDS))
+
+    def test_incremental_updates_match_rebuild(self):
+        confirmed = make_booking(payment_verified=True)
+        confirmed.slot.is_booked = True
+        confirmed.slot.save()
+        player = make_player(confirmed)
+        # make_player uses bulk_create (no post_save), so count the player the way the signal would
+        DailySportStats.bump(confirmed.slot.sport_id, confirmed.slot.date, players=1)
+        check_in_player(Player.objects.select_related('booking__slot').get(pk=player.pk))
+
+        cancelled = make_booking(payment_verified=True)
+        cancelled.cancel_booking('Rain')
+        make_booking()  # pending
+        TimeSlot.objects.create(sport=confirmed.slot.sport, date=confirmed.slot.date,
+                                start_time='20:00', end_time='21:00', price=500).delete()
+
+        incremental = self.snapshot()
+        rebuild_daily_stats()
+        self.assertEqual(incremental, self.snapshot())
+
+        row = DailySportStats.objects.get()
+        self.assertEqual((row.bookings, row.cancellations, row.revenue), (1, 1, Decimal('500.00')))
+        self.assertEqual((row.players, row.check_ins, row.slots, row.free_slots), (1, 1, 3, 2))
+
+    def test_players_count_only_while_the_booking_is_confirmed(self):
+        booking = make_booking()
+        player = Player.objects.create(booking=booking, name='Walk-in', email='')
+
+        def counted():
+            incremental = DailySportStats.objects.values_list('players', 'check_ins').get()
+            rebuild_daily_stats()
+            self.assertEqual(DailySportStats.objects.values_list('players', 'check_ins').get(), incremental)
+            return incremental
+
+        self.assertEqual(counted(), (0, 0))  # pending
+        booking.payment_verified = True
+        booking.save()
+        self.assertEqual(counted(), (1, 0))
+        check_in_player(Player.objects.select_related('booking__slot').get(pk=player.pk))
+        self.assertEqual(counted(), (1, 1))
+        Booking.objects.get(pk=booking.pk).cancel_booking('Rain')
+        self.assertEqual(counted(), (0, 0))
+
+    def test_changes_are_counted_from_the_stored_row(self):
+        booking = make_booking()
+        # Loading with deferred fields must not touch them
+        self.assertFalse(Booking.objects.only('id').get(pk=booking.pk).payment_verified)
+        self.assertFalse(TimeSlot.objects.defer('is_booked', 'admin_disabled').get(pk=booking.slot_id).is_booked)
+
+        # Two copies of one row making the same change count it once
+        for copy in (Booking.objects.get(pk=booking.pk), Booking.objects.get(pk=booking.pk)):
+            copy.payment_verified = True
+            copy.save()
+        for copy in (TimeSlot.objects.get(pk=booking.slot_id), TimeSlot.objects.get(pk=booking.slot_id)):
+            copy.is_booked = True
+            copy.save()
+        stale = Booking.objects.get(pk=booking.pk)
+        Booking.objects.get(pk=booking.pk).cancel_booking('Rain')
+        stale.refresh_from_db()
+        stale.save()
+
+        incremental = self.snapshot()
+        rebuild_daily_stats()
+        self.assertEqual(incremental, self.snapshot())
+        row = DailySportStats.objects.get()
+        self.assertEqual((row.bookings, row.cancellations, row.revenue, row.free_slots), (0, 1, 0, 1))
+
+
+class ReportTests(MediaRootMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.client.force_authenticate(
+            CustomUser.objects.create_user(email='admin@example.com', password='pw', is_staff=True)
+        )
+
+    def test_revenue_and_utilization_grouped_by_month(self):
+        day = date(2025, 3, 10)
+        make_booking(on_date=day, payment_verified=True)
+        make_booking(on_date=day.replace(day=20), payment_verified=True)
+        make_booking(on_date=day.replace(month=4), payment_verified=True)
+
+        params = {'start': '2025-03-01', 'end': '2025-04-30', 'period': 'month'}
+        revenue = self.client.get('/api/reports/revenue/', params).data
+        self.assertEqual([(r['period'], r['bookings'], r['revenue']) for r in revenue['rows']],
+                         [('2025-03-01', 2, '1000.00'), ('2025-04-01', 1, '500.00')])
+        self.assertEqual(revenue['totals']['revenue'], '1500.00')
+
+        utilization = self.client.get('/api/reports/utilization/', params).data
+        self.assertEqual(utilization['totals']['slots'], 3)
+        self.assertEqual(utilization['totals']['utilization'], 1.0)
+
+    def test_rejects_bad_period(self):
+        response = self.client.get('/api/reports/revenue/', {'period': 'year'})
+        self.assertEqual(response.status_code, 400)
+
+
+class OccupancyHeatmapTests(MediaRootMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.client.force_authenticate(
+            CustomUser.objects.create_user(email='admin@example.com', password='pw', is_staff=True)
+        )
+
+    def test_buckets_by_weekday_and_hour_and_refreshes_on_change(self):
+        monday = date(2025, 3, 10)
+        booking = make_booking(on_date=monday, payment_verified=True)
+        TimeSlot.objects.create(sport=booking.slot.sport, date=monday, start_time='06:30', end_time='07:00', price=500)
+        params = {'start': '2025-03-01', 'end': '2025-03-31'}
+
+        cells = self.client.get('/api/reports/occupancy/', params).data['sports'][0]['cells']
+        self.assertEqual(cells, [{'weekday': 2, 'hour': 6, 'offered': 2, 'booked': 1, 'occupancy': 0.5}])
+
+        booking.cancel_booking('Rain')
+        cells = self.client.get('/api/reports/occupancy/', params).data['sports'][0]['cells']
+        self.assertEqual(cells[0]['booked'], 0)
+
+
+class LiveAttendanceTests(MediaRootMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.client.force_authenticate(
+            CustomUser.objects.create_user(email='admin@example.com', password='pw', is_staff=True)
+        )
+
+    def counts(self):
+        sport = self.client.get('/api/attendance/live/').data['sports'][0]
+        return sport['players_in'], sport['organizers_in']
+
+    def test_counters_follow_committed_scans(self):
+        booking = make_booking(on_date=timezone.localdate(), payment_verified=True)
+        player = Player.objects.select_related('booking__slot').get(pk=make_player(booking).pk)
+        self.assertEqual(self.counts(), (0, 0))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            check_in_player(player)
+        with self.captureOnCommitCallbacks(execute=True):
+            check_in_organizer(Booking.objects.select_related('slot').get(pk=booking.pk))
+        self.assertEqual(self.counts(), (1, 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            check_in_player(player)
+        self.assertEqual(self.counts(), (0, 1))
+
+    def test_stream_requires_admin_token(self):
+        self.client.force_authenticate(None)
+        response = self.client.get('/api/attendance/live/stream/')
+        self.assertEqual(response.status_code, 403)
+
+
+class CSVExportTests(MediaRootMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(
+            CustomUser.objects.create_user(email='admin@example.com', password='pw', is_staff=True)
+        )
+
+    def export(self, name, **params):
+        response = self.client.get(f'/api/exports/{name}/', params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)  # a sync iterator would be buffered whole under ASGI
+
+        async def read():
+            return b''.join([chunk async for chunk in response.streaming_content])
+        return async_to_sync(read)().decode().splitlines()
+
+    def test_streams_rows_in_window(self):
+        day = timezone.localdate()
+        booking = make_booking(on_date=day, payment_verified=True)
+        make_booking(on_date=day - timedelta(days=40))
+        player = make_player(booking, name='=HYPERLINK("x")')
+        check_in_player(Player.objects.select_related('booking__slot').get(pk=player.pk))
+
+        bookings = self.export('bookings')
+        self.assertEqual(len(bookings), 2)
+        self.assertTrue(bookings[0].startswith('booking_id,sport,date'))
+        self.assertTrue(bookings[1].startswith(f'{booking.id},Cricket,{day}'))
+
+        players = self.export('players', sport=booking.slot.sport_id)
+        self.assertIn("'=HYPERLINK", players[1])
+        self.assertEqual(len(self.export('check-ins', start=str(day), end=str(day))), 2)
+
+    def test_rejects_unknown_export_and_sport_on_user_logs(self):
+        self.assertEqual(self.client.get('/api/exports/payments/').status_code, 404)
+        self.assertEqual(self.client.get('/api/exports/user-check-ins/', {'sport': 1}).status_code, 400)
+
+
+class CheckInLogArchiveTests(MediaRootMixin, APITestCase):
+    def test_moves_old_logs_in_chunks_and_serves_them(self):
+        booking = make_booking(payment_verified=True)
+        player = make_player(booking, name='Old Timer')
+        old = timezone.now() - timedelta(days=200)
+        logs = [
+            events.record('player', player.pk, 'IN', booking_id=booking.pk, at=old),
+            events.record('player', player.pk, 'OUT', booking_id=booking.pk, at=old),
+            events.record('player', player.pk, 'IN', booking_id=booking.pk),
+        ]
+        events.record('organizer', booking.pk, 'IN', booking_id=booking.pk)
+
+        out = StringIO()
+        call_command('archive_checkin_logs', '--chunk-size', '1', stdout=out)
+        self.assertIn('2 player, 0 organizer, 0 user', out.getvalue())
+        self.assertEqual(list(CheckInLog.objects.values_list('pk', flat=True)), [logs[2].pk])
+        archived = ArchivedCheckInLog.objects.order_by('source_id')
+        self.assertEqual([(a.source_id, a.action, a.name, a.sport) for a in archived],
+                         [(logs[0].pk, 'IN', 'Old Timer', 'Cricket'), (logs[1].pk, 'OUT', 'Old Timer', 'Cricket')])
+
+        self.client.force_authenticate(
+            CustomUser.objects.create_user(email='admin@example.com', password='pw', is_staff=True)
+        )
+        response = self.client.get('/api/checkin-logs/archive/', {
+            'kind': 'player', 'player': player.pk, 'start': str(timezone.localdate(old)), 'end': str(timezone.localdate(old)),
+        })
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(response.data['results'][0]['source_id'], logs[1].pk)
+
+
+class AttendanceEventTests(MediaRootMixin, APITestCase):
+    def test_offline_sync_bulk_inserts_events_read_through_log_views(self):
+        booking = make_booking(on_date=timezone.localdate(), payment_verified=True)
+        players = [make_player(booking, name=f'P{i}', email=f'p{i}@example.com') for i in range(3)]
+        self.client.force_authenticate(
+            CustomUser.objects.create_user(email='admin@example.com', password='pw', is_staff=True)
+        )
+        now = timezone.now()
+        scans = [
+            {'scan_id': f's{i}', 'token': p.qr_token, 'scanned_at': now.isoformat()}
+            for i, p in enumerate(players)
+        ] + [{'scan_id': 'org', 'token': booking.organizer_qr_token, 'scanned_at': now.isoformat()}]
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/scan/sync/', {'device_id': 'gate-1', 'scans': scans}, format='json')
+        self.assertEqual(response.data['applied'], 4)
+        inserts = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "core_attendanceevent"')]
+        self.assertEqual(len(inserts), 1)
+
+        self.assertEqual(AttendanceEvent.objects.filter(device='gate-1').count(), 4)
+        self.assertEqual(CheckInLog.objects.filter(player__booking=booking, location='gate-1').count(), 3)
+        organizer_log = OrganizerCheckInLog.objects.get(booking=booking)
+        self.assertEqual((organizer_log.user_id, organizer_log.action), (booking.user_id, 'IN'))
+
+    def test_events_are_append_only_and_removed_with_their_player(self):
+        booking = make_booking(payment_verified=True)
+        player = make_player(booking)
+        event = events.record('player', player.pk, 'IN', booking_id=booking.pk)
+        with self.assertRaises(ValueError):
+            event.save()
+        player.delete()
+        self.assertFalse(AttendanceEvent.objects.exists())
+
+
+@override_settings(LOGIN_MAX_FAILURES_PER_ACCOUNT=3, LOGIN_MAX_FAILURES_PER_IP=5)
+class JWTLoginTests(MediaRootMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        CustomUser.objects.create_user(email='member@example.com', password='right-password')
+
+    def login(self, password, email='Member@Example.com'):
+        return self.client.post('/api/auth/jwt_login/', {'email': email, 'password': password}, format='json')
+
+    def test_one_password_hash_per_attempt(self):
+        with mock.patch('django.contrib.auth.base_user.check_password', wraps=check_password) as checked:
+            self.assertEqual(self.login('wrong').status_code, 401)
+            self.assertEqual(self.login('right-password').status_code, 200)
+        self.assertEqual(checked.call_count, 2)
+
+    def test_account_is_throttled_after_failures_without_hashing(self):
+        for _ in range(3):
+            self.assertEqual(self.login('wrong').status_code, 401)
+        with mock.patch('django.contrib.auth.base_user.check_password') as checked:
+            response = self.login('right-password')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        checked.assert_not_called()
+
+    def test_ip_is_throttled_across_accounts(self):
+        for i in range(5):
+            self.login('wrong', email=f'nobody{i}@example.com')
+        self.assertEqual(self.login('right-password').status_code, 429)
+
+
+class RoleClaimsAuthTests(MediaRootMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.booking = make_booking(payment_verified=True)
+        make_player(self.booking)
+        response = self.client.post('/api/auth/jwt_login/',
+                                    {'email': 'organizer@example.com', 'password': 'pw'}, format='json')
+        self.access = response.data['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access}')
+
+    def test_access_token_carries_role_claims(self):
+        token = AccessToken(self.access)
+        self.assertEqual((token['user_type'], token['is_staff'], token['email']),
+                         ('customer', False, 'organizer@example.com'))
+
+    def test_read_requests_skip_user_and_profile_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/players/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 1)
+        # Authentication ran no queries: the first one is the player list itself
+        self.assertIn('FROM "core_player"', ctx.captured_queries[0]['sql'])
+        self.assertNotIn('core_userprofile', ' '.join(q['sql'] for q in ctx.captured_queries))
+
+    def test_staff_views_check_the_user_row_on_reads(self):
+        admin = CustomUser.objects.create_user(email='admin@example.com', password='pw', is_staff=True)
+        response = self.client.post('/api/auth/jwt_login/',
+                                    {'email': 'admin@example.com', 'password': 'pw'}, format='json')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {response.data["access"]}')
+        self.assertEqual(self.client.get('/api/exports/players/').status_code, 200)
+
+        CustomUser.objects.filter(pk=admin.pk).update(is_staff=False)
+        self.assertEqual(self.client.get('/api/exports/players/').status_code, 403)
+        # Even the opted-in views do not trust a staff claim
+        self.assertEqual(self.client.get('/api/bookings/').data['count'], 0)
+        CustomUser.objects.filter(pk=admin.pk).update(is_staff=True, is_active=False)
+        self.assertEqual(self.client.get('/api/exports/players/').status_code, 401)
+        self.assertEqual(self.client.get('/api/sync/').status_code, 401)
+
+    def test_claims_user_loads_remaining_fields_in_one_query(self):
+        from .authentication import ClaimsJWTAuthentication
+        auth = ClaimsJWTAuthentication()
+        auth.read_only = True
+        user = auth.get_user(auth.get_validated_token(self.access))
+        with self.assertNumQueries(1):
+            self.assertEqual((user.first_name, user.check_in_count, user.is_active), ('', 0, True))
+
+
+class EmailOutboxTests(MediaRootMixin, APITestCase):
+    def test_reset_and_new_player_emails_go_through_the_outbox(self):
+        CustomUser.objects.create_user(email='member@example.com', password='pw')
+        self.client.post('/api/auth/password-reset/', {'email': 'member@example.com'}, format='json')
+        booking = make_booking(payment_verified=True)
+        Player.objects.create(booking=booking, name='New Player', email='new@example.com')
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(EmailOutbox.objects.filter(status='pending').count(), 2)
+
+        with mock.patch('core.outbox.get_connection', wraps=get_connection) as connections:
+            self.assertEqual(dispatch_outbox(), (2, 0))
+        self.assertEqual(connections.call_count, 1)
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), ['member@example.com', 'new@example.com'])
+        self.assertEqual(dispatch_outbox(), (0, 0))
+
+    @override_settings(EMAIL_OUTBOX_RETRY_SECONDS=60, EMAIL_OUTBOX_MAX_ATTEMPTS=2)
+    def test_failures_back_off_then_give_up(self):
+        row = EmailOutbox.queue('member@example.com', 'Hi', 'Body')
+        broken = get_connection()
+        broken.send_messages = mock.Mock(side_effect=OSError('SMTP stalled'))
+
+        self.assertEqual(dispatch_outbox(connection=broken), (0, 1))
+        row.refresh_from_db()
+        self.assertEqual((row.status, row.attempts, row.last_error), ('pending', 1, 'SMTP stalled'))
+        self.assertGreater(row.next_attempt_at, timezone.now() + timedelta(seconds=50))
+        self.assertEqual(dispatch_outbox(connection=broken), (0, 0))  # not due yet
+
+        EmailOutbox.objects.filter(pk=row.pk).update(next_attempt_at=timezone.now())
+        dispatch_outbox(connection=broken)
+        row.refresh_from_db()
+        self.assertEqual((row.status, row.attempts), ('failed', 2))
+
+
+class TaskDispatchTests(MediaRootMixin, APITestCase):
+    def setUp(self):
+        breaker = dispatch.CircuitBreaker(threshold=2, reset_seconds=30)
+        super().setUp()
+        dispatch._batches.__dict__.clear()  # items left by rolled-back test transactions
+        patches = [
+            mock.patch.object(dispatch, 'breaker', breaker),
+            # Run fallback work inline so it shares the test transaction
+            mock.patch.object(dispatch._executor, 'submit', lambda fn, *args: fn(*args)),
+            mock.patch.object(dispatch, 'connections', mock.Mock()),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.breaker = breaker
+
+    def test_breaker_opens_and_tasks_run_locally(self):
+        task = mock.Mock()
+        task.name = 'core.tasks.example'
+        task.apply_async.side_effect = ConnectionError('broker down')
+
+        for _ in range(3):
+            with self.captureOnCommitCallbacks(execute=True):
+                dispatch.dispatch(task, 7, flag=True)
+        self.assertEqual(task.apply_async.call_count, 2)  # third call skipped the broker
+        self.assertEqual(task.apply.call_count, 3)
+        task.apply.assert_called_with((7,), {'flag': True}, throw=True)
+        self.assertEqual(self.breaker.state, 'open')
+
+        self.breaker.opened_at -= 30  # reset window elapsed: one probe, which succeeds
+        task.apply_async.side_effect = None
+        self.assertEqual(dispatch.send(task), 'published')
+        self.assertEqual(self.breaker.state, 'closed')
+
+    def test_queued_email_is_sent_after_commit(self):
+        with mock.patch('core.tasks.send_emails_batch.apply_async', side_effect=ConnectionError) as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                EmailOutbox.queue('member@example.com', 'Hi', 'Body')
+        publish.assert_called_once()
+        self.assertEqual(EmailOutbox.objects.get().status, 'sent')
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_metrics_are_admin_only(self):
+        self.client.force_authenticate(CustomUser.objects.create_user(email='member@example.com', password='pw'))
+        self.assertEqual(self.client.get('/api/ops/task-dispatch/').status_code, 403)
+        self.client.force_authenticate(
+            CustomUser.objects.create_user(email='admin@example.com', password='pw', is_staff=True)
+        )
+        with mock.patch.object(dispatch, 'broker_queue_depth', return_value=4):
+            data = self.client.get('/api/ops/task-dispatch/').data
+        self.assertEqual((data['breaker'], data['broker_queue_depth']), ('closed', 4))
+
+    def test_players_added_together_share_one_email_and_one_qr_task(self):
+        booking = make_booking(payment_verified=True)
+        with mock.patch('core.tasks.send_emails_batch.apply_async') as emails, \
+                mock.patch('core.tasks.render_qr_batch.apply_async') as renders:
+            with self.captureOnCommitCallbacks(execute=True):
+                players = [Player.objects.create(booking=booking, name=f'P{i}', email=f'p{i}@example.com')
+                           for i in range(3)]
+        emails.assert_called_once()
+        renders.assert_called_once()
+        self.assertEqual(renders.call_args[0][0], ([p.pk for p in players],))
+        self.assertEqual(len(emails.call_args[0][0][0]), 3)
+        self.assertTrue(all(p.qr_token for p in Player.objects.all()))
+        self.assertFalse(any(p.qr_code for p in Player.objects.all()))
+
+        self.assertEqual(render_qr_batch(renders.call_args[0][0][0]), 3)
+        self.assertEqual(render_qr_batch([players[0].pk]), 0)  # already rendered
+        tokens = {p.pk: p.qr_token for p in players}
+        for player in Player.objects.all():
+            self.assertTrue(player.qr_code)
+            self.assertEqual(player.qr_token, tokens[player.pk])  # the issued token is kept
+        self.assertEqual(send_emails_batch(emails.call_args[0][0][0]), (3, 0))
+
+    def test_tasks_are_routed_to_their_queues(self):
+        from redball_academy.celery import app
+        route = app.amqp.router.route
+        self.assertEqual(route({}, 'core.tasks.send_emails_batch')['queue'].name, 'email')
+        self.assertEqual(route({}, 'core.tasks.render_qr_batch')['queue'].name, 'qr')
+        self.assertEqual(route({}, 'core.tasks.rebuild_daily_stats_range')['queue'].name, 'reports')
+
+
+@override_settings(RAZORPAY_KEY_ID='rzp_test_key', RAZORPAY_KEY_SECRET='test_secret',
+                   RAZORPAY_WEBHOOK_SECRET='hook_secret', RAZORPAY_MAX_RETRIES=0)
+class PaymentGatewayTests(MediaRootMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        dispatch._batches.__dict__.clear()  # items left by rolled-back test transactions
+        self.stub = RazorpayStub('rzp_test_key', 'test_secret').start()
+        self.addCleanup(self.stub.stop)
+        settings_patch = override_settings(RAZORPAY_BASE_URL=self.stub.base_url)
+        settings_patch.enable()
+        self.addCleanup(settings_patch.disable)
+        payments.reset_client()
+        self.addCleanup(payments.reset_client)
+        self.booking = make_booking()
+        self.client.force_authenticate(self.booking.user)
+
+    def create_order(self, booking=None, **headers):
+        booking = booking or self.booking
+        return self.client.post('/api/payment/create-order/', {'booking_id': booking.pk, 'amount': '1.00'},
+                                format='json', **headers)
+
+    def test_orders_share_one_pooled_connection(self):
+        other = make_booking()
+        first, second = self.create_order(), self.create_order(other)
+        self.assertEqual((first.status_code, second.status_code), (200, 200))
+        self.assertEqual((self.stub.requests, self.stub.connections), (2, 1))
+
+    def test_order_is_reused_per_booking_at_the_slot_price(self):
+        first = self.create_order()
+        self.assertEqual((first.data['amount'], first.data['reused']), (50000, False))
+        self.assertEqual(self.stub.orders[first.data['order_id']]['amount'], 50000)  # client amount ignored
+        second = self.create_order()
+        self.assertEqual((second.data['order_id'], second.data['reused']), (first.data['order_id'], True))
+        self.assertEqual(self.stub.requests, 1)
+
+        TimeSlot.objects.filter(pk=self.booking.slot_id).update(price=650)
+        third = self.create_order()
+        self.assertNotEqual(third.data['order_id'], first.data['order_id'])
+        self.assertEqual(Booking.objects.get(pk=self.booking.pk).order_id, third.data['order_id'])
+
+        self.client.force_authenticate(CustomUser.objects.create_user(email='other@example.com', password='pw'))
+        self.assertEqual(self.create_order().status_code, 403)
+
+    def test_idempotency_key_replays_the_first_response(self):
+        cache.clear()
+        first = self.create_order(HTTP_IDEMPOTENCY_KEY='tap-1')
+        with self.assertNumQueries(0):
+            replay = self.create_order(HTTP_IDEMPOTENCY_KEY='tap-1')
+        self.assertEqual(replay.data, first.data)
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertEqual(self.create_order(make_booking(), HTTP_IDEMPOTENCY_KEY='tap-1').status_code, 422)
+
+    def test_verify_checks_the_signature_locally(self):
+        checkout = self.stub.pay(self.create_order().data['order_id'])
+        requests_before = self.stub.requests
+
+        forged = {**checkout, 'razorpay_signature': '0' * 64, 'booking_id': self.booking.pk}
+        self.assertEqual(self.client.post('/api/payment/verify/', forged, format='json').status_code, 400)
+        response = self.client.post('/api/payment/verify/', {**checkout, 'booking_id': self.booking.pk},
+                                    format='json')
+        self.assertEqual(response.status_code, 200)
+        booking = Booking.objects.get(pk=self.booking.pk)
+        self.assertTrue(booking.payment_verified)
+        self.assertEqual(booking.payment_id, checkout['razorpay_payment_id'])
+        self.assertEqual(self.stub.requests, requests_before)
+        self.assertEqual(self.create_order().status_code, 400)  # already paid
+
+    def test_verify_rejects_another_bookings_order(self):
+        self.create_order()
+        other = make_booking()
+        checkout = self.stub.pay(self.create_order(other).data['order_id'])
+        response = self.client.post('/api/payment/verify/', {**checkout, 'booking_id': self.booking.pk},
+                                    format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Booking.objects.get(pk=self.booking.pk).payment_verified)
+
+    def test_verify_needs_this_bookings_unused_order_and_payment(self):
+        other = make_booking()
+        checkout = self.stub.pay(self.create_order(other).data['order_id'])
+        verify = {**checkout, 'booking_id': self.booking.pk}
+        # No order stored on the booking yet
+        self.assertEqual(self.client.post('/api/payment/verify/', verify, format='json').status_code, 400)
+
+        # A payment already recorded on another booking is not reused
+        Booking.objects.filter(pk=self.booking.pk).update(order_id=checkout['razorpay_order_id'])
+        Booking.objects.filter(pk=other.pk).update(order_id='order_other',
+                                                   payment_id=checkout['razorpay_payment_id'])
+        self.assertEqual(self.client.post('/api/payment/verify/', verify, format='json').status_code, 400)
+        self.assertFalse(Booking.objects.get(pk=self.booking.pk).payment_verified)
+
+    def test_unreachable_gateway_is_a_502(self):
+        self.stub.stop()
+        response = self.create_order()
+        self.assertEqual(response.status_code, 502)
+
+    def post_webhook(self, body, headers):
+        return self.client.post('/api/payment/webhook/', data=body, content_type='application/json', **headers)
+
+    def test_webhook_is_stored_then_applied_once(self):
+        checkout = self.stub.pay(self.create_order().data['order_id'])
+        body, headers = self.stub.webhook(checkout, secret='hook_secret')
+        self.assertEqual(self.post_webhook(body, {**headers, 'HTTP_X_RAZORPAY_SIGNATURE': 'f' * 64}).status_code,
+                         400)
+
+        with mock.patch('core.tasks.process_payment_webhooks.apply_async') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.post_webhook(body, headers)
+        self.assertEqual(response.json(), {'status': 'received'})
+        self.assertFalse(Booking.objects.get(pk=self.booking.pk).payment_verified)  # not applied in the request
+        self.assertEqual(self.post_webhook(body, headers).json(), {'status': 'duplicate'})
+
+        with mock.patch('core.tasks.render_organizer_qr_batch.apply_async') as render:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(process_payment_webhooks(publish.call_args[0][0][0]), (1, 0))
+        booking = Booking.objects.get(pk=self.booking.pk)
+        self.assertTrue(booking.payment_verified)
+        self.assertEqual(booking.payment_id, checkout['razorpay_payment_id'])
+        self.assertTrue(booking.organizer_qr_token)
+        self.assertFalse(booking.organizer_qr_code)  # rendered by the qr worker, not here
+        render.assert_called_once_with(([booking.pk],), {}, retry=False, ignore_result=True)
+
+        # The client's own verify call arriving afterwards is harmless
+        response = self.client.post('/api/payment/verify/', {**checkout, 'booking_id': self.booking.pk},
+                                    format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(process_payment_webhooks([]), (0, 0))
+
+    def test_verify_and_webhook_count_one_payment_once(self):
+        for verify_first in (True, False):
+            booking = make_booking()
+            checkout = self.stub.pay(self.create_order(booking).data['order_id'])
+            body, headers = self.stub.webhook(checkout, secret='hook_secret')
+            with mock.patch('core.tasks.process_payment_webhooks.apply_async'), \
+                    mock.patch('core.tasks.render_organizer_qr_batch.apply_async'):
+                self.post_webhook(body, headers)
+                for step in ('verify', 'webhook') if verify_first else ('webhook', 'verify'):
+                    if step == 'verify':
+                        response = self.client.post('/api/payment/verify/', {**checkout, 'booking_id': booking.pk},
+                                                    format='json')
+                        self.assertEqual(response.status_code, 200)
+                    else:
+                        self.assertEqual(process_payment_webhooks(None), (1, 0))
+        row = DailySportStats.objects.get()
+        self.assertEqual((row.bookings, row.revenue), (2, Decimal('1000.00')))
+
+    def test_webhook_for_the_wrong_amount_is_not_applied(self):
+        order_id = self.create_order().data['order_id']
+        self.stub.orders[order_id]['amount'] = 100
+        body, headers = self.stub.webhook(self.stub.pay(order_id), secret='hook_secret')
+        self.post_webhook(body, headers)
+        self.assertEqual(process_payment_webhooks(None), (0, 1))
+        event = PaymentWebhookEvent.objects.get()
+        self.assertEqual((event.status, event.attempts), ('pending', 1))
+        self.assertIn('expected 50000', event.last_error)
+        self.assertFalse(Booking.objects.get(pk=self.booking.pk).payment_verified)
+
+    def test_reconcile_fixes_paid_bookings_and_reports_the_rest(self):
+        paid = self.booking
+        self.stub.pay(self.create_order(paid).data['order_id'])
+        short = make_booking()
+        self.stub.pay(self.create_order(short).data['order_id'], amount=100)
+        pending = make_booking()
+        self.create_order(pending)
+        stray = self.stub.create_order({'amount': 2500})
+        self.stub.pay(stray['id'])
+        start, end = window(timezone.localdate(), timezone.localdate())
+
+        with CaptureQueriesContext(connection) as queries:
+            report, counts = reconcile(start, end, page_size=2, apply=False)
+        self.assertEqual(counts, {'marked_paid': 1, 'amount_mismatch': 1, 'unmatched_payment': 1,
+                                  'pending_without_payment': 1})
+        self.assertEqual(len(queries), 3)  # one per page of two payments, plus the unpaid-bookings scan
+        self.assertFalse(Booking.objects.get(pk=paid.pk).payment_verified)
+
+        stats_before = DailySportStats.objects.filter(sport=paid.slot.sport, date=paid.slot.date).first()
+        with mock.patch('core.tasks.render_organizer_qr_batch.apply_async') as render:
+            with self.captureOnCommitCallbacks(execute=True):
+                out = StringIO()
+                call_command('reconcile_payments', '--start', str(timezone.localdate()), '--page-size', '2',
+                             '--report', '-', stdout=out)
+        self.assertIn('Marked 1 bookings paid', out.getvalue())
+        self.assertIn(f'amount_mismatch,{next(p for p in self.stub.payments.values() if p["amount"] == 100)["id"]}',
+                      out.getvalue())
+        booking = Booking.objects.get(pk=paid.pk)
+        self.assertTrue(booking.payment_verified)
+        self.assertEqual(booking.status, 'confirmed')
+        stats = DailySportStats.objects.get(sport=paid.slot.sport, date=paid.slot.date)
+        self.assertEqual(stats.bookings, (stats_before.bookings if stats_before else 0) + 1)
+        render.assert_called_once_with(([paid.pk],), {}, retry=False, ignore_result=True)
+        self.assertEqual(load_qr_token(booking.organizer_qr_token, salt='organizer-qr-token')['booking_id'],
+                         paid.pk)
+        for other in (short, pending):
+            self.assertFalse(Booking.objects.get(pk=other.pk).payment_verified)
+
+        self.assertNotIn('marked_paid', reconcile(start, end)[1])  # already fixed
+
+    def test_cron_tokens_verify_in_the_web_service(self):
+        # A token issued by a cron job (reconcile, webhook processing) is checked by
+        # /api/scan/ in the web service, so they must be signed with the same key
+        with override_settings(SECRET_KEY='cron-and-web-key'):
+            self.stub.pay(self.create_order().data['order_id'])
+            start, end = window(timezone.localdate(), timezone.localdate())
+            with mock.patch('core.tasks.render_organizer_qr_batch.apply_async'):
+                reconcile(start, end)
+        token = Booking.objects.get(pk=self.booking.pk).organizer_qr_token
+        with override_settings(SECRET_KEY='cron-and-web-key'):
+            self.assertEqual(load_qr_token(token, salt='organizer-qr-token')['booking_id'], self.booking.pk)
+        with self.assertRaises(signing.BadSignature):
+            load_qr_token(token, salt='organizer-qr-token')
+
+    @unittest.skipUnless(importlib.util.find_spec('yaml'), 'PyYAML is not installed')
+    def test_cron_services_share_the_web_services_secret_key(self):
+        import yaml
+        for blueprint in (settings.BASE_DIR / 'render.yaml', settings.BASE_DIR.parent / 'render.yaml'):
+            services = yaml.safe_load(blueprint.read_text())['services']
+            web = next(s['name'] for s in services if s['type'] == 'web')
+            for cron in (s for s in services if s['type'] == 'cron'):
+                key = next(v for v in cron['envVars'] if v['key'] == 'SECRET_KEY')
+                self.assertEqual(key.get('fromService'), {'type': 'web', 'name': web, 'envVarKey': 'SECRET_KEY'},
+                                 f'{blueprint}: {cron["name"]}')
+
+
+class ReferenceDataCacheTests(MediaRootMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        refdata._compiled.clear()
+        self.slot = make_booking(on_date=timezone.localdate() + timedelta(days=1)).slot
+        self.slot.is_booked = False
+
+    def test_blackouts_are_read_from_the_cache_and_invalidated_on_change(self):
+        self.assertTrue(self.slot.is_available())
+        with self.assertNumQueries(0):
+            self.assertTrue(self.slot.is_available())
+
+        blackout = BlackoutDate.objects.create(sport_id=self.slot.sport_id, date=self.slot.date, reason='Maintenance')
+        self.assertFalse(self.slot.is_available())
+        blackout.is_active = False
+        blackout.save()
+        self.assertTrue(self.slot.is_available())
+        blackout.delete()
+        self.assertEqual(refdata.blackout_dates(self.slot.sport_id), frozenset())
+
+    def test_public_lists_are_cached_until_a_sport_changes(self):
+        BlackoutDate.objects.create(sport_id=self.slot.sport_id, date=self.slot.date, reason='Maintenance')
+        first = self.client.get('/api/blackout-dates/')
+        with self.assertNumQueries(1):  # just the ETag aggregate
+            self.assertEqual(self.client.get('/api/blackout-dates/').data, first.data)
+        self.assertEqual(self.client.get('/api/blackout-dates/', {'sport': 0}).data['count'], 0)
+
+        Sport.objects.filter(pk=self.slot.sport_id).first().save()  # renamed, re-priced, ...
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/blackout-dates/')
+        self.assertTrue(queries)
+
+        self.assertEqual(self.client.get('/api/sports/').data['results'][0]['available_slots_count'], 1)
+        TimeSlot.objects.create(sport_id=self.slot.sport_id, date=self.slot.date, start_time='20:00',
+                                end_time='21:00', price=500)
+        sport = self.client.get('/api/sports/').data['results'][0]
+        self.assertEqual(sport['available_slots_count'], 2)  # slot changes also retire the sports list
+
+    def test_changes_made_in_another_worker_show_up_after_the_ttl(self):
+        # With a per-process cache another worker's bump never arrives here
+        sport_id = self.slot.sport_id
+        name = refdata.sport_ref(sport_id)['sport']['name']
+        Sport.objects.filter(pk=sport_id).update(name='Renamed')
+        self.assertEqual(refdata.sport_ref(sport_id)['sport']['name'], name)
+
+        later = time.time() + settings.REFDATA_CACHE_SECONDS + 1
+        with mock.patch('time.time', return_value=later):
+            self.assertEqual(refdata.sport_ref(sport_id)['sport']['name'], 'Renamed')
+
+
+class ConditionalGetTests(MediaRootMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.slot = make_booking(on_date=timezone.localdate() + timedelta(days=1)).slot
+
+    def revalidate(self, url, etag, **params):
+        return self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_slot_list_is_a_304_without_serializing(self):
+        first = self.client.get('/api/slots/', {'sport': self.slot.sport_id})
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('Last-Modified', first)
+        with mock.patch('core.serializers.TimeSlotSerializer.to_representation') as serialize:
+            again = self.revalidate('/api/slots/', first['ETag'], sport=self.slot.sport_id)
+        self.assertEqual((again.status_code, again.content), (304, b''))
+        serialize.assert_not_called()
+        self.assertEqual(self.client.get('/api/slots/', {'sport': self.slot.sport_id},
+                                         HTTP_IF_MODIFIED_SINCE=first['Last-Modified']).status_code, 200)
+
+        BlackoutDate.objects.create(sport_id=self.slot.sport_id, date=self.slot.date, reason='Rain')
+        changed = self.revalidate('/api/slots/', first['ETag'], sport=self.slot.sport_id)
+        self.assertEqual(changed.status_code, 200)  # is_available flipped
+        self.assertFalse(changed.data[0]['is_available'])
+
+    def test_etag_tracks_edits_deletions_and_sport_changes(self):
+        blackout = BlackoutDate.objects.create(sport_id=self.slot.sport_id, date=self.slot.date, reason='Rain')
+        etag = self.client.get('/api/blackout-dates/')['ETag']
+        self.assertEqual(self.revalidate('/api/blackout-dates/', etag).status_code, 304)
+
+        blackout.reason = 'Maintenance'
+        blackout.save()
+        etag, previous = self.client.get('/api/blackout-dates/')['ETag'], etag
+        self.assertNotEqual(etag, previous)
+
+        sport = Sport.objects.get(pk=self.slot.sport_id)
+        sport_etag = self.client.get(f'/api/sports/{sport.pk}/')['ETag']
+        self.assertEqual(self.revalidate(f'/api/sports/{sport.pk}/', sport_etag).status_code, 304)
+        sport.name = 'Box Cricket'
+        sport.save()
+        self.assertEqual(self.revalidate(f'/api/sports/{sport.pk}/', sport_etag).status_code, 200)
+        self.assertEqual(self.revalidate('/api/blackout-dates/', etag).status_code, 200)  # sport_name
+
+        etag = self.client.get('/api/blackout-dates/')['ETag']
+        BlackoutDate.objects.filter(pk=blackout.pk).delete()
+        self.assertEqual(self.revalidate('/api/blackout-dates/', etag).status_code, 200)
+
+
+class DeltaSyncTests(MediaRootMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        self.booking = make_booking(on_date=tomorrow)
+        self.player = make_player(self.booking)
+        self.other = make_booking('other@example.com', on_date=tomorrow)
+        self.client.force_authenticate(self.booking.user)
+
+    def sync(self, cursor=None):
+        return self.client.get('/api/sync/', {'since': cursor} if cursor else {})
+
+    def ids(self, data, kind):
+        return sorted(row['id'] for row in data[kind]['upserted'])
+
+    def test_full_then_incremental_sync(self):
+        full = self.sync()
+        self.assertEqual(full.status_code, 200)
+        self.assertFalse(full.data['reset'])
+        self.assertEqual(self.ids(full.data, 'bookings'), [self.booking.pk])
+        self.assertEqual(self.ids(full.data, 'players'), [self.player.pk])
+        self.assertEqual(len(full.data['slots']['upserted']), 2)
+
+        cursor = self.stale_cursor()
+        empty = self.sync(cursor).data
+        self.assertEqual([empty[kind] for kind in sync.KINDS], [{'upserted': [], 'deleted': []}] * 4)
+
+        player_id = self.player.pk
+        self.player.delete()
+        self.other.cancel_booking('Rain')
+        TimeSlot.objects.filter(pk=self.other.slot_id).update(admin_disabled=True, updated_at=timezone.now())
+        delta = self.sync(cursor).data
+        self.assertEqual(delta['players'], {'upserted': [], 'deleted': [player_id]})
+        # Their booking is re-sent for its players; the other user's cancelled booking is not
+        self.assertEqual(self.ids(delta, 'bookings'), [self.booking.pk])
+        self.assertEqual(delta['bookings']['upserted'][0]['player_count'], 0)
+        self.assertEqual(delta['slots']['deleted'], [self.other.slot_id])
+
+        self.client.force_authenticate(self.other.user)
+        delta = self.sync(cursor).data
+        self.assertEqual(self.ids(delta, 'bookings'), [self.other.pk])
+        self.assertEqual(delta['players']['deleted'], [])  # not their player
+
+    def stale_cursor(self):
+        stale = timezone.now() - timedelta(minutes=10)
+        for model in (Sport, TimeSlot, Booking, Player):
+            model.objects.update(updated_at=stale)
+        return self.sync().data['cursor']
+
+    def test_rows_showing_other_rows_are_resent(self):
+        cursor = self.stale_cursor()
+        BlackoutDate.objects.create(sport_id=self.booking.slot.sport_id, date=self.booking.slot.date, reason='Rain')
+        delta = self.sync(cursor).data
+        self.assertEqual(len(delta['slots']['upserted']), 2)
+        self.assertFalse(any(slot['is_available'] for slot in delta['slots']['upserted']))
+        self.assertFalse(delta['bookings']['upserted'][0]['slot_details']['is_available'])
+        self.assertNotIn('sport_details', delta['bookings']['upserted'][0]['slot_details'])
+
+        cursor = self.stale_cursor()
+        TimeSlot.objects.create(sport_id=self.booking.slot.sport_id, date=self.booking.slot.date,
+                                start_time='20:00', end_time='21:00', price=500)
+        make_player(self.booking, name='Second', email='second@example.com')
+        delta = self.sync(cursor).data
+        self.assertEqual(delta['sports']['upserted'][0]['available_slots_count'], 3)
+        self.assertEqual(delta['bookings']['upserted'][0]['player_count'], 2)
+
+    def test_changes_come_in_pages(self):
+        make_player(self.booking, name='Second', email='second@example.com')
+        full = self.sync().data
+        seen, cursor, pages = {kind: [] for kind in sync.KINDS}, None, 0
+        while True:
+            response = self.client.get('/api/sync/', {'limit': 2, **({'since': cursor} if cursor else {})})
+            pages += 1
+            for kind in sync.KINDS:
+                seen[kind] += [row['id'] for row in response.data[kind]['upserted']]
+            cursor = response.data['cursor']
+            if not response.data['has_more']:
+                break
+        self.assertEqual(seen, {kind: self.ids(full, kind) for kind in sync.KINDS})
+        self.assertEqual(pages, 3)  # 1 sport, 2 slots, 1 booking, 2 players
+        self.assertNotIn('.', cursor)  # a plain cursor once the last page is in
+        self.assertEqual(self.client.get('/api/sync/', {'limit': 0}).status_code, 400)
+        self.assertEqual(self.sync('1.2.9.0').status_code, 400)
+
+    def test_check_ins_and_qr_renders_move_updated_at(self):
+        stale = timezone.now() - timedelta(minutes=10)
+        Player.objects.update(updated_at=stale, qr_code='')
+        Booking.objects.update(updated_at=stale)
+        render_qr_batch([self.player.pk])
+        check_in_organizer(self.booking, at=timezone.now() + timedelta(days=1))
+        self.assertGreater(Player.objects.get(pk=self.player.pk).updated_at, stale)
+        self.assertGreater(Booking.objects.get(pk=self.booking.pk).updated_at, stale)
+
+    def test_old_or_bad_cursors(self):
+        self.booking.delete()
+        self.assertEqual(SyncTombstone.objects.filter(kind='booking').count(), 1)
+        old = sync.make_cursor(timezone.now() - timedelta(days=45))
+        response = self.sync(old)
+        self.assertTrue(response.data['reset'])
+        self.assertEqual(self.sync('yesterday').status_code, 400)
+
+        SyncTombstone.objects.update(deleted_at=timezone.now() - timedelta(days=45))
+        call_command('prune_sync_tombstones', stdout=StringIO())
+        self.assertFalse(SyncTombstone.objects.exists())
@@ -33,7 +33,35 @@ urlpatterns = [
     # Payment endpoints
     path('payment/create-order/', views.create_razorpay_order, name='create_razorpay_order'),
     path('payment/verify/', views.verify_razorpay_payment, name='verify_razorpay_payment'),
+    path('payment/webhook/', views.razorpay_webhook, name='razorpay_webhook'),
+    
+    # QR scanning (any token type) and offline gate scanning
+    path('scan/', views.scan, name='scan'),
+    path('scan/roster/', views.gate_roster, name='gate_roster'),
+    path('scan/roster/key/', views.gate_roster_key, name='gate_roster_key'),
+    path('scan/sync/', views.sync_offline_scans, name='sync_offline_scans'),
     
     # Dashboard
     path('dashboard/stats/', views.dashboard_stats, name='dashboard_stats'),
+    
+    # Archived check-in logs
+    path('checkin-logs/archive/', views.archived_checkin_logs, name='archived_checkin_logs'),
+    
+    # CSV exports
+    path('exports/<str:name>/', views.export_csv, name='export_csv'),
+    
+    # Live attendance (JSON snapshot and Server-Sent Events stream)
+    path('attendance/live/', views.live_attendance, name='live_attendance'),
+    path('attendance/live/stream/', views.live_attendance_stream, name='live_attendance_stream'),
+    
+    # Background task dispatch health
+    path('ops/task-dispatch/', views.task_dispatch_metrics, name='task_dispatch_metrics'),
+    
+    # Reports
+    path('reports/revenue/', views.revenue_report_view, name='revenue_report'),
+    path('reports/utilization/', views.utilization_report_view, name='utilization_report'),
+    path('reports/occupancy/', views.occupancy_heatmap_view, name='occupancy_heatmap'),
+    
+    # Delta sync for mobile clients
+    path('sync/', views.sync_changes, name='sync'),
 ]
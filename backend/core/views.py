@@ -4,36 +4,55 @@ Views for Red Ball Cricket Academy API
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
-from rest_framework_simplejwt.tokens import RefreshToken
-from django.contrib.auth import authenticate, get_user_model
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework.exceptions import AuthenticationFailed
+from django.contrib.auth import get_user_model
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from django.conf import settings
-from django.db import transaction
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Max, Q, Sum
+from django.core.cache import cache
 from django.views.decorators.csrf import csrf_exempt
-import razorpay
+from django.http import JsonResponse, StreamingHttpResponse
+from asgiref.sync import sync_to_async
 import hmac
 import hashlib
 import json
+import asyncio
 from datetime import datetime, timedelta
+from decimal import Decimal
 
 User = get_user_model()
 
-from .models import Sport, TimeSlot, Booking, Player, CheckInLog, UserProfile, BookingConfiguration, BreakTime, BlackoutDate, CustomUser
+from .models import Sport, TimeSlot, Booking, Player, CheckInLog, UserProfile, BookingConfiguration, BreakTime, BlackoutDate, CustomUser, OfflineScan, DailySportStats, EmailOutbox, DASHBOARD_STATS_CACHE_KEY, OCCUPANCY_VERSION_KEY
 from .serializers import (
     SportSerializer, TimeSlotSerializer, BookingSerializer, 
     PlayerSerializer, CheckInLogSerializer, UserSerializer,
     BookingCreateSerializer, PlayerCreateSerializer, BulkPlayerCreateSerializer,
     QRCodeScanSerializer, PaymentOrderSerializer, PaymentVerificationSerializer,
     PasswordChangeSerializer, PasswordResetRequestSerializer, PasswordResetConfirmSerializer,
-    BookingConfigurationSerializer, BreakTimeSerializer, BlackoutDateSerializer
+    BookingConfigurationSerializer, BreakTimeSerializer, BlackoutDateSerializer,
+    ArchivedCheckInLogSerializer, SyncBookingSerializer, SyncTimeSlotSerializer
 )
+from .qr_tokens import load_qr_token, identify_qr_token, token_digest, KIND_PLAYER, KIND_ORGANIZER, KIND_USER
+from .reports import revenue_report, utilization_report, occupancy_heatmap, PERIODS as REPORT_PERIODS
+from . import attendance, dispatch, events, payments, refdata, roster_signing, sync, webhooks
+from .tasks import process_payment_webhooks
+from .exports import EXPORTS, astream_csv, export_queryset
+from .archive import SOURCES as ARCHIVE_KINDS, archived_logs
+from .login import LoginThrottled, authenticate_login
+from .authentication import CLAIMS_AUTHENTICATION_CLASSES, tokens_for_user, user_type_of
+from .checkin import CheckInError, check_in_player, check_in_organizer, check_in_user, scan_target
+from django.core import signing
 from django.contrib.auth.tokens import default_token_generator
-from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes, force_str
-from django.core.mail import send_mail
 # JWT login endpoint
 @api_view(['POST'])
 @permission_classes([AllowAny])
@@ -42,37 +61,21 @@ def jwt_login(request):
     identifier = request.data.get('username') or request.data.get('email')
     password = request.data.get('password')
     
-    print(f"🔐 Login attempt - Email/Username: {identifier}, Password provided: {bool(password)}")
+    if not identifier or not password:
+        return Response({'error': 'Invalid credentials'}, status=status.HTTP_401_UNAUTHORIZED)
     
-    user = None
-    if identifier and password:
-        # CustomUser uses email as USERNAME_FIELD, so authenticate with email
-        user = authenticate(request, email=identifier, password=password)
-        print(f"   First auth attempt (email): {'✅ Success' if user else '❌ Failed'}")
-        
-        # Fallback: try as username field for backwards compatibility
-        if not user:
-            try:
-                user_obj = User.objects.filter(email__iexact=identifier).first()
-                if user_obj:
-                    print(f"   Found user by email: {user_obj.email}")
-                    if user_obj.check_password(password):
-                        user = user_obj
-                        print(f"   Password check: ✅ Success")
-                    else:
-                        print(f"   Password check: ❌ Failed")
-                else:
-                    print(f"   No user found with email: {identifier}")
-            except Exception as e:
-                print(f"   Exception during fallback: {e}")
-    else:
-        print(f"   ❌ Missing credentials - identifier: {identifier}, password: {bool(password)}")
+    try:
+        # CustomUser uses email as USERNAME_FIELD; matched case-insensitively
+        user = authenticate_login(request, str(identifier), str(password))
+    except LoginThrottled as e:
+        response = Response({'error': 'Too many failed login attempts. Please try again later.'},
+                            status=status.HTTP_429_TOO_MANY_REQUESTS)
+        response['Retry-After'] = str(e.retry_after)
+        return response
     
     if user:
-        refresh = RefreshToken.for_user(user)
-        profile = getattr(user, 'profile', None)
-        user_type = profile.user_type if profile else 'customer'
-        print(f"   ✅ Login successful for {user.email}")
+        user_type = user_type_of(user)
+        refresh = tokens_for_user(user, user_type)
         return Response({
             'refresh': str(refresh),
             'access': str(refresh.access_token),
@@ -81,7 +84,6 @@ def jwt_login(request):
             'is_staff': user.is_staff
         })
     
-    print(f"   ❌ Login failed - returning 401")
     return Response({'error': 'Invalid credentials'}, status=status.HTTP_401_UNAUTHORIZED)
 
 
@@ -108,13 +110,11 @@ def password_reset_request(request):
             uid = urlsafe_base64_encode(force_bytes(user.pk))
             token = default_token_generator.make_token(user)
             reset_link = f"{request.scheme}://{request.get_host()}/api/reset-password/?uid={uid}&token={token}"
-            # send email
-            send_mail(
-                subject='Password Reset Request - Red Ball Cricket Academy',
-                message=f'Hello,\n\nYou requested to reset your password for Red Ball Cricket Academy.\n\nClick the link below to reset your password:\n{reset_link}\n\nThis link will expire in 24 hours.\n\nIf you did not request this, please ignore this email.\n\nBest regards,\nRed Ball Cricket Academy Team',
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[email],
-                fail_silently=False,
+            # queue email (sent by the outbox dispatcher)
+            EmailOutbox.queue(
+                email,
+                'Password Reset Request - Red Ball Cricket Academy',
+                f'Hello,\n\nYou requested to reset your password for Red Ball Cricket Academy.\n\nClick the link below to reset your password:\n{reset_link}\n\nThis link will expire in 24 hours.\n\nIf you did not request this, please ignore this email.\n\nBest regards,\nRed Ball Cricket Academy Team',
             )
         # always return success to avoid leaking emails
         return Response({'message': 'If an account with that email exists, a reset link has been sent.'})
@@ -171,7 +171,7 @@ def jwt_register(request):
         profile.user_type = user_type
         profile.save()
         
-        refresh = RefreshToken.for_user(user)
+        refresh = tokens_for_user(user, user_type)
         return Response({
             'message': 'User registered successfully',
             'refresh': str(refresh),
@@ -184,22 +184,97 @@ def jwt_register(request):
         return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 
-# Initialize Razorpay client
-razorpay_client = razorpay.Client(
-    auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET)
-)
+class ConditionalGetMixin:
+    """ETag / Last-Modified for list and retrieve.
+
+    The validator is one aggregate over the filtered queryset: the latest of
+    `conditional_fields` plus the row count (so deletions count too), and any
+    other versions the serialized data depends on. A matching If-None-Match
+    gets a 304 before anything is serialized. Last-Modified is informational
+    only: it cannot see deletions, so If-Modified-Since alone never yields 304.
+    """
+    conditional_fields = ('updated_at',)
 
+    def conditional_versions(self):
+        return ()
 
-class SportViewSet(viewsets.ModelViewSet):
+    def get_queryset(self):
+        # Built once per request: the validator and the response share it
+        if not hasattr(self, '_conditional_queryset'):
+            self._conditional_queryset = super().get_queryset()
+        return self._conditional_queryset
+
+    def _validators(self, queryset):
+        stats = queryset.order_by().aggregate(
+            count=Count('pk'), **{f'max_{i}': Max(field) for i, field in enumerate(self.conditional_fields)}
+        )
+        stamps = [stats[f'max_{i}'] for i in range(len(self.conditional_fields))]
+        last_modified = max((stamp for stamp in stamps if stamp), default=None)
+        parts = [self.basename, stats['count'], *(stamp.isoformat() if stamp else '' for stamp in stamps),
+                 *self.conditional_versions()]
+        etag = '"%s"' % hashlib.sha256(':'.join(str(part) for part in parts).encode()).hexdigest()[:32]
+        return etag, last_modified
+
+    def _conditional(self, request, queryset, render):
+        etag, last_modified = self._validators(queryset)
+        not_modified = get_conditional_response(request, etag=etag)
+        response = not_modified or render()
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified:
+                response['Last-Modified'] = http_date(last_modified.timestamp())
+            patch_cache_control(response, no_cache=True)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._conditional(request, self.filter_queryset(self.get_queryset()),
+                                 lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_queryset()).filter(**{self.lookup_field: self.kwargs[lookup]})
+        return self._conditional(request, queryset,
+                                 lambda: super(ConditionalGetMixin, self).retrieve(request, *args, **kwargs))
+
+
+class CachedReferenceListMixin:
+    """Serve list responses from the reference data cache (core.refdata).
+
+    Entries are keyed by the full URL (filters, page) and the reference data
+    version, so any change to a sport, config, break or blackout date retires
+    them. list_cache_versions() adds any other versions the response depends on.
+    """
+
+    def list_cache_versions(self):
+        return ()
+
+    def list(self, request, *args, **kwargs):
+        key = refdata.list_cache_key(self.basename, request.build_absolute_uri(), *self.list_cache_versions())
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = super().list(request, *args, **kwargs)
+        cache.set(key, response.data, settings.REFDATA_CACHE_SECONDS)
+        return response
+
+
+class SportViewSet(ConditionalGetMixin, CachedReferenceListMixin, viewsets.ModelViewSet):
     """ViewSet for Sport CRUD operations"""
     queryset = Sport.objects.all()
     serializer_class = SportSerializer
+    authentication_classes = CLAIMS_AUTHENTICATION_CLASSES
     
     def get_permissions(self):
         """Authenticated users can manage, anyone can view"""
         if self.action in ['list', 'retrieve']:
             return [AllowAny()]
         return [IsAuthenticated()]
+
+    def list_cache_versions(self):
+        # available_slots_count changes with every slot and booking
+        return (cache.get(OCCUPANCY_VERSION_KEY, 0),)
+
+    conditional_versions = list_cache_versions
     
     def create(self, request, *args, **kwargs):
         """Create sport with detailed error logging"""
@@ -257,11 +332,17 @@ class SportViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class SlotViewSet(viewsets.ModelViewSet):
+class SlotViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """ViewSet for Slot CRUD operations"""
     queryset = TimeSlot.objects.all()
     serializer_class = TimeSlotSerializer
+    authentication_classes = CLAIMS_AUTHENTICATION_CLASSES
     pagination_class = None  # Disable pagination to show all slots in admin interface
+    conditional_fields = ('updated_at', 'sport__updated_at')
+
+    def conditional_versions(self):
+        # is_available follows blackout dates and the calendar; sport_details counts free slots
+        return (cache.get(OCCUPANCY_VERSION_KEY, 0), refdata.get_version(), timezone.now().date())
 
     def get_permissions(self):
         """Admin can create/update/delete, others can only view"""
@@ -405,10 +486,11 @@ class SlotViewSet(viewsets.ModelViewSet):
             created_slots = []
             skipped_count = 0
             current_date = start_date
+            blackouts = refdata.blackout_dates(sport.pk)
             
             while current_date <= end_date:
                 # Check if it's a blackout date
-                if BlackoutDate.objects.filter(sport=sport, date=current_date, is_active=True).exists():
+                if current_date in blackouts:
                     current_date += timedelta(days=1)
                     continue
                 
@@ -613,6 +695,7 @@ class BookingViewSet(viewsets.ModelViewSet):
     """ViewSet for Booking operations"""
     queryset = Booking.objects.all()
     serializer_class = BookingSerializer
+    authentication_classes = CLAIMS_AUTHENTICATION_CLASSES
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
@@ -776,7 +859,6 @@ class BookingViewSet(viewsets.ModelViewSet):
     def scan_organizer_qr(self, request):
         """Scan organizer QR code for check-in/out"""
         from django.core import signing
-        from core.models import OrganizerCheckInLog
         import logging
         
         logger = logging.getLogger(__name__)
@@ -791,7 +873,7 @@ class BookingViewSet(viewsets.ModelViewSet):
         # Step 1: Try to decode and verify the token signature FIRST
         try:
             logger.info("[ORGANIZER QR] Attempting to decode token...")
-            data = signing.loads(token, salt='organizer-qr-token')
+            data = load_qr_token(token, salt='organizer-qr-token')
             logger.info(f"[ORGANIZER QR] Token decoded successfully: {data}")
         except signing.BadSignature as e:
             logger.error(f"[ORGANIZER QR] Bad signature: {str(e)}")
@@ -806,14 +888,14 @@ class BookingViewSet(viewsets.ModelViewSet):
         logger.info(f"[ORGANIZER QR] Booking ID: {booking_id}, Slot Date: {slot_date}")
 
         try:
-            booking = Booking.objects.get(id=booking_id)
+            booking = Booking.objects.select_related('slot__sport', 'user').get(id=booking_id)
         except Booking.DoesNotExist:
             logger.error(f"[ORGANIZER QR] Booking not found: {booking_id}")
             return Response({'error': 'Booking not found'}, status=status.HTTP_404_NOT_FOUND)
 
         logger.info(f"[ORGANIZER QR] Booking found: {booking.id}, Slot Date: {booking.slot.date}, Check-in Count: {booking.organizer_check_in_count}")
 
-        today = timezone.now().date()
+        today = timezone.localdate()
         logger.info(f"[ORGANIZER QR] Today's date: {today}, Booking slot date: {booking.slot.date}, Token slot date: {slot_date}")
 
         if str(booking.slot.date) != slot_date or booking.slot.date != today:
@@ -830,34 +912,18 @@ class BookingViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Step 3: Only now, after all checks, update state
-        if booking.organizer_check_in_count == 0:
-            # First scan - Check IN
-            booking.organizer_check_in_count = 1
-            booking.organizer_is_in = True
-            action = 'IN'
+        # Step 3: Only now, after all checks, update state and log atomically
+        try:
+            action = check_in_organizer(booking)
+        except CheckInError as e:
+            logger.error(f"[ORGANIZER QR] Transition rejected: {e}")
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if action == 'IN':
             message = f'Organizer checked in for {booking.slot.sport.name}'
-            logger.info(f"[ORGANIZER QR] First scan - CHECK IN")
-        elif booking.organizer_check_in_count == 1:
-            # Second scan - Check OUT
-            booking.organizer_check_in_count = 2
-            booking.organizer_is_in = False
-            action = 'OUT'
-            message = f'Organizer checked out from {booking.slot.sport.name}'
-            logger.info(f"[ORGANIZER QR] Second scan - CHECK OUT")
         else:
-            logger.error(f"[ORGANIZER QR] Invalid state: {booking.organizer_check_in_count}")
-            return Response(
-                {'error': 'Invalid check-in state'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-
-        booking.save()
-        logger.info(f"[ORGANIZER QR] Booking saved - Count: {booking.organizer_check_in_count}, Is In: {booking.organizer_is_in}")
-
-        # Create log entry
-        OrganizerCheckInLog.objects.create(booking=booking, user=booking.user, action=action)
-        logger.info(f"[ORGANIZER QR] Log entry created")
+            message = f'Organizer checked out from {booking.slot.sport.name}'
+        logger.info(f"[ORGANIZER QR] {action} - Count: {booking.organizer_check_in_count}, Is In: {booking.organizer_is_in}")
 
         return Response({
             'message': message,
@@ -880,6 +946,7 @@ class PlayerViewSet(viewsets.ModelViewSet):
     """ViewSet for Player operations"""
     queryset = Player.objects.all()
     serializer_class = PlayerSerializer
+    authentication_classes = CLAIMS_AUTHENTICATION_CLASSES
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
@@ -892,8 +959,7 @@ class PlayerViewSet(viewsets.ModelViewSet):
         if user.is_staff:
             return Player.objects.all()
         # If logged-in user is a player, return their player profile
-        profile = getattr(user, 'profile', None)
-        if profile and getattr(profile, 'user_type', None) == 'player':
+        if user_type_of(user) == 'player':
             return Player.objects.filter(user=user)
         # Otherwise, users see players from their bookings
         return Player.objects.filter(booking__user=user)
@@ -971,7 +1037,7 @@ class PlayerViewSet(viewsets.ModelViewSet):
             from django.core import signing
             from dateutil import parser
             try:
-                data = signing.loads(token, salt='player-qr-token')
+                data = load_qr_token(token, salt='player-qr-token')
                 player_id = data.get('player_id')
                 token_date = data.get('date')
                 token_exp = data.get('exp')
@@ -996,7 +1062,7 @@ class PlayerViewSet(viewsets.ModelViewSet):
             return Response({'error': 'No QR data or token provided'}, status=status.HTTP_400_BAD_REQUEST)
         
         try:
-            player = Player.objects.get(id=player_id)
+            player = Player.objects.select_related('booking__slot').get(id=player_id)
         except Player.DoesNotExist:
             return Response(
                 {'error': 'Invalid QR code - player not found'},
@@ -1004,7 +1070,7 @@ class PlayerViewSet(viewsets.ModelViewSet):
             )
         
         # Check if booking date matches today
-        today = timezone.now().date()
+        today = timezone.localdate()
         booking_date = player.booking.slot.date
         
         if booking_date != today:
@@ -1020,22 +1086,12 @@ class PlayerViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Check in/out
-        if player.check_in_count == 0:
-            # First scan - Check In
-            player.check_in()
-            CheckInLog.objects.create(player=player, action='IN')
-            message = 'Successfully checked in'
-        elif player.check_in_count == 1:
-            # Second scan - Check Out
-            player.check_in()
-            CheckInLog.objects.create(player=player, action='OUT')
-            message = 'Successfully checked out'
-        else:
-            return Response(
-                {'error': 'Maximum check-ins reached for today'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        # Check in/out (atomic; first scan checks in, second checks out)
+        try:
+            action = check_in_player(player)
+        except CheckInError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        message = 'Successfully checked in' if action == 'IN' else 'Successfully checked out'
         
         return Response({
             'message': message,
@@ -1087,20 +1143,15 @@ class PlayerViewSet(viewsets.ModelViewSet):
     def toggle_status(self, request, pk=None):
         """Toggle check-in/check-out for a specific player id (admin/coach tool)"""
         player = self.get_object()
-        today = timezone.now().date()
+        today = timezone.localdate()
         if str(player.booking.slot.date) != str(today):
             return Response({'error': 'Can only toggle on the booking date'}, status=status.HTTP_400_BAD_REQUEST)
         # Use same logic as scanning
-        if player.check_in_count == 0:
-            player.check_in()
-            CheckInLog.objects.create(player=player, action='IN')
-            message = 'Successfully checked in'
-        elif player.check_in_count == 1:
-            player.check_in()
-            CheckInLog.objects.create(player=player, action='OUT')
-            message = 'Successfully checked out'
-        else:
-            return Response({'error': 'Maximum check-ins reached for today'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            action = check_in_player(player)
+        except CheckInError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        message = 'Successfully checked in' if action == 'IN' else 'Successfully checked out'
         return Response({'message': message, 'status': player.get_status()})
 
     @action(detail=False, methods=['get'])
@@ -1118,17 +1169,21 @@ class PlayerViewSet(viewsets.ModelViewSet):
 
 
 
-@api_view(['GET'])
-@permission_classes([IsAuthenticated])
-def dashboard_stats(request):
-    """Get dashboard statistics (Admin only)"""
-    if not request.user.is_staff:
-        return Response(
-            {'error': 'Admin access required'},
-            status=status.HTTP_403_FORBIDDEN
-        )
+def compute_dashboard_stats():
+    """Dashboard statistics from the DailySportStats rollup (one small aggregate query)"""
+    today = timezone.localdate()
+    upcoming = Q(date__gte=today)
     
-    today = timezone.now().date()
+    totals = DailySportStats.objects.aggregate(
+        total_bookings=Sum('bookings'),
+        active_bookings=Sum('bookings', filter=upcoming),
+        total_revenue=Sum('revenue'),
+        total_players=Sum('players'),
+        checked_in_today=Sum('check_ins', filter=Q(date=today)),
+        available_slots=Sum('free_slots', filter=upcoming),
+        slots_count=Sum('slots', filter=upcoming),
+    )
+    totals = {key: value or 0 for key, value in totals.items()}
     
     logs = CheckInLog.objects.select_related('player').order_by('-timestamp')[:20]
     log_data = [
@@ -1136,27 +1191,562 @@ def dashboard_stats(request):
             'player': log.player.name,
             'action': log.action,
             'timestamp': log.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-            'booking_id': log.player.booking.id if log.player.booking else None,
+            'booking_id': log.player.booking_id,
         }
         for log in logs
     ]
-    stats = {
-        'total_bookings': Booking.objects.filter(payment_verified=True, is_cancelled=False).count(),
-        'active_bookings': Booking.objects.filter(payment_verified=True, is_cancelled=False, slot__date__gte=today).count(),
-        'total_revenue': sum([
-            float(b.amount_paid) for b in Booking.objects.filter(payment_verified=True, is_cancelled=False) if b.amount_paid
-        ]),
-        'total_players': Player.objects.filter(booking__payment_verified=True, booking__is_cancelled=False).count(),
-        'checked_in_today': Player.objects.filter(last_check_in__date=today, booking__payment_verified=True, booking__is_cancelled=False).count(),
-        'available_slots': TimeSlot.objects.filter(is_booked=False, admin_disabled=False, date__gte=today).count(),
+    return {
+        'total_bookings': totals['total_bookings'],
+        'active_bookings': totals['active_bookings'],
+        # Exact decimal, rendered as a string like DRF's DecimalField
+        'total_revenue': str(Decimal(totals['total_revenue']).quantize(Decimal('0.01'))),
+        'total_players': totals['total_players'],
+        'checked_in_today': totals['checked_in_today'],
+        'available_slots': totals['available_slots'],
         'sports_count': Sport.objects.filter(is_active=True).count(),
-        'slots_count': TimeSlot.objects.filter(date__gte=today).count(),
+        'slots_count': totals['slots_count'],
         'recent_logs': log_data,
     }
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def dashboard_stats(request):
+    """Get dashboard statistics (Admin only)"""
+    if not request.user.is_staff:
+        return Response(
+            {'error': 'Admin access required'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    
+    stats = cache.get(DASHBOARD_STATS_CACHE_KEY)
+    if stats is None:
+        stats = compute_dashboard_stats()
+        cache.set(DASHBOARD_STATS_CACHE_KEY, stats, settings.DASHBOARD_STATS_CACHE_SECONDS)
     
     return Response(stats)
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def scan(request):
+    """Unified QR scan endpoint for player, organizer and user tokens
+    POST /api/scan/
+    Body: {"token": "<QR token>", "device_id": "<optional gate device>"}
+
+    The token type is detected from its salt or compact version prefix, the
+    signature is verified once and the target is fetched with a single joined
+    query before the atomic check-in transition.
+    """
+    token = request.data.get('token')
+    if not token:
+        return Response({'error': 'QR token required'}, status=status.HTTP_400_BAD_REQUEST)
+    device = str(request.data.get('device_id') or '')[:255]
+
+    try:
+        kind, data = identify_qr_token(token)
+    except signing.BadSignature:
+        return Response({'error': 'Invalid or tampered QR token'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        target = scan_target(kind, data)
+        if kind == KIND_PLAYER:
+            player, slot = target, target.booking.slot
+            action = check_in_player(player, device=device)
+            result = {
+                'type': 'player', 'id': player.id, 'name': player.name,
+                'booking_id': player.booking_id, 'sport': slot.sport.name,
+                'check_in_count': player.check_in_count,
+            }
+        elif kind == KIND_ORGANIZER:
+            booking = target
+            action = check_in_organizer(booking, device=device)
+            result = {
+                'type': 'organizer', 'id': booking.user_id,
+                'name': booking.user.get_full_name() or booking.user.email,
+                'booking_id': booking.id, 'sport': booking.slot.sport.name,
+                'check_in_count': booking.organizer_check_in_count,
+            }
+        else:
+            user = target
+            action = check_in_user(user, device=device)
+            result = {
+                'type': 'user', 'id': user.id, 'name': user.get_full_name() or user.email,
+                'booking_id': None, 'sport': None,
+                'check_in_count': user.check_in_count,
+            }
+    except (Player.DoesNotExist, Booking.DoesNotExist, User.DoesNotExist):
+        return Response({'error': 'Invalid QR code - not found'}, status=status.HTTP_404_NOT_FOUND)
+    except CheckInError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    result['action'] = action
+    return Response(result)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def gate_roster(request):
+    """Export a signed roster of today's valid QR tokens (as digests) per sport for offline scanning (Admin only)
+    GET /api/scan/roster/?date=YYYY-MM-DD&sport=<id>
+
+    Signed with Ed25519 (core.roster_signing); devices verify it with the key from /api/scan/roster/key/.
+    """
+    if not request.user.is_staff:
+        return Response(
+            {'error': 'Admin access required'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+
+    day = timezone.localdate()
+    date_str = request.query_params.get('date')
+    if date_str:
+        try:
+            day = datetime.strptime(date_str, '%Y-%m-%d').date()
+        except ValueError:
+            return Response({'error': 'Invalid date format, expected YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+    sport_id = request.query_params.get('sport')
+
+    bookings = Booking.objects.filter(
+        slot__date=day, payment_verified=True, is_cancelled=False
+    ).select_related('slot__sport', 'user')
+    players = Player.objects.filter(
+        booking__slot__date=day, booking__payment_verified=True, booking__is_cancelled=False,
+        qr_token__isnull=False,
+    ).exclude(qr_token='').select_related('booking__slot__sport')
+    if sport_id:
+        bookings = bookings.filter(slot__sport_id=sport_id)
+        players = players.filter(booking__slot__sport_id=sport_id)
+
+    sports = {}
+
+    def sport_entry(sport):
+        return sports.setdefault(sport.id, {'id': sport.id, 'name': sport.name, 'players': [], 'organizers': []})
+
+    for booking in bookings:
+        if booking.organizer_qr_token:
+            sport_entry(booking.slot.sport)['organizers'].append({
+                'digest': token_digest(booking.organizer_qr_token),
+                'booking_id': booking.id,
+                'name': booking.user.get_full_name() or booking.user.email,
+                'check_in_count': booking.organizer_check_in_count,
+            })
+    for player in players:
+        sport_entry(player.booking.slot.sport)['players'].append({
+            'digest': token_digest(player.qr_token),
+            'player_id': player.id,
+            'booking_id': player.booking_id,
+            'name': player.name,
+            'check_in_count': player.check_in_count,
+        })
+
+    return Response(roster_signing.sign_roster({
+        'date': str(day),
+        'generated_at': timezone.now().isoformat(),
+        'sports': list(sports.values()),
+    }))
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def gate_roster_key(request):
+    """Public key gate devices verify roster signatures with (Admin only)
+    GET /api/scan/roster/key/
+    """
+    if not request.user.is_staff:
+        return Response(
+            {'error': 'Admin access required'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    public_key = roster_signing.public_key()
+    return Response({'algorithm': 'Ed25519', 'public_key': public_key, 'key_id': roster_signing.key_id(public_key)})
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def sync_offline_scans(request):
+    """Apply scans queued on a gate device while offline (Admin only)
+    POST /api/scan/sync/
+    Body: {"device_id": "gate-1", "scans": [{"scan_id": "...", "token": "...", "scanned_at": "<ISO 8601>"}, ...]}
+
+    Idempotent per (device_id, scan_id): re-sent scans return their stored result.
+    """
+    from dateutil import parser
+
+    if not request.user.is_staff:
+        return Response(
+            {'error': 'Admin access required'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+
+    device_id = str(request.data.get('device_id') or '').strip()
+    scans = request.data.get('scans')
+    if not device_id or not isinstance(scans, list) or not scans:
+        return Response({'error': 'device_id and scans[] are required'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(scans) > 1000:
+        return Response({'error': 'At most 1000 scans per sync'}, status=status.HTTP_400_BAD_REQUEST)
+
+    queued = []
+    for entry in scans:
+        entry = entry or {}
+        try:
+            scanned_at = parser.isoparse(entry['scanned_at'])
+        except (KeyError, TypeError, ValueError):
+            return Response({'error': 'Each scan needs scan_id, token and an ISO scanned_at'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if timezone.is_naive(scanned_at):
+            scanned_at = timezone.make_aware(scanned_at)
+        if not entry.get('scan_id') or not entry.get('token'):
+            return Response({'error': 'Each scan needs scan_id, token and an ISO scanned_at'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        queued.append((str(entry['scan_id']), entry['token'], scanned_at))
+
+    for attempt in range(2):
+        try:
+            records, results = _apply_offline_scans(device_id, queued)
+            break
+        except IntegrityError:
+            # A concurrent resend of the same scans committed first and this batch was
+            # rolled back; on the retry those scans come back as duplicates
+            if attempt:
+                raise
+
+    return Response({
+        'device_id': device_id,
+        'applied': sum(1 for r in records if r.status == 'applied'),
+        'rejected': sum(1 for r in records if r.status == 'rejected'),
+        'duplicates': len(queued) - len(records),
+        'results': [results[q[0]] for q in queued],
+    })
+
+
+def _apply_offline_scans(device_id, queued):
+    """Apply (scan_id, token, scanned_at) scans not yet stored for the device.
+
+    Returns (new OfflineScan records, results by scan_id). Raises IntegrityError
+    if another request stored one of the scans meanwhile (nothing is applied).
+    """
+    kind_names = {KIND_PLAYER: 'player', KIND_ORGANIZER: 'organizer', KIND_USER: 'user'}
+    check_ins = {KIND_PLAYER: check_in_player, KIND_ORGANIZER: check_in_organizer, KIND_USER: check_in_user}
+    results = {}
+    # One bulk insert for the attendance events of the whole batch
+    with transaction.atomic(), events.buffered():
+        existing = OfflineScan.objects.filter(device_id=device_id, scan_id__in=[q[0] for q in queued])
+        for record in existing:
+            results[record.scan_id] = {
+                'scan_id': record.scan_id, 'status': record.status, 'action': record.action,
+                'error': record.error, 'duplicate': True,
+            }
+
+        records = []
+        # Apply in device order so IN always precedes OUT
+        for scan_id, token, scanned_at in sorted(queued, key=lambda q: q[2]):
+            if scan_id in results:
+                continue
+            record = OfflineScan(device_id=device_id, scan_id=scan_id, scanned_at=scanned_at, status='applied')
+            try:
+                kind, data = identify_qr_token(token)
+                record.kind = kind_names[kind]
+                target = scan_target(kind, data)
+                record.subject_id = target.id
+                record.action = check_ins[kind](target, at=scanned_at, device=device_id)
+            except signing.BadSignature:
+                record.status, record.error = 'rejected', 'Invalid QR token'
+            except (Player.DoesNotExist, Booking.DoesNotExist, User.DoesNotExist):
+                record.status, record.error = 'rejected', 'QR code target not found'
+            except CheckInError as e:
+                record.status, record.error = 'rejected', str(e)
+            records.append(record)
+            results[scan_id] = {
+                'scan_id': scan_id, 'status': record.status, 'action': record.action,
+                'error': record.error, 'duplicate': False,
+            }
+        OfflineScan.objects.bulk_create(records)
+    return records, results
+
+
+class ReportParamError(Exception):
+    """Invalid report query parameter"""
+
+
+def _report_window(request, default_days=30):
+    """Parse ?start=&end=&sport= into (start, end, sport_id); raises ReportParamError"""
+    today = timezone.localdate()
+    try:
+        end = datetime.strptime(request.query_params['end'], '%Y-%m-%d').date() if request.query_params.get('end') else today
+        start = (datetime.strptime(request.query_params['start'], '%Y-%m-%d').date()
+                 if request.query_params.get('start') else end - timedelta(days=default_days - 1))
+    except ValueError:
+        raise ReportParamError('Invalid date format, expected YYYY-MM-DD')
+    if start > end:
+        raise ReportParamError('start must be on or before end')
+    sport_id = request.query_params.get('sport') or None
+    if sport_id and not str(sport_id).isdigit():
+        raise ReportParamError('sport must be a sport id')
+    return start, end, sport_id
+
+
+def _report_response(request, name, build):
+    """Parse ?start=&end=&period=&sport= and return a cached report (Admin only)"""
+    if not request.user.is_staff:
+        return Response(
+            {'error': 'Admin access required'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    try:
+        start, end, sport_id = _report_window(request)
+    except ReportParamError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    period = request.query_params.get('period', 'day')
+    if period not in REPORT_PERIODS:
+        return Response({'error': f'period must be one of {", ".join(REPORT_PERIODS)}'},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    cache_key = f'report:{name}:{start}:{end}:{period}:{sport_id or "all"}'
+    report = cache.get(cache_key)
+    if report is None:
+        report = {'start': str(start), 'end': str(end), 'period': period, 'sport': sport_id,
+                  **build(start, end, period, sport_id)}
+        cache.set(cache_key, report, settings.REPORTS_CACHE_SECONDS)
+    return Response(report)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def revenue_report_view(request):
+    """Revenue per sport grouped by day, week or month (Admin only)
+    GET /api/reports/revenue/?start=YYYY-MM-DD&end=YYYY-MM-DD&period=day|week|month&sport=<id>
+    """
+    return _report_response(request, 'revenue', revenue_report)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def utilization_report_view(request):
+    """Slot utilization per sport grouped by day, week or month (Admin only)
+    GET /api/reports/utilization/?start=YYYY-MM-DD&end=YYYY-MM-DD&period=day|week|month&sport=<id>
+    """
+    return _report_response(request, 'utilization', utilization_report)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def occupancy_heatmap_view(request):
+    """Booked vs offered slots per sport by weekday x hour (Admin only)
+    GET /api/reports/occupancy/?start=YYYY-MM-DD&end=YYYY-MM-DD&sport=<id>
+
+    Cached until a slot or booking changes (occupancy version key).
+    """
+    if not request.user.is_staff:
+        return Response(
+            {'error': 'Admin access required'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    try:
+        start, end, sport_id = _report_window(request, default_days=90)
+    except ReportParamError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    version = cache.get(OCCUPANCY_VERSION_KEY, 0)
+    cache_key = f'report:occupancy:{version}:{start}:{end}:{sport_id or "all"}'
+    report = cache.get(cache_key)
+    if report is None:
+        report = {'start': str(start), 'end': str(end), 'sport': sport_id,
+                  **occupancy_heatmap(start, end, sport_id)}
+        cache.set(cache_key, report, settings.REPORTS_CACHE_SECONDS * 12)
+    return Response(report)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_csv(request, name):
+    """Stream an export as CSV (Admin only)
+    GET /api/exports/<bookings|players|attendance|check-ins|organizer-check-ins|user-check-ins>/
+        ?start=YYYY-MM-DD&end=YYYY-MM-DD&sport=<id>
+
+    Bookings and players filter on the slot date, logs on the (local) scan date.
+    """
+    if not request.user.is_staff:
+        return Response(
+            {'error': 'Admin access required'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    if name not in EXPORTS:
+        return Response({'error': f'Unknown export, expected one of {", ".join(EXPORTS)}'},
+                        status=status.HTTP_404_NOT_FOUND)
+    try:
+        start, end, sport_id = _report_window(request)
+    except ReportParamError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    if sport_id and not EXPORTS[name]['sport_field']:
+        return Response({'error': f'{name} cannot be filtered by sport'},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    queryset = export_queryset(name, start, end, sport_id)
+    response = StreamingHttpResponse(astream_csv(name, queryset), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{name}_{start}_{end}.csv"'
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def archived_checkin_logs(request):
+    """Query check-in logs moved out of the hot tables (Admin only)
+    GET /api/checkin-logs/archive/?kind=player|organizer|user&start=YYYY-MM-DD&end=YYYY-MM-DD
+        &player=<id>&booking=<id>&user=<id>&page=<n>
+    """
+    if not request.user.is_staff:
+        return Response(
+            {'error': 'Admin access required'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    kind = request.query_params.get('kind')
+    if kind and kind not in ARCHIVE_KINDS:
+        return Response({'error': f'kind must be one of {", ".join(ARCHIVE_KINDS)}'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    try:
+        start, end, _ = _report_window(request, default_days=365)
+    except ReportParamError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    ids = {}
+    for param in ('player', 'booking', 'user'):
+        value = request.query_params.get(param)
+        if value and not value.isdigit():
+            return Response({'error': f'{param} must be an id'}, status=status.HTTP_400_BAD_REQUEST)
+        ids[f'{param}_id'] = value
+
+    tz = timezone.get_current_timezone()
+    queryset = archived_logs(
+        kind,
+        timezone.make_aware(datetime.combine(start, datetime.min.time()), tz),
+        timezone.make_aware(datetime.combine(end + timedelta(days=1), datetime.min.time()), tz),
+        **ids,
+    )
+    paginator = PageNumberPagination()
+    page = paginator.paginate_queryset(queryset, request)
+    return paginator.get_paginated_response(ArchivedCheckInLogSerializer(page, many=True).data)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def live_attendance(request):
+    """Players and organizers currently checked in, per sport, today (Admin only)"""
+    if not request.user.is_staff:
+        return Response(
+            {'error': 'Admin access required'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    return Response(attendance.snapshot(timezone.localdate()))
+
+
+async def live_attendance_stream(request):
+    """Server-Sent Events stream of live attendance counters (Admin only)
+    GET /api/attendance/live/stream/  (Authorization: Bearer <access token>)
+
+    Sends an `attendance` event with the live_attendance payload whenever the
+    counters change, a keep-alive comment while idle, and closes after
+    ATTENDANCE_STREAM_SECONDS so clients reconnect (EventSource does this
+    automatically). Needs the ASGI server (redball_academy.asgi).
+    """
+    try:
+        auth = await sync_to_async(JWTAuthentication().authenticate)(request)
+    except (InvalidToken, AuthenticationFailed):
+        auth = None
+    if not auth or not auth[0].is_staff:
+        return JsonResponse({'error': 'Admin access required'}, status=status.HTTP_403_FORBIDDEN)
+
+    async def stream():
+        yield 'retry: 3000\n\n'
+        last_version = None
+        idle = 0
+        for _ in range(settings.ATTENDANCE_STREAM_SECONDS):
+            day = timezone.localdate()
+            version = await sync_to_async(attendance.current_version)(day)
+            if (day, version) != last_version:
+                data = await sync_to_async(attendance.snapshot)(day)
+                last_version = (day, data['version'])
+                yield f"event: attendance\nid: {day}:{data['version']}\ndata: {json.dumps(data)}\n\n"
+                idle = 0
+            elif idle >= 15:
+                yield ': keep-alive\n\n'
+                idle = 0
+            await asyncio.sleep(1)
+            idle += 1
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def task_dispatch_metrics(request):
+    """Celery breaker state, broker queue depth and fallback counters (Admin only)
+    GET /api/ops/task-dispatch/
+
+    Counters are per web process, so behind several workers each response
+    reflects only the process that served it.
+    """
+    if not request.user.is_staff:
+        return Response(
+            {'error': 'Admin access required'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    return Response(dispatch.metrics())
+
+
+SYNC_SERIALIZERS = {
+    'sports': SportSerializer,
+    'slots': SyncTimeSlotSerializer,
+    'bookings': SyncBookingSerializer,
+    'players': PlayerSerializer,
+}
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def sync_changes(request):
+    """Sports, slots, bookings and players changed or deleted since a cursor
+    GET /api/sync/?since=<cursor>&limit=<rows per page>
+
+    Without `since` everything visible is returned. Each kind comes back as
+    {'upserted': [...], 'deleted': [ids]}; pass the returned `cursor` on the
+    next call. has_more=true means call again right away with that cursor for
+    the next page. reset=true means the cursor was too old: replace local data.
+    """
+    limit = request.query_params.get('limit') or settings.SYNC_PAGE_SIZE
+    if not str(limit).isdigit() or not 0 < int(limit) <= settings.SYNC_PAGE_SIZE:
+        return Response({'error': f'limit must be between 1 and {settings.SYNC_PAGE_SIZE}'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    try:
+        since, resume = (sync.parse_cursor(request.query_params['since'])
+                         if request.query_params.get('since') else (None, None))
+    except sync.CursorError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    until, position = resume or (timezone.now(), (0, 0))
+
+    upserted, deleted, reset = sync.changes(request.user, since)
+    if reset:
+        since = None
+    if resume:
+        deleted = {kind: [] for kind in sync.KINDS}  # sent with the first page
+    rows, next_position = sync.page(upserted, position, int(limit))
+    data = {
+        'cursor': (sync.make_continuation(since, until, next_position) if next_position
+                   else sync.make_cursor(until)),
+        'has_more': next_position is not None,
+        'reset': reset,
+    }
+    for kind, serializer_class in SYNC_SERIALIZERS.items():
+        data[kind] = {
+            'upserted': serializer_class(rows[kind], many=True, context={'request': request}).data,
+            'deleted': deleted[kind],
+        }
+    return Response(data)
+
+
 class UserViewSet(viewsets.ViewSet):
     """ViewSet for User QR code and check-in operations"""
     permission_classes = [IsAuthenticated]
@@ -1171,7 +1761,6 @@ class UserViewSet(viewsets.ViewSet):
     def scan_qr(self, request):
         """Scan user QR code for check-in/out"""
         from django.core import signing
-        from .models import UserCheckInLog
         
         token = request.data.get('token')
         if not token:
@@ -1179,7 +1768,7 @@ class UserViewSet(viewsets.ViewSet):
         
         try:
             # Decode token
-            data = signing.loads(token, salt='user-qr-token')
+            data = load_qr_token(token, salt='user-qr-token')
             user_id = data.get('user_id')
             
             # Get user
@@ -1187,29 +1776,15 @@ class UserViewSet(viewsets.ViewSet):
             User = get_user_model()
             user = User.objects.get(id=user_id)
             
-            # Toggle check-in status
-            if user.check_in_count == 0 or user.check_in_count == 2:
-                # Check in
-                user.check_in_count = 1
-                user.is_in = True
-                action = 'IN'
+            # Toggle check-in status (atomic, logged in the same transaction)
+            try:
+                action = check_in_user(user)
+            except CheckInError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            if action == 'IN':
                 message = f'{user.email} checked in successfully'
-            elif user.check_in_count == 1:
-                # Check out
-                user.check_in_count = 2
-                user.is_in = False
-                action = 'OUT'
-                message = f'{user.email} checked out successfully'
             else:
-                return Response(
-                    {'error': 'Invalid check-in state'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            user.save()
-            
-            # Create log entry
-            UserCheckInLog.objects.create(user=user, action=action)
+                message = f'{user.email} checked out successfully'
             
             return Response({
                 'message': message,
@@ -1230,10 +1805,12 @@ class UserViewSet(viewsets.ViewSet):
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-class BookingConfigurationViewSet(viewsets.ModelViewSet):
+class BookingConfigurationViewSet(ConditionalGetMixin, CachedReferenceListMixin, viewsets.ModelViewSet):
     """ViewSet for BookingConfiguration"""
     queryset = BookingConfiguration.objects.all().order_by('id')
     serializer_class = BookingConfigurationSerializer
+    authentication_classes = CLAIMS_AUTHENTICATION_CLASSES
+    conditional_fields = ('updated_at', 'sport__updated_at')
     
     def get_permissions(self):
         """Authenticated users can manage, anyone can view"""
@@ -1309,10 +1886,12 @@ class BookingConfigurationViewSet(viewsets.ModelViewSet):
         return queryset
 
 
-class BreakTimeViewSet(viewsets.ModelViewSet):
+class BreakTimeViewSet(ConditionalGetMixin, CachedReferenceListMixin, viewsets.ModelViewSet):
     """ViewSet for BreakTime"""
     queryset = BreakTime.objects.all()
     serializer_class = BreakTimeSerializer
+    authentication_classes = CLAIMS_AUTHENTICATION_CLASSES
+    conditional_fields = ('updated_at', 'sport__updated_at')
     
     def get_permissions(self):
         """Authenticated users can manage, anyone can view"""
@@ -1329,10 +1908,12 @@ class BreakTimeViewSet(viewsets.ModelViewSet):
         return queryset
 
 
-class BlackoutDateViewSet(viewsets.ModelViewSet):
+class BlackoutDateViewSet(ConditionalGetMixin, CachedReferenceListMixin, viewsets.ModelViewSet):
     """ViewSet for BlackoutDate - date-based unavailability"""
     queryset = BlackoutDate.objects.all()
     serializer_class = BlackoutDateSerializer
+    authentication_classes = CLAIMS_AUTHENTICATION_CLASSES
+    conditional_fields = ('updated_at', 'sport__updated_at')
     
     def get_permissions(self):
         """Admin can create/update/delete, anyone can view"""
@@ -1403,39 +1984,56 @@ class BlackoutDateViewSet(viewsets.ModelViewSet):
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def create_razorpay_order(request):
-    """Create a Razorpay order and return order details"""
+    """Create (or reuse) the Razorpay order for a booking and return order details
+    POST /api/payment/create-order/ {"booking_id": <id>}   Idempotency-Key: <client key> (optional)
+
+    The amount is the slot price; an `amount` sent by older clients is ignored.
+    A booking keeps one open order per price, and a retried request with the
+    same Idempotency-Key replays the first response without touching the
+    database or the gateway.
+    """
+    serializer = PaymentOrderSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=400)
+    booking_id = serializer.validated_data['booking_id']
+
+    idempotency_key = request.headers.get('Idempotency-Key', '').strip()[:255]
+    cache_key = None
+    if idempotency_key:
+        digest = hashlib.sha256(idempotency_key.encode()).hexdigest()
+        cache_key = f'idempotency:create-order:{request.user.pk}:{digest}'
+        cached = cache.get(cache_key)
+        if cached is not None:
+            if cached['booking_id'] != booking_id:
+                return Response({'error': 'Idempotency-Key was already used for another booking'},
+                                status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            return Response(cached, headers={'Idempotent-Replayed': 'true'})
+
+    owner_id = Booking.objects.filter(pk=booking_id).values_list('user_id', flat=True).first()
+    if owner_id is None:
+        return Response({'error': 'Booking not found'}, status=404)
+    if owner_id != request.user.pk and not request.user.is_staff:
+        return Response({'error': 'You do not have permission to pay for this booking'},
+                        status=status.HTTP_403_FORBIDDEN)
+
     try:
-        serializer = PaymentOrderSerializer(data=request.data)
-        if not serializer.is_valid():
-            return Response(serializer.errors, status=400)
-        
-        amount = int(float(serializer.validated_data['amount']) * 100)  # Razorpay expects paise
-        booking_id = serializer.validated_data['booking_id']
-        
-        # Check if Razorpay keys are set
-        if not settings.RAZORPAY_KEY_ID or not settings.RAZORPAY_KEY_SECRET:
-            return Response({'error': 'Razorpay credentials not configured'}, status=500)
-        
-        client = razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
-        order_data = {
-            'amount': amount,
-            'currency': 'INR',
-            'payment_capture': 1,
-            'notes': {'booking_id': str(booking_id)}
-        }
-        order = client.order.create(data=order_data)
-        return Response({
-            'order_id': order['id'],
-            'razorpay_key': settings.RAZORPAY_KEY_ID,
-            'amount': amount,
-            'currency': 'INR',
-            'booking_id': booking_id
-        })
-    except Exception as e:
-        print(f"Payment order creation error: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return Response({'error': str(e)}, status=500)
+        booking, reused = payments.order_for_booking(booking_id)
+    except payments.OrderError as e:
+        return Response({'error': str(e)}, status=400)
+    except payments.GatewayError as e:
+        return Response({'error': str(e)}, status=502)
+
+    data = {
+        'order_id': booking.order_id,
+        'razorpay_key': settings.RAZORPAY_KEY_ID,
+        'amount': payments.to_paise(booking.order_amount),
+        'currency': 'INR',
+        'booking_id': booking_id,
+        'reused': reused,
+    }
+    if cache_key:
+        cache.set(cache_key, data, settings.IDEMPOTENCY_KEY_TTL)
+    return Response(data)
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
@@ -1447,23 +2045,49 @@ def verify_razorpay_payment(request):
         payment_id = serializer.validated_data['razorpay_payment_id']
         signature = serializer.validated_data['razorpay_signature']
         booking_id = serializer.validated_data['booking_id']
-        client = razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
-        try:
-            client.utility.verify_payment_signature({
-                'razorpay_order_id': order_id,
-                'razorpay_payment_id': payment_id,
-                'razorpay_signature': signature
-            })
-        except razorpay.errors.SignatureVerificationError:
+        if not payments.verify_payment_signature(order_id, payment_id, signature):
             return Response({'error': 'Payment verification failed'}, status=400)
-        # Mark booking as paid (update your Booking model as needed)
-        from .models import Booking
-        try:
-            booking = Booking.objects.get(id=booking_id)
+        with transaction.atomic():
+            # Locked like webhooks.apply_event does, so a webhook for the same payment
+            # waits for this request (or this one for it) and only one marks it paid
+            booking = Booking.objects.select_for_update(of=('self',)).select_related('slot').filter(
+                id=booking_id).first()
+            if booking is None:
+                return Response({'error': 'Booking not found'}, status=404)
+            # The order must be the one create_razorpay_order stored on this booking;
+            # a booking without one has nothing to match a payment against
+            if not booking.order_id or booking.order_id != order_id:
+                return Response({'error': 'Payment is for a different order'}, status=400)
+            if Booking.objects.filter(Q(order_id=order_id) | Q(payment_id=payment_id)).exclude(pk=booking.pk).exists():
+                return Response({'error': 'Payment already belongs to another booking'}, status=400)
+            if booking.payment_verified:
+                return Response({'message': 'Payment already verified'})
             booking.payment_verified = True
+            booking.payment_id = payment_id
             booking.save()
-        except Booking.DoesNotExist:
-            return Response({'error': 'Booking not found'}, status=404)
         return Response({'message': 'Payment verified and booking updated'})
     return Response(serializer.errors, status=400)
 
+
+
+@csrf_exempt
+def razorpay_webhook(request):
+    """Razorpay webhook receiver
+    POST /api/payment/webhook/  (X-Razorpay-Signature, X-Razorpay-Event-Id)
+
+    Verifies the signature, stores the event in the PaymentWebhookEvent inbox
+    and answers 200 straight away; the event is applied after commit by the
+    process_payment_webhooks task (see core.webhooks).
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    body = request.body
+    if not payments.verify_webhook_signature(body, request.headers.get('X-Razorpay-Signature')):
+        return JsonResponse({'error': 'Invalid signature'}, status=400)
+    try:
+        event, created = webhooks.ingest(body, request.headers.get('X-Razorpay-Event-Id'))
+    except ValueError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    if created:
+        dispatch.dispatch_batch(process_payment_webhooks, event.pk)
+    return JsonResponse({'status': 'received' if created else 'duplicate'})
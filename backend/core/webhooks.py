@@ -0,0 +1,99 @@
+"""
+Razorpay webhook inbox
+
+The webhook view only checks the signature and stores the delivery as a
+PaymentWebhookEvent (ingest()); applying it happens after the response, in
+the process_payment_webhooks task, with the process_payment_webhooks command
+(cron) as backstop. Applying is idempotent: events are claimed with
+SELECT ... FOR UPDATE SKIP LOCKED, redeliveries share one row, and a booking
+that is already paid is left alone, so the webhook and the client-side
+/api/payment/verify/ call can both arrive in any order.
+"""
+import hashlib
+import json
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import Booking, PaymentWebhookEvent
+from .payments import to_paise
+
+PAYMENT_EVENTS = ('payment.captured', 'order.paid')
+
+
+class WebhookError(Exception):
+    """Raised when an event cannot be applied (kept for retry)"""
+
+
+def ingest(body, event_id=None):
+    """Store a verified webhook body. Returns (event, created)."""
+    payload = json.loads(body)
+    event_id = event_id or hashlib.sha256(body).hexdigest()
+    try:
+        with transaction.atomic():
+            event = PaymentWebhookEvent.objects.create(
+                event_id=event_id[:100], event=str(payload.get('event', ''))[:100], payload=payload,
+            )
+    except IntegrityError:
+        return PaymentWebhookEvent.objects.get(event_id=event_id[:100]), False
+    return event, True
+
+
+def _entity(payload, name):
+    return ((payload.get('payload') or {}).get(name) or {}).get('entity') or {}
+
+
+def apply_event(event):
+    """Apply one event. Returns the new status ('processed' or 'ignored')."""
+    if event.event not in PAYMENT_EVENTS:
+        return 'ignored'
+    payment = _entity(event.payload, 'payment')
+    order = _entity(event.payload, 'order')
+    order_id = payment.get('order_id') or order.get('id')
+    if not order_id or payment.get('status', 'captured') != 'captured':
+        return 'ignored'
+
+    booking = Booking.objects.select_for_update(of=('self',)).select_related('slot').filter(order_id=order_id).first()
+    if booking is None:
+        booking_id = (order.get('notes') or {}).get('booking_id')
+        if not str(booking_id or '').isdigit():
+            raise WebhookError(f'No booking for order {order_id}')
+        booking = Booking.objects.select_for_update(of=('self',)).select_related('slot').filter(pk=booking_id).first()
+        if booking is None or (booking.order_id and booking.order_id != order_id):
+            raise WebhookError(f'No booking for order {order_id}')
+    if booking.payment_verified:
+        return 'processed'
+
+    amount = payment.get('amount', order.get('amount_paid'))
+    if booking.order_amount is not None and amount is not None and int(amount) != to_paise(booking.order_amount):
+        raise WebhookError(f'Paid {amount} paise for order {order_id}, expected {to_paise(booking.order_amount)}')
+    booking.payment_verified = True
+    booking.order_id = order_id
+    booking.payment_id = payment.get('id') or booking.payment_id
+    booking.save()
+    return 'processed'
+
+
+def process_events(ids=None, batch_size=100, max_attempts=5):
+    """Apply pending events (only those in `ids`, if given). Returns (processed, failed)."""
+    processed = failed = 0
+    with transaction.atomic():
+        pending = PaymentWebhookEvent.objects.select_for_update(skip_locked=True).filter(status='pending')
+        if ids is not None:
+            pending = pending.filter(pk__in=ids)
+        for event in pending.order_by('received_at', 'id')[:batch_size]:
+            event.attempts += 1
+            try:
+                with transaction.atomic():
+                    event.status = apply_event(event)
+            except Exception as e:
+                event.last_error = str(e)[:2000]
+                if event.attempts >= max_attempts:
+                    event.status = 'failed'
+                failed += 1
+            else:
+                event.processed_at = timezone.now()
+                event.last_error = ''
+                processed += 1
+            event.save(update_fields=['status', 'attempts', 'last_error', 'processed_at'])
+    return processed, failed
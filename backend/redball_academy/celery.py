@@ -1,5 +1,7 @@
 import os
 from celery import Celery
+from celery.signals import worker_init
+from kombu import Queue
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'redball_academy.settings')
 
@@ -7,6 +9,50 @@ app = Celery('redball_academy')
 app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks()
 
+# Queues: credential/reset emails must never wait behind QR renders or report
+# rebuilds, so each kind of work has its own queue and its own worker:
+#   python -m celery -A redball_academy worker -Q email -n email@%h
+#   python -m celery -A redball_academy worker -Q qr -n qr@%h
+#   python -m celery -A redball_academy worker -Q reports -n reports@%h
+#   python -m celery -A redball_academy worker -Q celery -n default@%h
+# A worker started with a single -Q gets that queue's limits below (they take
+# precedence over -c and --prefetch-multiplier).
+QUEUES = ('email', 'qr', 'reports', 'celery')
+
+# queue -> (concurrency, prefetch multiplier)
+QUEUE_LIMITS = {
+    'email': (4, 4),     # short SMTP round trips, keep a few in flight
+    'qr': (2, 1),        # CPU-bound renders, one at a time per process
+    'reports': (1, 1),   # long aggregates, never hoard messages
+    'celery': (2, 4),
+}
+
+app.conf.update(
+    task_queues=[Queue(name) for name in QUEUES],
+    task_default_queue='celery',
+    task_routes={
+        'core.tasks.send_emails_batch': {'queue': 'email'},
+        'core.tasks.drain_email_outbox': {'queue': 'email'},
+        'core.tasks.send_player_credentials_email': {'queue': 'email'},
+        'core.tasks.render_qr_batch': {'queue': 'qr'},
+        'core.tasks.render_organizer_qr_batch': {'queue': 'qr'},
+        'core.tasks.rebuild_daily_stats_range': {'queue': 'reports'},
+    },
+    # Long tasks are acknowledged after they finish, so a prefetch of 1 really
+    # means one message per process
+    task_acks_late=True,
+)
+
+
+@worker_init.connect
+def apply_queue_limits(sender=None, **kwargs):
+    """Give a worker that consumes exactly one queue that queue's limits"""
+    queues = list(sender.app.amqp.queues.consume_from or ())
+    if len(queues) != 1 or queues[0] not in QUEUE_LIMITS:
+        return
+    sender.concurrency, sender.prefetch_multiplier = QUEUE_LIMITS[queues[0]]
+
+
 # This module should NOT be executed directly. Running it as a script will shadow
 # the third-party 'celery' package and cause circular import errors like:
 # "ImportError: cannot import name 'Celery' from partially initialized module 'celery' (.../redball_academy/celery.py)"
@@ -90,6 +90,45 @@ else:
         }
     }
 
+# Cache - Redis when REDIS_CACHE_URL is set (shared across gunicorn workers), else per-process memory
+if config('REDIS_CACHE_URL', default=None):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': config('REDIS_CACHE_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Seconds the admin dashboard stats are cached (invalidated on booking/payment changes)
+DASHBOARD_STATS_CACHE_SECONDS = config('DASHBOARD_STATS_CACHE_SECONDS', default=10, cast=int)
+# Failed logins allowed per client IP / per account within LOGIN_FAILURE_WINDOW seconds
+LOGIN_MAX_FAILURES_PER_IP = config('LOGIN_MAX_FAILURES_PER_IP', default=20, cast=int)
+LOGIN_MAX_FAILURES_PER_ACCOUNT = config('LOGIN_MAX_FAILURES_PER_ACCOUNT', default=5, cast=int)
+LOGIN_FAILURE_WINDOW = config('LOGIN_FAILURE_WINDOW', default=900, cast=int)
+# Days of check-in logs kept in the hot tables before archive_checkin_logs moves them
+CHECKIN_LOG_RETENTION_DAYS = config('CHECKIN_LOG_RETENTION_DAYS', default=90, cast=int)
+# Seconds an attendance SSE connection stays open before the client reconnects
+ATTENDANCE_STREAM_SECONDS = config('ATTENDANCE_STREAM_SECONDS', default=300, cast=int)
+# Seconds each revenue/utilization report parameter set is cached
+REPORTS_CACHE_SECONDS = config('REPORTS_CACHE_SECONDS', default=300, cast=int)
+# Seconds sports/booking config/break/blackout entries and their versions live. Changes
+# invalidate them at once only for workers sharing the cache, so without Redis this is
+# how long other workers may serve stale reference data (see core/refdata.py)
+REFDATA_CACHE_SECONDS = config('REFDATA_CACHE_SECONDS', cast=int,
+                               default=3600 if config('REDIS_CACHE_URL', default=None) else 10)
+# /api/sync/: seconds of changes re-sent before each cursor (covers in-flight transactions)
+SYNC_OVERLAP_SECONDS = config('SYNC_OVERLAP_SECONDS', default=30, cast=int)
+# Days deletions are remembered; older cursors get a full resync
+SYNC_TOMBSTONE_DAYS = config('SYNC_TOMBSTONE_DAYS', default=30, cast=int)
+# /api/sync/: most rows returned per page (and the largest ?limit= allowed)
+SYNC_PAGE_SIZE = config('SYNC_PAGE_SIZE', default=500, cast=int)
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -126,6 +165,9 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Covering (INCLUDE) indexes only exist on PostgreSQL; SQLite builds them as plain indexes
+SILENCED_SYSTEM_CHECKS = ['models.W040']
+
 # Custom User Model
 AUTH_USER_MODEL = 'core.CustomUser'
 
@@ -143,6 +185,7 @@ AUTH_USER_MODEL = 'core.CustomUser'
 # }
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
+        # Views serving low-risk reads opt in to core.authentication.ClaimsJWTAuthentication
         'rest_framework_simplejwt.authentication.JWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
         'rest_framework.authentication.BasicAuthentication',
@@ -190,6 +233,22 @@ CORS_ALLOW_HEADERS = [
 # Razorpay settings
 RAZORPAY_KEY_ID = config('RAZORPAY_KEY_ID', default='')
 RAZORPAY_KEY_SECRET = config('RAZORPAY_KEY_SECRET', default='')
+RAZORPAY_WEBHOOK_SECRET = config('RAZORPAY_WEBHOOK_SECRET', default='')
+RAZORPAY_BASE_URL = config('RAZORPAY_BASE_URL', default='https://api.razorpay.com')
+# (connect, read) seconds per gateway call; failed connects are retried
+RAZORPAY_TIMEOUT = (config('RAZORPAY_CONNECT_TIMEOUT', default=3.05, cast=float),
+                    config('RAZORPAY_READ_TIMEOUT', default=10.0, cast=float))
+RAZORPAY_MAX_RETRIES = config('RAZORPAY_MAX_RETRIES', default=2, cast=int)
+RAZORPAY_POOL_SIZE = config('RAZORPAY_POOL_SIZE', default=10, cast=int)
+# How long an Idempotency-Key on create-order replays its first response
+IDEMPOTENCY_KEY_TTL = config('IDEMPOTENCY_KEY_TTL', default=60 * 60 * 24, cast=int)
+
+# QR tokens - compact binary format (short, QR alphanumeric mode). Scan endpoints
+# accept both formats; set to False to keep issuing legacy signing.dumps tokens.
+QR_COMPACT_TOKENS = config('QR_COMPACT_TOKENS', default=True, cast=bool)
+# Gate rosters are signed with Ed25519 (core/roster_signing.py): base64 of a 32-byte
+# private key seed; derived from SECRET_KEY when unset
+GATE_ROSTER_SIGNING_KEY = config('GATE_ROSTER_SIGNING_KEY', default='')
 
 # Email settings - Gmail SMTP
 EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.smtp.EmailBackend')
@@ -199,9 +258,19 @@ EMAIL_USE_TLS = config('EMAIL_USE_TLS', default=True, cast=bool)
 EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')  # Your Gmail address
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')  # Your Gmail App Password
 DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='')  # Your Gmail address
+# Outbox retries: first retry after EMAIL_OUTBOX_RETRY_SECONDS, doubling up to the cap
+EMAIL_OUTBOX_RETRY_SECONDS = config('EMAIL_OUTBOX_RETRY_SECONDS', default=60, cast=int)
+EMAIL_OUTBOX_MAX_RETRY_SECONDS = config('EMAIL_OUTBOX_MAX_RETRY_SECONDS', default=3600, cast=int)
+EMAIL_OUTBOX_MAX_ATTEMPTS = config('EMAIL_OUTBOX_MAX_ATTEMPTS', default=8, cast=int)
 
 # Celery / Redis (optional but recommended for async emails)
 CELERY_BROKER_URL = config('CELERY_BROKER_URL', default='redis://localhost:6379/0')
 CELERY_RESULT_BACKEND = config('CELERY_RESULT_BACKEND', default='redis://localhost:6379/0')
 CELERY_TASK_ALWAYS_EAGER = config('CELERY_TASK_ALWAYS_EAGER', default=False, cast=bool)
+# Fail fast when the broker is unreachable; core.dispatch falls back to a local pool
+CELERY_BROKER_TRANSPORT_OPTIONS = {'socket_connect_timeout': 1, 'max_retries': 1, 'interval_start': 0}
+CELERY_BREAKER_FAILURES = config('CELERY_BREAKER_FAILURES', default=3, cast=int)
+CELERY_BREAKER_RESET_SECONDS = config('CELERY_BREAKER_RESET_SECONDS', default=30, cast=int)
+CELERY_FALLBACK_WORKERS = config('CELERY_FALLBACK_WORKERS', default=2, cast=int)
+CELERY_FALLBACK_MAX_PENDING = config('CELERY_FALLBACK_MAX_PENDING', default=100, cast=int)
 
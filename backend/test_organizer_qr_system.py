@@ -17,6 +17,7 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'redball_academy.settings')
 django.setup()
 
 from core.models import Booking, OrganizerCheckInLog, Player
+from core import events
 from django.contrib.auth import get_user_model
 from django.core import signing
 from datetime import date
@@ -117,11 +118,7 @@ def test_organizer_check_in_toggle():
         print(f"    - organizer_check_in_count: {booking.organizer_check_in_count} ✓")
         
         # Create log entry
-        OrganizerCheckInLog.objects.create(
-            booking=booking,
-            user=booking.user,
-            action='IN'
-        )
+        events.record('organizer', booking.id, 'IN', booking_id=booking.id)
         print(f"    - Log entry created: IN ✓")
     
     # Simulate second check-out
@@ -134,11 +131,7 @@ def test_organizer_check_in_toggle():
         print(f"    - organizer_check_in_count: {booking.organizer_check_in_count} ✓")
         
         # Create log entry
-        OrganizerCheckInLog.objects.create(
-            booking=booking,
-            user=booking.user,
-            action='OUT'
-        )
+        events.record('organizer', booking.id, 'OUT', booking_id=booking.id)
         print(f"    - Log entry created: OUT ✓")
     
     # Check logs
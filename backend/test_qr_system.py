@@ -153,7 +153,6 @@ print(f"\nSimulating first scan (CHECK IN)...")
 if test_player.can_check_in():
     test_player.check_in()
     test_player.save()
-    CheckInLog.objects.create(player=test_player, action='IN')
     test_player.refresh_from_db()
     
     print(f"✓ Check-in successful:")
@@ -168,7 +167,6 @@ print(f"\nSimulating second scan (CHECK OUT)...")
 if test_player.can_check_in():
     test_player.check_in()
     test_player.save()
-    CheckInLog.objects.create(player=test_player, action='OUT')
     test_player.refresh_from_db()
     
     print(f"✓ Check-out successful:")
@@ -40,7 +40,7 @@ export interface Booking {
 export interface DashboardStats {
   total_bookings: number;
   active_users: number;
-  total_revenue: number;
+  total_revenue: string;
   active_sports: number;
   total_slots: number;
   upcoming_bookings: number;